@@ -1,26 +1,183 @@
 import argparse
 import boto3
+import functools
 import os
+import tempfile
+import threading
+import time
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+import incremental_backup
+from db import DEFAULT_SNAPSHOT_PAGES, DEFAULT_SNAPSHOT_SLEEP, snapshot
 
-def upload_file(bucket: str, local_path: str, s3_key: str, region: str | None = None) -> None:
+MIB = 1024 * 1024
+# S3 rejects multipart parts smaller than 5 MiB (except the last one).
+MIN_CHUNK_SIZE_MIB = 5
+DEFAULT_CHUNK_SIZE_MIB = 8
+DEFAULT_CONCURRENCY = 4
+PROGRESS_STEP = 0.25
+
+
+@functools.lru_cache(maxsize=None)
+def s3_client(region: str | None = None, max_pool_connections: int = DEFAULT_CONCURRENCY):
+    # One client (and connection pool) per process; boto3 sessions are slow to build.
     session_kwargs = {}
     if region:
         session_kwargs["region_name"] = region
 
     session = boto3.Session(**session_kwargs)
-    s3 = session.client("s3")
+    return session.client("s3", config=Config(max_pool_connections=max(10, max_pool_connections)))
+
+
+def transfer_config(
+    chunk_size_mib: int = DEFAULT_CHUNK_SIZE_MIB,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_bandwidth_mib: float | None = None,
+) -> TransferConfig:
+    if chunk_size_mib < MIN_CHUNK_SIZE_MIB:
+        raise ValueError(f"chunk size must be at least {MIN_CHUNK_SIZE_MIB} MiB")
+    return TransferConfig(
+        multipart_threshold=chunk_size_mib * MIB,
+        multipart_chunksize=chunk_size_mib * MIB,
+        max_concurrency=concurrency,
+        use_threads=concurrency > 1,
+        max_bandwidth=int(max_bandwidth_mib * MIB) if max_bandwidth_mib else None,
+    )
+
+
+class _Progress:
+    """Counts snapshot bytes read and bytes sent, printing every PROGRESS_STEP of the snapshot."""
+
+    def __init__(self, fh, total: int) -> None:
+        self._fh = fh
+        self._total = total
+        self._lock = threading.Lock()
+        self._next_report = PROGRESS_STEP
+        self.read_bytes = 0
+        self.sent_bytes = 0
+        self.started = time.monotonic()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fh.read(size)
+        self.read_bytes += len(data)
+        while self._total and self.read_bytes / self._total >= self._next_report:
+            elapsed = time.monotonic() - self.started
+            print(f"  {self._next_report:.0%} read, {self.sent_bytes} bytes sent after {elapsed:.1f}s")
+            self._next_report += PROGRESS_STEP
+        return data
+
+    def __call__(self, sent: int) -> None:
+        # boto3 calls this from its transfer threads.
+        with self._lock:
+            self.sent_bytes += sent
+
+
+def upload_file(
+    bucket: str,
+    local_path: str,
+    s3_key: str,
+    region: str | None = None,
+    compress: str | None = None,
+    config: TransferConfig | None = None,
+) -> None:
+    """Stream ``local_path`` (optionally through a compressor) to S3 as a multipart upload."""
+
+    config = config or transfer_config()
+    s3 = s3_client(region, config.max_concurrency)
+    if compress:
+        s3_key += incremental_backup.CODECS[compress][0]
+    size = os.path.getsize(local_path)
 
     try:
-        s3.upload_file(local_path, bucket, s3_key)
-        print(f"Uploaded {local_path} to s3://{bucket}/{s3_key}")
+        with open(local_path, "rb") as fh:
+            progress = _Progress(fh, size)
+            # Without a seekable file boto3 reads each part into memory as it
+            # goes, so at most about chunk size x concurrency is held at once.
+            body = incremental_backup.CompressingReader(progress, compress) if compress else progress
+            s3.upload_fileobj(body, bucket, s3_key, Config=config, Callback=progress)
     except ClientError as exc:
         raise SystemExit(f"Failed to upload to S3: {exc}") from exc
+    elapsed = max(time.monotonic() - progress.started, 1e-6)
+    print(
+        f"Uploaded {local_path} ({size} bytes, {progress.sent_bytes} sent) to s3://{bucket}/{s3_key} "
+        f"in {elapsed:.1f}s ({size / MIB / elapsed:.1f} MiB/s)"
+    )
+
+
+def backup(
+    bucket: str,
+    db_path: str,
+    s3_key: str,
+    region: str | None = None,
+    pages: int = DEFAULT_SNAPSHOT_PAGES,
+    sleep: float = DEFAULT_SNAPSHOT_SLEEP,
+    incremental: bool = False,
+    prefix: str = incremental_backup.DEFAULT_PREFIX,
+    name: str | None = None,
+    codec: str | None = None,
+    config: TransferConfig | None = None,
+) -> None:
+    # The live file may be mid-write (and has a -wal beside it), so upload a
+    # consistent snapshot taken with SQLite's online backup API instead.
+    with tempfile.TemporaryDirectory(prefix="lab-attendance-backup-") as tmp:
+        snapshot_path = os.path.join(tmp, "attendance.db")
+        size = snapshot(db_path, snapshot_path, pages=pages, sleep=sleep)
+        print(f"Snapshot of {db_path} taken ({size} bytes)")
+        if not incremental:
+            upload_file(
+                bucket=bucket,
+                local_path=snapshot_path,
+                s3_key=s3_key,
+                region=region,
+                compress=codec,
+                config=config,
+            )
+            return
+        config = config or transfer_config()
+        started = time.monotonic()
+        try:
+            result = incremental_backup.backup(
+                s3_client(region, config.max_concurrency),
+                bucket,
+                snapshot_path,
+                prefix=prefix,
+                name=name,
+                codec=codec,
+                concurrency=config.max_concurrency,
+            )
+        except ClientError as exc:
+            raise SystemExit(f"Failed to upload to S3: {exc}") from exc
+        elapsed = max(time.monotonic() - started, 1e-6)
+        print(
+            f"Uploaded {result['uploaded_chunks']} of {result['chunks']} chunks "
+            f"({result['uploaded_bytes']} bytes compressed) and s3://{bucket}/{result['manifest']} "
+            f"in {elapsed:.1f}s ({size / MIB / elapsed:.1f} MiB/s of snapshot)"
+        )
+
+
+def restore(
+    bucket: str,
+    db_path: str,
+    region: str | None = None,
+    prefix: str = incremental_backup.DEFAULT_PREFIX,
+    manifest: str | None = None,
+) -> None:
+    try:
+        key = incremental_backup.restore(s3_client(region), bucket, db_path, prefix=prefix, manifest=manifest)
+    except LookupError as exc:
+        raise SystemExit(str(exc)) from exc
+    except ClientError as exc:
+        raise SystemExit(f"Failed to download from S3: {exc}") from exc
+    except (ValueError, RuntimeError) as exc:
+        # Corrupt chunk or manifest, or a codec that is not installed; db_path is left as it was
+        raise SystemExit(f"Failed to restore {db_path} (left unchanged): {exc}") from exc
+    print(f"Restored s3://{bucket}/{key} to {db_path}")
 
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Upload attendance.db to S3")
+    parser = argparse.ArgumentParser(description="Upload a consistent snapshot of attendance.db to S3, or restore one")
     parser.add_argument("--bucket", required=True, help="S3 bucket name")
     parser.add_argument("--key", default="attendance.db", help="Object key in the bucket")
     parser.add_argument(
@@ -33,13 +190,100 @@ def main() -> None:
         default=os.path.join(os.path.dirname(__file__), "attendance.db"),
         help="Path to SQLite database file",
     )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=DEFAULT_SNAPSHOT_PAGES,
+        help="Database pages copied per snapshot step",
+    )
+    parser.add_argument(
+        "--sleep",
+        type=float,
+        default=DEFAULT_SNAPSHOT_SLEEP,
+        help="Seconds to pause between snapshot steps",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Upload only new compressed chunks plus a manifest instead of the whole file",
+    )
+    parser.add_argument(
+        "--prefix",
+        default=incremental_backup.DEFAULT_PREFIX,
+        help="Key prefix for incremental chunks and manifests",
+    )
+    parser.add_argument(
+        "--name",
+        help="Manifest name for --incremental (default: attendance-YYYY-MM-DD in UTC)",
+    )
+    parser.add_argument(
+        "--codec",
+        choices=sorted(incremental_backup.CODECS),
+        help=(
+            "Compression: for --incremental chunks (default: zstd if installed, else gzip); "
+            "whole-file uploads are uncompressed unless given, and --key gets a .zst/.gz suffix"
+        ),
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE_MIB,
+        help=f"Multipart part size in MiB for whole-file uploads (at least {MIN_CHUNK_SIZE_MIB})",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Parts (or --incremental chunks) uploaded in parallel",
+    )
+    parser.add_argument(
+        "--max-bandwidth",
+        type=float,
+        help="Upload bandwidth cap in MiB/s for whole-file uploads (default: unlimited)",
+    )
+    parser.add_argument(
+        "--restore",
+        action="store_true",
+        help="Reassemble an incremental backup into --db instead of backing up",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Manifest key to restore with --restore (default: the latest under --prefix)",
+    )
 
     args = parser.parse_args()
 
+    if args.restore:
+        restore(
+            bucket=args.bucket,
+            db_path=args.db,
+            region=args.region,
+            prefix=args.prefix,
+            manifest=args.manifest,
+        )
+        return
+
     if not os.path.exists(args.db):
         raise SystemExit(f"Database file not found: {args.db}")
 
-    upload_file(bucket=args.bucket, local_path=args.db, s3_key=args.key, region=args.region)
+    try:
+        config = transfer_config(args.chunk_size, args.concurrency, args.max_bandwidth)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    backup(
+        bucket=args.bucket,
+        db_path=args.db,
+        s3_key=args.key,
+        region=args.region,
+        pages=args.pages,
+        sleep=args.sleep,
+        incremental=args.incremental,
+        prefix=args.prefix,
+        name=args.name,
+        codec=args.codec,
+        config=config,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+"""Requests/sec and CPU per request of /api/attendance-data in each JSON_RESPONSE_MODE.
+
+Usage:
+    python benchmarks/json_rendering.py --sizes 1000 10000 100000 --duration 5
+
+For every row count a fresh temporary database is seeded, then the app is
+loaded once per mode (``standard`` and ``fast``) and driven in-process through
+httpx's ASGI transport by ``--concurrency`` client tasks for ``--duration``
+seconds. Conditional requests are not used, so every request renders the full
+body. CPU per request is process CPU time (all threads) divided by requests
+completed. Results are printed as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from write_latency_under_reads import seed_database  # noqa: E402
+
+MODES = ("standard", "fast")
+
+
+def load_app(mode: str):
+    # A fresh module per mode, since the mode is read at import time.
+    os.environ["JSON_RESPONSE_MODE"] = mode
+    spec = importlib.util.spec_from_file_location("main", BACKEND_DIR / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+async def drive(app, days: int, duration: float, concurrency: int) -> Dict[str, float]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Warm-up: fills SQLite's page cache and the app's lazy state.
+        (await client.get("/api/attendance-data", params={"days": days})).raise_for_status()
+
+        deadline = time.perf_counter() + duration
+        body_bytes: List[int] = []
+
+        async def worker() -> int:
+            done = 0
+            while time.perf_counter() < deadline:
+                response = await client.get("/api/attendance-data", params={"days": days})
+                response.raise_for_status()
+                body_bytes.append(len(response.content))
+                done += 1
+            return done
+
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        requests = sum(await asyncio.gather(*(worker() for _ in range(concurrency))))
+        cpu, wall = time.process_time() - cpu_started, time.perf_counter() - wall_started
+    return {
+        "requests": requests,
+        "requests_per_sec": requests / wall,
+        "cpu_ms_per_request": cpu / requests * 1000,
+        "body_bytes": body_bytes[-1] if body_bytes else 0,
+    }
+
+
+async def bench_mode(mode: str, days: int, duration: float, concurrency: int) -> Dict[str, float]:
+    main = load_app(mode)
+    async with main.app.router.lifespan_context(main.app):
+        return await drive(main.app, days, duration, concurrency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--span-days", type=int, default=365, help="days the seeded rows cover")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per mode and size")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent client tasks")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "attendance.db")
+            seed_database(db_path, rows, args.span_days)
+            os.environ["DB_PATH"] = db_path
+            modes = {
+                mode: asyncio.run(bench_mode(mode, args.span_days + 1, args.duration, args.concurrency))
+                for mode in MODES
+            }
+        modes["fast_speedup"] = modes["fast"]["requests_per_sec"] / modes["standard"]["requests_per_sec"]
+        results.append({"rows": rows, **modes})
+
+    print(json.dumps({"duration": args.duration, "concurrency": args.concurrency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Reproducible mixed-workload load test for the attendance API.
+
+Usage:
+    python benchmarks/load_harness.py --years 3 --duration 20 --target both --output baseline.json
+    python benchmarks/load_harness.py --target inprocess --compare baseline.json
+
+A template database is seeded once with synthetic multi-year history
+(deterministic for a given ``--seed``) and copied for every target, so each
+run starts from identical data. Three workloads then run concurrently for
+``--duration`` seconds:
+
+* tap bursts   - a card reader firing enter/exit taps (with accidental double
+                 taps) in quick bursts, plus the occasional buffered batch replay;
+* polling      - dashboards refreshing status, sessions and the 30-day log with
+                 If-None-Match, as the frontend does;
+* long reads   - multi-year stats, monthly summaries, full-history reads and
+                 export pages;
+* morning rush - with ``--members`` above 1, every member taps in at the same
+                 moment (the 9 a.m. arrival), the "who is in" view is read, and
+                 everyone taps out again, every ``--rush-interval`` seconds.
+
+Targets are ``inprocess`` (httpx's ASGI transport, no network) and ``uvicorn``
+(a local server subprocess over HTTP). Per endpoint the report gives request
+and error counts, throughput and latency percentiles; the JSON on stdout (or in
+``--output``) is meant to be kept as a baseline. ``--compare`` adds the ratio of
+each p50/p95/p99 and throughput to a previous report.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import db  # noqa: E402
+import rollup  # noqa: E402
+import users  # noqa: E402
+from write_latency_under_reads import percentiles  # noqa: E402
+
+TARGETS = ("inprocess", "uvicorn")
+
+
+def seed_history(path: str, years: int, seed: int, members: int = 1) -> int:
+    """Write ``years`` of plausible weekday lab visits ending now for each member; returns the row count."""
+
+    db.migrate(path)
+    rows = []
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        with db.write_transaction(conn):
+            member_ids = [users.DEFAULT_USER_ID] + [
+                users.create_user(conn, f"member-{number:02d}")["id"] for number in range(2, members + 1)
+            ]
+            for index, user_id in enumerate(member_ids):
+                # The default member keeps the single-member history of earlier baselines.
+                rng = random.Random(seed if index == 0 else f"{seed}-{user_id}")
+                rows += [(action, stamp, user_id) for action, stamp in _visits(rng, years)]
+            conn.executemany("INSERT INTO attendance_logs (action, timestamp, user_id) VALUES (?, ?, ?)", rows)
+            rollup.rebuild(conn)
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def _visits(rng: random.Random, years: int) -> List[tuple]:
+    today = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    day = today - datetime.timedelta(days=365 * years)
+    rows = []
+    while day < today:
+        if day.weekday() < 5 and rng.random() < 0.85 or rng.random() < 0.15:
+            # 1-3 visits between roughly 09:00 and 23:00 JST (00:00-14:00 UTC).
+            cursor = day + datetime.timedelta(minutes=rng.randint(0, 180))
+            for _ in range(rng.choice((1, 1, 2, 3))):
+                stay = datetime.timedelta(minutes=rng.randint(20, 360))
+                if cursor + stay >= day + datetime.timedelta(hours=15):
+                    break
+                rows.append(("enter", cursor.strftime(db.CANONICAL_TIMESTAMP_FORMAT)))
+                rows.append(("exit", (cursor + stay).strftime(db.CANONICAL_TIMESTAMP_FORMAT)))
+                cursor += stay + datetime.timedelta(minutes=rng.randint(10, 120))
+        day += datetime.timedelta(days=1)
+    return rows
+
+
+class Recorder:
+    """Latency samples and error counts per ``METHOD /path``."""
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        key = f"{method} {path}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            await response.aread()
+        except httpx.HTTPError:
+            self.errors[key] += 1
+            return None
+        self.samples[key].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[key] += 1
+        return response
+
+    def report(self, elapsed: float) -> Dict[str, object]:
+        endpoints = {}
+        for key in sorted(set(self.samples) | set(self.errors)):
+            samples = self.samples.get(key, [])
+            summary: Dict[str, object] = percentiles(samples) if samples else {"count": 0}
+            summary["errors"] = self.errors.get(key, 0)
+            summary["throughput_rps"] = len(samples) / elapsed
+            endpoints[key] = summary
+        total = sum(len(samples) for samples in self.samples.values())
+        return {
+            "duration_s": elapsed,
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": total / elapsed,
+            "endpoints": endpoints,
+        }
+
+
+async def tap_bursts(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, deadline: float, burst: int) -> None:
+    action = "enter"
+    while time.perf_counter() < deadline:
+        for _ in range(rng.randint(1, burst)):
+            await recorder.request(client, "POST", "/api/lab-entry", json={"action": action})
+            if rng.random() < 0.7:  # anything else is a double tap, recorded as "ignored"
+                action = "exit" if action == "enter" else "enter"
+        if rng.random() < 0.1:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            events = [
+                {
+                    "action": "enter" if (i % 2 == 0) == (action == "enter") else "exit",
+                    "client_timestamp": (now + datetime.timedelta(milliseconds=i)).isoformat(),
+                    "idempotency_key": str(uuid.UUID(int=rng.getrandbits(128))),
+                }
+                for i in range(rng.randint(2, 20))
+            ]
+            await recorder.request(client, "POST", "/api/lab-entry/batch", json={"events": events})
+        await asyncio.sleep(rng.uniform(0.05, 0.5))
+
+
+async def polling(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, deadline: float, interval: float) -> None:
+    etags: Dict[str, str] = {}
+    requests = (
+        ("/api/status", {}),
+        ("/api/sessions", {"tz": "Asia/Tokyo"}),
+        ("/api/attendance-data", {"days": 30}),
+    )
+    await asyncio.sleep(rng.uniform(0, interval))
+    while time.perf_counter() < deadline:
+        for path, params in requests:
+            headers = {"If-None-Match": etags[path]} if path in etags else {}
+            response = await recorder.request(client, "GET", path, params=params, headers=headers)
+            if response is not None and "etag" in response.headers:
+                etags[path] = response.headers["etag"]
+        await asyncio.sleep(interval * rng.uniform(0.5, 1.5))
+
+
+async def long_reads(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, deadline: float, years: int) -> None:
+    today = datetime.date.today()
+    while time.perf_counter() < deadline:
+        start = today - datetime.timedelta(days=rng.randint(30, 365 * years))
+        choice = rng.randrange(4)
+        if choice == 0:
+            await recorder.request(
+                client, "GET", "/api/stats", params={"from": start.isoformat(), "to": today.isoformat()}
+            )
+        elif choice == 1:
+            await recorder.request(
+                client, "GET", "/api/summary",
+                params={"from": start.isoformat(), "to": today.isoformat(), "granularity": "month"},
+            )
+        elif choice == 2:
+            await recorder.request(client, "GET", "/api/attendance-data", params={"days": 365 * years})
+        else:
+            await recorder.request(client, "GET", "/api/export", params={"after_id": rng.randint(0, 1000), "limit": 5000})
+
+
+async def morning_rush(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, deadline: float, members: int, interval: float) -> None:
+    await asyncio.sleep(rng.uniform(0, interval))
+    while time.perf_counter() < deadline:
+        for action in ("enter", "exit"):
+            await asyncio.gather(*(
+                recorder.request(client, "POST", "/api/lab-entry", json={"action": action, "user_id": user_id})
+                for user_id in range(1, members + 1)
+            ))
+            await recorder.request(client, "GET", "/api/presence")
+        await asyncio.sleep(interval * rng.uniform(0.5, 1.5))
+
+
+async def run_workloads(client: httpx.AsyncClient, args: argparse.Namespace) -> Dict[str, object]:
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    deadline = time.perf_counter() + args.duration
+    tasks = [tap_bursts(client, recorder, random.Random(rng.random()), deadline, args.burst) for _ in range(args.tappers)]
+    tasks += [polling(client, recorder, random.Random(rng.random()), deadline, args.poll_interval) for _ in range(args.pollers)]
+    tasks += [long_reads(client, recorder, random.Random(rng.random()), deadline, args.years) for _ in range(args.long_readers)]
+    if args.members > 1:
+        tasks.append(morning_rush(client, recorder, random.Random(rng.random()), deadline, args.members, args.rush_interval))
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return recorder.report(time.perf_counter() - started)
+
+
+def load_app(db_path: str):
+    os.environ["DB_PATH"] = db_path
+    spec = importlib.util.spec_from_file_location("main", BACKEND_DIR / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+
+@contextlib.asynccontextmanager
+async def inprocess_client(db_path: str) -> AsyncIterator[httpx.AsyncClient]:
+    app = load_app(db_path)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            yield client
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def uvicorn_client(db_path: str) -> AsyncIterator[httpx.AsyncClient]:
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "DB_PATH": db_path},
+    )
+    try:
+        limits = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+            for _ in range(150):
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+                with contextlib.suppress(httpx.TransportError):
+                    if (await client.get("/")).status_code == 200:
+                        break
+                await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not become ready")
+            yield client
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+CLIENTS = {"inprocess": inprocess_client, "uvicorn": uvicorn_client}
+
+
+async def run_target(target: str, db_path: str, args: argparse.Namespace) -> Dict[str, object]:
+    async with CLIENTS[target](db_path) as client:
+        return await run_workloads(client, args)
+
+
+def compare(report: Dict[str, object], baseline: Dict[str, object]) -> Dict[str, object]:
+    """Ratios new/baseline per target and endpoint (below 1.0 is faster for latencies)."""
+
+    ratios: Dict[str, object] = {}
+    for target, result in report["targets"].items():
+        before = baseline.get("targets", {}).get(target)
+        if not before:
+            continue
+        ratios[target] = {}
+        for key, now in result["endpoints"].items():
+            then = before["endpoints"].get(key)
+            if not then or not then.get("count") or not now.get("count"):
+                continue
+            ratios[target][key] = {
+                metric: now[metric] / then[metric]
+                for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+                if then[metric]
+            }
+    return ratios
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=3, help="years of synthetic history to seed")
+    parser.add_argument("--seed", type=int, default=1, help="RNG seed for data and workloads")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per target")
+    parser.add_argument("--target", choices=(*TARGETS, "both"), default="inprocess")
+    parser.add_argument("--tappers", type=int, default=1, help="concurrent tap-burst clients")
+    parser.add_argument("--burst", type=int, default=5, help="maximum taps per burst")
+    parser.add_argument("--pollers", type=int, default=8, help="concurrent dashboard clients")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between dashboard refreshes")
+    parser.add_argument("--long-readers", type=int, default=2, help="concurrent long-range readers")
+    parser.add_argument("--members", type=int, default=1, help="lab members to seed and rush with")
+    parser.add_argument("--rush-interval", type=float, default=2.0, help="seconds between morning rushes")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="previous report to compare against")
+    args = parser.parse_args()
+
+    targets = TARGETS if args.target == "both" else (args.target,)
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template.db")
+        rows = seed_history(template, args.years, args.seed, args.members)
+        report: Dict[str, object] = {
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "rows_seeded": rows,
+            "targets": {},
+        }
+        for target in targets:
+            db_path = os.path.join(tmp, f"{target}.db")
+            shutil.copyfile(template, db_path)
+            report["targets"][target] = asyncio.run(run_target(target, db_path, args))
+
+    if args.compare:
+        with open(args.compare) as fh:
+            report["compared_to"] = {"path": args.compare, "ratios": compare(report, json.load(fh))}
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Compare the old and new ways of serializing log timestamps on the read path.
+
+Usage:
+    python benchmarks/timestamp_serialization.py --rows 100000 --repeat 5
+
+``legacy`` is the pre-migration read path: select the raw column and run each
+value through fromisoformat/astimezone/isoformat in Python. ``python`` selects
+the raw column and uses the string fast path of ``main.to_iso8601``; ``sql``
+has SQLite emit the ISO string directly (``db.ISO_TIMESTAMP_SQL``), which is
+what ``/api/attendance-data`` and ``/api/export`` now do. Each variant builds
+the same list of response dicts. Best-of-N timings are printed as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import db  # noqa: E402
+from write_latency_under_reads import seed_database  # noqa: E402
+
+
+def legacy_to_iso8601(timestamp_str: str) -> str:
+    try:
+        dt = datetime.datetime.fromisoformat(timestamp_str)
+    except ValueError:
+        try:
+            dt = datetime.datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return timestamp_str
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def fast_to_iso8601(timestamp_str: str) -> str:
+    # Same fast path as main.to_iso8601, without importing the app.
+    if len(timestamp_str) == 19 and timestamp_str[10] == " ":
+        return f"{timestamp_str[:10]}T{timestamp_str[11:]}Z"
+    return legacy_to_iso8601(timestamp_str)
+
+
+def read_legacy(conn: sqlite3.Connection) -> List[Dict[str, object]]:
+    return [
+        {"id": row[0], "action": row[1], "timestamp": legacy_to_iso8601(row[2]) if row[2] else None}
+        for row in conn.execute("SELECT id, action, timestamp FROM attendance_logs ORDER BY timestamp, id")
+    ]
+
+
+def read_python(conn: sqlite3.Connection) -> List[Dict[str, object]]:
+    return [
+        {"id": row[0], "action": row[1], "timestamp": fast_to_iso8601(row[2]) if row[2] else None}
+        for row in conn.execute("SELECT id, action, timestamp FROM attendance_logs ORDER BY timestamp, id")
+    ]
+
+
+def read_sql(conn: sqlite3.Connection) -> List[Dict[str, object]]:
+    cursor = conn.execute(
+        f"SELECT id, action, {db.ISO_TIMESTAMP_SQL} FROM attendance_logs ORDER BY timestamp, id"
+    )
+    return [{"id": log_id, "action": action, "timestamp": ts} for log_id, action, ts in cursor]
+
+
+VARIANTS: Dict[str, Callable[[sqlite3.Connection], List[Dict[str, object]]]] = {
+    "legacy": read_legacy,
+    "python": read_python,
+    "sql": read_sql,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.db")
+        seed_database(path, args.rows, args.days)
+        conn = sqlite3.connect(path)
+        db.configure_connection(conn)
+
+        expected = read_legacy(conn)
+        results: Dict[str, Dict[str, float]] = {}
+        for name, variant in VARIANTS.items():
+            assert variant(conn) == expected, f"{name} output differs from legacy"
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                variant(conn)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            results[name] = {
+                "best_ms": best * 1000,
+                "ns_per_row": best / args.rows * 1e9,
+            }
+        conn.close()
+
+    for name, result in results.items():
+        result["speedup_vs_legacy"] = results["legacy"]["best_ms"] / result["best_ms"]
+    print(json.dumps({"rows": args.rows, "repeat": args.repeat, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Measure /api/lab-entry latency while heavy /api/attendance-data reads run concurrently.
+
+Usage:
+    python benchmarks/write_latency_under_reads.py --rows 100000 --readers 4 --writes 200
+
+The app is driven in-process through httpx's ASGI transport against a temporary,
+synthetically seeded database. Results are printed as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import db  # noqa: E402
+
+
+def seed_database(path: str, rows: int, days: int) -> None:
+    db.migrate(path)
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    step = datetime.timedelta(days=days) / max(rows, 1)
+    start = now - datetime.timedelta(days=days)
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO attendance_logs (action, timestamp) VALUES (?, ?)",
+        (
+            ("enter" if i % 2 == 0 else "exit", (start + step * i).strftime("%Y-%m-%d %H:%M:%S"))
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+async def run_writes(client: httpx.AsyncClient, writes: int) -> List[float]:
+    latencies = []
+    for i in range(writes):
+        action = "enter" if i % 2 == 0 else "exit"
+        started = time.perf_counter()
+        response = await client.post("/api/lab-entry", json={"action": action})
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def run_reader(client: httpx.AsyncClient, stop: asyncio.Event, days: int) -> int:
+    count = 0
+    while not stop.is_set():
+        response = await client.get("/api/attendance-data", params={"days": days})
+        response.raise_for_status()
+        count += 1
+    return count
+
+
+async def scenario(app, readers: int, writes: int, read_days: int) -> Dict[str, object]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        reader_tasks = [
+            asyncio.create_task(run_reader(client, stop, read_days)) for _ in range(readers)
+        ]
+        await asyncio.sleep(0.1 if readers else 0)
+        latencies = await run_writes(client, writes)
+        stop.set()
+        reads = sum(await asyncio.gather(*reader_tasks))
+    return {"readers": readers, "reads_completed": reads, "lab_entry": percentiles(latencies)}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, object]:
+    main = importlib.import_module("main")
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        for readers in (0, args.readers):
+            results.append(await scenario(main.app, readers, args.writes, args.read_days))
+    return {"rows": args.rows, "read_days": args.read_days, "scenarios": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic rows to seed")
+    parser.add_argument("--span-days", type=int, default=365, help="days the seeded rows cover")
+    parser.add_argument("--read-days", type=int, default=365, help="days= parameter for reads")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent reader tasks")
+    parser.add_argument("--writes", type=int, default=200, help="lab-entry requests to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "attendance.db")
+        seed_database(db_path, args.rows, args.span_days)
+        os.environ["DB_PATH"] = db_path
+        print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""SQLite connection management for the lab attendance backend."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Type, TypeVar
+
+import rollup
+import users
+
+logger = logging.getLogger("lab_attendance.db")
+
+T = TypeVar("T")
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_ACQUIRE_TIMEOUT = 5.0  # seconds
+DEFAULT_BUSY_TIMEOUT = 5.0  # seconds
+
+# Online snapshots copy this many pages per step and pause between steps, so
+# the live writer is never held up for the length of the whole copy.
+DEFAULT_SNAPSHOT_PAGES = 256  # 1 MiB with 4 KiB pages
+DEFAULT_SNAPSHOT_SLEEP = 0.01  # seconds
+# A write from another connection restarts a paged backup; after this many
+# restarts the copy is finished in one step instead.
+MAX_SNAPSHOT_RESTARTS = 3
+
+# Per-connection tuning. WAL itself is persistent and is switched on by ``migrate``.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",  # durable at checkpoints, no fsync per commit in WAL mode
+    "PRAGMA cache_size = -8000",  # 8 MiB page cache
+    "PRAGMA mmap_size = 67108864",  # 64 MiB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Every stored timestamp is UTC in this form (what CURRENT_TIMESTAMP produces);
+# the last migration rewrites older rows into it.
+CANONICAL_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# SQL expression rendering a canonical ``timestamp`` column as ISO 8601 UTC
+# ("2024-05-01T09:00:00Z"), so read paths get response-ready strings from
+# SQLite instead of parsing and re-formatting a datetime per row.
+ISO_TIMESTAMP_SQL = "replace(timestamp, ' ', 'T') || 'Z'"
+
+
+class PoolClosedError(RuntimeError):
+    """Raised when a connection is requested from a pool that is not open."""
+
+
+class ConnectionPool:
+    """Fixed-size pool of pre-configured SQLite connections.
+
+    Connections are created once in :meth:`open` (called from the FastAPI
+    lifespan) and handed out to request handlers through :meth:`connection`.
+    Each worker process owns its own pool; connections are never shared
+    between two callers at the same time.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int = DEFAULT_POOL_SIZE,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+        factory: Type[sqlite3.Connection] = sqlite3.Connection,
+    ) -> None:
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.path = path
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.busy_timeout = busy_timeout
+        # Connection class, e.g. one that records query timings (see metrics.py).
+        self.factory = factory
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = True
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def open(self) -> None:
+        with self._lock:
+            if not self._closed:
+                return
+            for _ in range(self.size):
+                conn = self._connect()
+                self._all.append(conn)
+                self._idle.put_nowait(conn)
+            self._closed = False
+        logger.info("opened %s sqlite connections for %s", self.size, self.path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            connections, self._all = self._all, []
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                logger.exception("failed to close sqlite connection")
+        logger.info("closed sqlite connection pool for %s", self.path)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of the ``with`` block.
+
+        Any transaction left open by the caller is rolled back on return, and a
+        connection that fails its health check after an error is replaced.
+        """
+
+        if self._closed:
+            raise PoolClosedError("connection pool is not open")
+        try:
+            conn = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty as exc:
+            raise TimeoutError("timed out waiting for a database connection") from exc
+
+        failed = False
+        try:
+            yield conn
+        except sqlite3.Error:
+            failed = True
+            raise
+        finally:
+            self._release(conn, failed)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path, timeout=self.busy_timeout, check_same_thread=False, factory=self.factory
+        )
+        configure_connection(conn)
+        return conn
+
+    def _release(self, conn: sqlite3.Connection, failed: bool) -> None:
+        if failed or conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                failed = True
+        if failed and not _is_healthy(conn):
+            conn = self._replace(conn)
+
+        with self._lock:
+            if self._closed or conn not in self._all:
+                conn.close()
+                return
+            self._idle.put_nowait(conn)
+
+    def _replace(self, broken: sqlite3.Connection) -> sqlite3.Connection:
+        logger.warning("replacing unhealthy sqlite connection")
+        try:
+            broken.close()
+        except sqlite3.Error:
+            pass
+        fresh = self._connect()
+        with self._lock:
+            try:
+                self._all[self._all.index(broken)] = fresh
+            except ValueError:
+                pass
+        return fresh
+
+
+class Database:
+    """Async front-end that keeps blocking SQLite calls off the event loop.
+
+    Writes are queued to a single dedicated writer thread, so they are applied
+    one at a time in arrival order. Reads run on a separate pool of reader
+    threads; with WAL enabled they never wait for the writer, and a slow range
+    read can only ever occupy a reader thread, never the writer.
+
+    Work is passed as a plain function taking a pooled connection as its first
+    argument, e.g. ``await database.read(fetch_latest_log)``. The writer's
+    reserved connection only holds if every use of the pool goes through this
+    class (the health check included, see :meth:`ping`).
+    """
+
+    def __init__(self, pool: ConnectionPool, read_workers: Optional[int] = None) -> None:
+        self.pool = pool
+        # One connection stays reserved for the writer whenever the pool allows it.
+        self.read_workers = read_workers or max(1, pool.size - 1)
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        self.pool.open()
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+            self._readers = ThreadPoolExecutor(
+                max_workers=self.read_workers, thread_name_prefix="db-reader"
+            )
+
+    def stop(self) -> None:
+        writer, readers = self._writer, self._readers
+        self._writer = self._readers = None
+        # Let queued writes finish before the connections go away.
+        if writer is not None:
+            writer.shutdown(wait=True)
+        if readers is not None:
+            readers.shutdown(wait=True, cancel_futures=True)
+        self.pool.close()
+
+    async def read(self, fn: Callable[..., T], *args: Any) -> T:
+        return await self._submit(self._readers, fn, args)
+
+    async def write(self, fn: Callable[..., T], *args: Any) -> T:
+        return await self._submit(self._writer, fn, args)
+
+    async def ping(self) -> bool:
+        """Run a trivial query on a reader thread to verify the database is reachable."""
+
+        try:
+            return await self.read(_ping)
+        except (sqlite3.Error, PoolClosedError, TimeoutError):
+            return False
+
+    async def _submit(
+        self, executor: Optional[ThreadPoolExecutor], fn: Callable[..., T], args: Sequence[Any]
+    ) -> T:
+        if executor is None:
+            raise PoolClosedError("database executor is not running")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(self._run, fn, args))
+
+    def _run(self, fn: Callable[..., T], args: Sequence[Any]) -> T:
+        with self.pool.connection() as conn:
+            return fn(conn, *args)
+
+
+def _ping(conn: sqlite3.Connection) -> bool:
+    conn.execute("SELECT 1").fetchone()
+    return True
+
+
+@contextmanager
+def write_transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run the block inside ``BEGIN IMMEDIATE`` and commit it, or roll back on error.
+
+    IMMEDIATE takes the database write lock before the first read, so a
+    read-then-insert inside the block cannot interleave with another
+    connection's write, whether from this process or another uvicorn worker.
+    Waiting for the lock is bounded by the connection's busy timeout.
+    """
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+class _SnapshotRestarted(Exception):
+    pass
+
+
+def snapshot(
+    path: str,
+    dest: str,
+    pages: int = DEFAULT_SNAPSHOT_PAGES,
+    sleep: float = DEFAULT_SNAPSHOT_SLEEP,
+) -> int:
+    """Write a transactionally consistent copy of the database at ``path`` to ``dest``.
+
+    Uses SQLite's online backup API, so it is safe while the app is writing:
+    every step reads under a WAL snapshot (writers are never blocked), and
+    the copy reflects exactly one committed state. Pages are copied
+    ``pages`` at a time with ``sleep`` seconds in between. If concurrent
+    writes keep restarting the paged copy, it is finished in a single step,
+    which still only holds a read transaction.
+
+    The copy is switched to a rollback journal so it is a self-contained
+    single file, and checked with ``PRAGMA quick_check``. Returns its size in
+    bytes.
+    """
+
+    restarts = 0
+    remaining_before: Optional[int] = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, remaining_before
+        if remaining_before is not None and remaining > remaining_before:
+            restarts += 1
+            if restarts > MAX_SNAPSHOT_RESTARTS:
+                raise _SnapshotRestarted
+        remaining_before = remaining
+
+    source = sqlite3.connect(path, timeout=DEFAULT_BUSY_TIMEOUT)
+    target = sqlite3.connect(dest, isolation_level=None)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except _SnapshotRestarted:
+            logger.info("snapshot of %s restarted %s times; finishing in one step", path, restarts)
+            source.backup(target)
+        target.execute("PRAGMA journal_mode = DELETE")
+        result = target.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"snapshot failed quick_check: {result}")
+    finally:
+        target.close()
+        source.close()
+    return os.path.getsize(dest)
+
+
+def _is_healthy(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("SELECT 1").fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
+
+def _create_attendance_logs(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS attendance_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            action TEXT NOT NULL CHECK (action IN ('enter', 'exit')),
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _create_timestamp_index(conn: sqlite3.Connection) -> None:
+    # id sits before action so that "ORDER BY timestamp, id" is served straight
+    # from the index; action is included to make the lookups covering.
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_attendance_logs_timestamp
+        ON attendance_logs (timestamp, id, action)
+        """
+    )
+
+
+def _create_daily_totals(conn: sqlite3.Connection) -> None:
+    # The original single-member shape; _add_users replaces it and fills it in.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            date TEXT PRIMARY KEY,
+            total_seconds INTEGER NOT NULL DEFAULT 0,
+            session_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _add_idempotency_key(conn: sqlite3.Connection) -> None:
+    # Client-supplied key for replayed taps; NULL for rows recorded live.
+    conn.execute("ALTER TABLE attendance_logs ADD COLUMN idempotency_key TEXT")
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_logs_idempotency_key
+        ON attendance_logs (idempotency_key) WHERE idempotency_key IS NOT NULL
+        """
+    )
+
+
+def _normalize_timestamps(conn: sqlite3.Connection) -> None:
+    # Rows written by older clients or restored from elsewhere may carry a "T"
+    # separator, fractional seconds or a UTC offset. Rewriting them all to the
+    # CURRENT_TIMESTAMP form lets readers format timestamps without parsing
+    # (see ISO_TIMESTAMP_SQL) and keeps text order equal to time order.
+    # Text order may change, and with it how logs pair into sessions; the rollup
+    # is rebuilt from scratch by _add_users.
+    conn.execute(
+        f"""
+        UPDATE attendance_logs SET timestamp = strftime('{CANONICAL_TIMESTAMP_FORMAT}', timestamp)
+        WHERE strftime('{CANONICAL_TIMESTAMP_FORMAT}', timestamp) IS NOT NULL
+          AND timestamp IS NOT strftime('{CANONICAL_TIMESTAMP_FORMAT}', timestamp)
+        """
+    )
+
+
+def _add_users(conn: sqlite3.Connection) -> None:
+    # Existing logs all belong to the default member. No REFERENCES clause:
+    # SQLite only allows adding one with a NULL default, and the write path
+    # checks that the member exists.
+    conn.execute(
+        "ALTER TABLE attendance_logs ADD COLUMN user_id INTEGER NOT NULL "
+        f"DEFAULT {users.DEFAULT_USER_ID}"
+    )
+    # Per-member lookups (latest action, a member's range, session neighbours)
+    # are one seek into this index; id and action make them covering, as above.
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_attendance_logs_user_timestamp
+        ON attendance_logs (user_id, timestamp, id, action)
+        """
+    )
+    users.create_tables(conn)
+    users.rebuild_presence(conn)
+    # Totals are kept per member from now on.
+    conn.execute("DROP TABLE IF EXISTS daily_totals")
+    rollup.create_table(conn)
+    rollup.rebuild(conn)
+
+
+# Schema migrations, applied in order. The position in this list (1-based) is the
+# schema version recorded in ``PRAGMA user_version`` once the step has run.
+# Steps must not depend on code that later steps change the schema for (e.g. the
+# rollup), since an upgrade runs them all against the schema of their time.
+MIGRATIONS: Sequence[Callable[[sqlite3.Connection], None]] = (
+    _create_attendance_logs,
+    _create_timestamp_index,
+    _create_daily_totals,
+    _add_idempotency_key,
+    _normalize_timestamps,
+    _add_users,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(path: str) -> int:
+    """Bring the database at ``path`` up to :data:`SCHEMA_VERSION` and return the version.
+
+    Every step runs in its own transaction together with the ``user_version``
+    bump, so an interrupted upgrade resumes where it stopped and re-running is a
+    no-op. The version is re-read under the write lock, so processes migrating
+    the same file concurrently each apply a step at most once between them.
+    """
+
+    conn = sqlite3.connect(path, timeout=DEFAULT_BUSY_TIMEOUT, isolation_level=None)
+    try:
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            logger.warning("could not enable WAL mode (journal_mode=%s)", mode)
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process (e.g. a second uvicorn worker starting at the
+                # same time) may have applied this step while we waited for the lock.
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= target:
+                    conn.execute("COMMIT")
+                    continue
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            logger.info("migrated %s to schema version %s", path, target)
+            version = target
+        return version
+    finally:
+        conn.close()
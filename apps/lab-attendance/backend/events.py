@@ -0,0 +1,153 @@
+"""In-process fan-out of attendance events to Server-Sent Events subscribers."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import signal
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger("lab_attendance.events")
+
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_MAX_SUBSCRIBERS = 256
+DEFAULT_HEARTBEAT_SECONDS = 15.0
+
+
+class TooManySubscribersError(RuntimeError):
+    """Raised when the hub already serves its maximum number of subscribers."""
+
+
+class HubClosedError(RuntimeError):
+    """Raised when subscribing to a hub that has been closed for shutdown."""
+
+
+class Subscriber:
+    def __init__(self, queue_size: int) -> None:
+        self.queue: "asyncio.Queue[Dict[str, object]]" = asyncio.Queue(maxsize=queue_size)
+        self.closed = asyncio.Event()
+
+
+class EventHub:
+    """Broadcasts events to every connected client through bounded per-client queues.
+
+    :meth:`publish` never waits: a subscriber whose queue is full is too slow to
+    keep up and is evicted, which ends its stream; the browser's EventSource
+    then reconnects and resynchronises from the initial event. All methods must
+    be called from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        max_subscribers: int = DEFAULT_MAX_SUBSCRIBERS,
+        heartbeat_seconds: float = DEFAULT_HEARTBEAT_SECONDS,
+    ) -> None:
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscribers: Set[Subscriber] = set()
+        self.evicted = 0
+        self.closed = False
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        if self.closed:
+            raise HubClosedError("event hub is shutting down")
+        if len(self._subscribers) >= self.max_subscribers:
+            raise TooManySubscribersError("too many event stream subscribers")
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+        subscriber.closed.set()
+
+    def publish(self, event: Dict[str, object]) -> None:
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning("evicting slow event stream subscriber")
+                self.evicted += 1
+                self.unsubscribe(subscriber)
+
+    def close(self) -> None:
+        self.closed = True
+        for subscriber in list(self._subscribers):
+            self.unsubscribe(subscriber)
+
+    async def stream(
+        self, subscriber: Subscriber, initial: Optional[Dict[str, object]] = None
+    ) -> AsyncIterator[str]:
+        """Yield SSE frames for ``subscriber`` until it is evicted or the hub closes."""
+
+        try:
+            if initial is not None:
+                yield format_event(initial)
+            while not subscriber.closed.is_set():
+                get = asyncio.ensure_future(subscriber.queue.get())
+                closed = asyncio.ensure_future(subscriber.closed.wait())
+                done, _ = await asyncio.wait(
+                    {get, closed},
+                    timeout=self.heartbeat_seconds,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                closed.cancel()
+                if get in done:
+                    yield format_event(get.result())
+                    continue
+                get.cancel()
+                if not done:
+                    # Comment frame keeps proxies from timing out idle connections.
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def close_on_signals(
+    hub: EventHub, signals: Iterable[int] = (signal.SIGINT, signal.SIGTERM)
+) -> Callable[[], None]:
+    """Close ``hub`` as soon as one of ``signals`` arrives, then run the previous handler.
+
+    uvicorn only runs lifespan shutdown after every open response has finished,
+    so an open event stream would otherwise keep the server from exiting. Must be
+    called from the event loop; returns a function that restores the previous
+    handlers. Outside the main thread (e.g. under TestClient) it does nothing.
+    """
+
+    if threading.current_thread() is not threading.main_thread():
+        return lambda: None
+    loop = asyncio.get_running_loop()
+    previous = {}
+
+    def handle(signum, frame) -> None:
+        loop.call_soon_threadsafe(hub.close)
+        handler = previous[signum]
+        if callable(handler):
+            handler(signum, frame)
+        elif handler == signal.SIG_DFL:
+            signal.signal(signum, handler)
+            signal.raise_signal(signum)
+
+    for signum in signals:
+        previous[signum] = signal.signal(signum, handle)
+
+    def restore() -> None:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+    return restore
+
+
+def format_event(event: Dict[str, object], name: str = "attendance") -> str:
+    lines = [f"event: {name}"]
+    if event.get("id") is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,295 @@
+"""Incremental backups of database snapshots as compressed, content-addressed chunks.
+
+A snapshot is cut into chunks at content-defined boundaries, each chunk is
+stored once under the SHA-256 of its contents, and every backup run writes a
+small JSON manifest listing the chunks that make up that day's file. Days
+that share most of their pages therefore share most of their chunks, and a
+run uploads only what changed since any earlier run.
+
+Boundaries fall on database pages: SQLite rewrites whole pages in place, so
+a byte-level rolling hash would find the same cut points at a much higher
+cost. After at least ``MIN_CHUNK_PAGES`` pages, a page whose fingerprint has
+its low bits clear ends the chunk (``AVERAGE_CHUNK_PAGES`` apart on average),
+and no chunk grows beyond ``MAX_CHUNK_PAGES``. A changed page moves at most
+the boundary right after it, so the chunk sequence re-synchronises at the
+next unchanged cut point.
+
+Layout under ``prefix``::
+
+    chunks/<2 hex>/<sha256>.zst|.gz   compressed chunk bodies
+    manifests/<name>.json             one per backup run
+
+The S3 functions take a boto3 client, so tests can pass one backed by moto.
+"""
+from __future__ import annotations
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip from the standard library is the fallback
+    zstandard = None
+
+DEFAULT_PREFIX = "backups/incremental"
+MANIFEST_VERSION = 1
+
+# With 4 KiB pages chunks average 64 KiB. Every append touches the right edge
+# of each B-tree (table and indexes), so small chunks keep that churn local.
+MIN_CHUNK_PAGES = 4
+AVERAGE_CHUNK_PAGES = 16  # must be a power of two
+MAX_CHUNK_PAGES = 64
+FALLBACK_PAGE_SIZE = 4096
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+Codec = Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]
+
+
+def _codecs() -> Dict[str, Codec]:
+    codecs: Dict[str, Codec] = {
+        "gzip": (".gz", lambda data: gzip.compress(data, GZIP_LEVEL, mtime=0), gzip.decompress),
+    }
+    if zstandard is not None:
+        codecs["zstd"] = (
+            ".zst",
+            zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress,
+            zstandard.ZstdDecompressor().decompress,
+        )
+    return codecs
+
+
+CODECS = _codecs()
+
+STREAM_READ_SIZE = 1024 * 1024
+
+
+def _compressobj(codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    # wbits=31 writes a gzip container (with mtime 0, like gzip.compress above).
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+class CompressingReader:
+    """Read-only file object yielding ``fh`` compressed with ``codec`` as it is read.
+
+    Only about one read's worth of compressed output is buffered, so a
+    whole snapshot can be streamed into an upload without a temporary file.
+    ``read(size)`` returns exactly ``size`` bytes until the end of the stream,
+    which multipart uploads rely on for equally sized parts.
+    """
+
+    def __init__(self, fh: BinaryIO, codec: str) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec: {codec}")
+        self._fh = fh
+        self._compressor = _compressobj(codec)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size is None or size < 0 or len(self._buffer) < size):
+            data = self._fh.read(STREAM_READ_SIZE)
+            if data:
+                self._buffer += self._compressor.compress(data)
+            else:
+                self._buffer += self._compressor.flush()
+                self._eof = True
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+
+def default_codec() -> str:
+    return "zstd" if "zstd" in CODECS else "gzip"
+
+
+def page_size(fh: BinaryIO) -> int:
+    """Page size from the SQLite header of ``fh`` (left at offset 0), or a 4 KiB fallback."""
+
+    header = fh.read(100)
+    fh.seek(0)
+    if len(header) < 18 or not header.startswith(SQLITE_HEADER):
+        return FALLBACK_PAGE_SIZE
+    size = int.from_bytes(header[16:18], "big")
+    return 65536 if size == 1 else size
+
+
+def _fingerprint(page: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(page, digest_size=8).digest(), "big")
+
+
+def iter_chunks(fh: BinaryIO, unit: int) -> Iterator[bytes]:
+    """Split ``fh`` into content-defined chunks of whole ``unit``-byte pages."""
+
+    mask = AVERAGE_CHUNK_PAGES - 1
+    pages = []
+    while True:
+        page = fh.read(unit)
+        if not page:
+            break
+        pages.append(page)
+        if len(pages) >= MAX_CHUNK_PAGES or (
+            len(pages) >= MIN_CHUNK_PAGES and _fingerprint(page) & mask == 0
+        ):
+            yield b"".join(pages)
+            pages = []
+    if pages:
+        yield b"".join(pages)
+
+
+def chunk_key(prefix: str, digest: str, codec: str) -> str:
+    return f"{prefix}/chunks/{digest[:2]}/{digest}{CODECS[codec][0]}"
+
+
+def manifest_key(prefix: str, name: str) -> str:
+    return f"{prefix}/manifests/{name}.json"
+
+
+def default_name(today: Optional[datetime.date] = None) -> str:
+    return f"attendance-{(today or datetime.datetime.now(datetime.timezone.utc).date()).isoformat()}"
+
+
+def list_keys(s3, bucket: str, prefix: str) -> Set[str]:
+    keys: Set[str] = set()
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        keys.update(item["Key"] for item in page.get("Contents", ()))
+    return keys
+
+
+def _put_chunk(s3, bucket: str, key: str, compress: Callable[[bytes], bytes], data: bytes) -> int:
+    body = compress(data)
+    s3.put_object(Bucket=bucket, Key=key, Body=body)
+    return len(body)
+
+
+def backup(
+    s3,
+    bucket: str,
+    snapshot_path: str,
+    prefix: str = DEFAULT_PREFIX,
+    name: Optional[str] = None,
+    codec: Optional[str] = None,
+    concurrency: int = 1,
+) -> Dict[str, object]:
+    """Upload the chunks of ``snapshot_path`` missing from the bucket, then its manifest.
+
+    Up to ``concurrency`` chunks are compressed and uploaded at once, with
+    at most twice that many held in memory. The manifest is written last,
+    so every manifest in the bucket refers only to chunks that are already
+    there. Returns upload statistics.
+    """
+
+    codec = codec or default_codec()
+    compress = CODECS[codec][1]
+    existing = list_keys(s3, bucket, f"{prefix}/chunks/")
+    chunks = []
+    uploaded = uploaded_bytes = 0
+    whole = hashlib.sha256()
+    with open(snapshot_path, "rb") as fh, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending: Set = set()
+        unit = page_size(fh)
+        for data in iter_chunks(fh, unit):
+            whole.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            chunks.append({"sha256": digest, "size": len(data)})
+            key = chunk_key(prefix, digest, codec)
+            if key in existing:
+                continue
+            pending.add(pool.submit(_put_chunk, s3, bucket, key, compress, data))
+            existing.add(key)
+            uploaded += 1
+            if len(pending) >= 2 * concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                uploaded_bytes += sum(future.result() for future in done)
+        uploaded_bytes += sum(future.result() for future in pending)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat().replace("+00:00", "Z"),
+        "codec": codec,
+        "page_size": unit,
+        "size": sum(chunk["size"] for chunk in chunks),
+        "sha256": whole.hexdigest(),
+        "chunks": chunks,
+    }
+    key = manifest_key(prefix, name or default_name())
+    s3.put_object(
+        Bucket=bucket, Key=key, Body=json.dumps(manifest).encode(), ContentType="application/json"
+    )
+    return {
+        "manifest": key,
+        "chunks": len(chunks),
+        "uploaded_chunks": uploaded,
+        "uploaded_bytes": uploaded_bytes,
+        "size": manifest["size"],
+    }
+
+
+def latest_manifest(s3, bucket: str, prefix: str = DEFAULT_PREFIX) -> Optional[str]:
+    # Names embed the ISO date, so key order is chronological.
+    keys = list_keys(s3, bucket, f"{prefix}/manifests/")
+    return max(keys) if keys else None
+
+
+def restore(
+    s3,
+    bucket: str,
+    dest: str,
+    prefix: str = DEFAULT_PREFIX,
+    manifest: Optional[str] = None,
+) -> str:
+    """Reassemble the backup described by ``manifest`` (default: the latest) into ``dest``.
+
+    Every chunk and the whole file are checked against their SHA-256, and
+    ``dest`` is only replaced once the complete file has been verified.
+    Returns the manifest key used.
+    """
+
+    key = manifest or latest_manifest(s3, bucket, prefix)
+    if key is None:
+        raise LookupError(f"no backup manifests under s3://{bucket}/{prefix}/manifests/")
+    description = json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    if description.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"unsupported manifest version: {description.get('version')}")
+    codec = description["codec"]
+    if codec not in CODECS:
+        raise RuntimeError(f"{key} needs the {codec} codec (pip install zstandard)")
+    decompress = CODECS[codec][2]
+
+    partial = f"{dest}.restore"
+    whole = hashlib.sha256()
+    try:
+        with open(partial, "wb") as out:
+            for chunk in description["chunks"]:
+                body = s3.get_object(Bucket=bucket, Key=chunk_key(prefix, chunk["sha256"], codec))["Body"].read()
+                try:
+                    data = decompress(body)
+                except Exception as exc:  # noqa: BLE001 - each codec raises its own error type
+                    raise ValueError(f"chunk {chunk['sha256']} is corrupt") from exc
+                if len(data) != chunk["size"] or hashlib.sha256(data).hexdigest() != chunk["sha256"]:
+                    raise ValueError(f"chunk {chunk['sha256']} is corrupt")
+                whole.update(data)
+                out.write(data)
+        if whole.hexdigest() != description["sha256"]:
+            raise ValueError(f"restored file does not match {key}")
+        os.replace(partial, dest)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return key
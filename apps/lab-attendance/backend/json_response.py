@@ -0,0 +1,69 @@
+"""JSON rendering modes for API responses.
+
+``standard`` is FastAPI's default path: handlers return dicts, which go
+through ``jsonable_encoder`` and the stdlib ``json`` module.
+
+``fast`` is for deployments serving large histories:
+
+* the app's default response class becomes :class:`ORJSONResponse`, provided
+  orjson is installed (otherwise the stdlib class is kept and a warning logged);
+* bulk endpoints skip per-row dicts entirely. Each row is rendered by SQLite's
+  ``json_object`` while it is read, and the fragments are joined into the
+  response body as they are (see :func:`json_array_body`).
+"""
+from __future__ import annotations
+
+import logging
+from typing import Iterable, Mapping, Type
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+logger = logging.getLogger("lab_attendance.json_response")
+
+JSON_RESPONSE_MODES = ("standard", "fast")
+
+
+def resolve_mode(value: str) -> str:
+    mode = value.strip().lower() or "standard"
+    if mode not in JSON_RESPONSE_MODES:
+        raise ValueError(f"JSON_RESPONSE_MODE must be one of {', '.join(JSON_RESPONSE_MODES)}")
+    return mode
+
+
+def response_class(mode: str) -> Type[JSONResponse]:
+    if mode != "fast":
+        return JSONResponse
+    if orjson is None:
+        logger.warning("orjson is not installed; fast JSON mode keeps the stdlib encoder")
+        return JSONResponse
+    return ORJSONResponse
+
+
+def json_object_sql(**columns: str) -> str:
+    """SQL expression rendering one row as a JSON object, e.g. ``json_object_sql(id="id")``."""
+
+    return "json_object(" + ", ".join(f"'{key}', {expr}" for key, expr in columns.items()) + ")"
+
+
+def json_array_body(fragments: Iterable[str], envelope: Mapping[str, object], key: str = "data") -> str:
+    """Join pre-serialized JSON objects into ``{"<key>": [...], **envelope}``.
+
+    ``envelope`` values must be integers or ``None``.
+    """
+
+    fields = "".join(
+        f',"{name}":{"null" if value is None else int(value)}' for name, value in envelope.items()
+    )
+    return f'{{"{key}":[{",".join(fragments)}]{fields}}}'
+
+
+def raw_json(body: str, headers: Mapping[str, str]) -> Response:
+    """Send an already-serialized body, keeping headers (ETag etc.) set on the injected response."""
+
+    return Response(content=body, media_type="application/json", headers=dict(headers))
@@ -1,17 +1,118 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
 import sqlite3
+import csv
 import datetime
-from typing import List, Dict, Any
+import io
+import json
+from typing import AsyncIterator, List, Dict, Any, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import os
 
+from db import CANONICAL_TIMESTAMP_FORMAT, ISO_TIMESTAMP_SQL, ConnectionPool, Database, migrate, write_transaction
+from status_cache import LastAction, StatusCache, fetch_latest
+from events import EventHub, HubClosedError, TooManySubscribersError, close_on_signals
+import rollup
+import sessions
+import users
+from stats import StatsCache
+import json_response
+from metrics import HitCounter, Metrics
+
+# データベースファイルのパス
+DB_PATH = os.environ.get("DB_PATH", os.path.join(os.path.dirname(__file__), "attendance.db"))
+
+# Prometheus形式のメトリクス（ワーカーごと、/metrics で公開）。METRICS_ENABLED=false で計測自体を止める
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+metrics = Metrics()
+
+# ワーカーごとのコネクションプール（起動時に開き、終了時に閉じる）
+# メトリクス有効時はクエリ時間と取得行数を記録するコネクションを使う
+pool = ConnectionPool(
+    DB_PATH,
+    size=int(os.environ.get("DB_POOL_SIZE", "4")),
+    factory=metrics.connection_factory() if METRICS_ENABLED else sqlite3.Connection
+)
+
+# DBアクセスはイベントループ外で実行（書き込みは専用スレッド、読み込みはリーダースレッド）
+database = Database(pool)
+
+# 最新の入退室状態のキャッシュ（複数ワーカーでDBを共有する場合は STATUS_CACHE_SHARED=true）
+status_cache = StatusCache()
+STATUS_CACHE_SHARED = os.environ.get("STATUS_CACHE_SHARED", "false").lower() == "true"
+
+# 入退室イベントのSSE配信ハブ
+event_hub = EventHub()
+
+# 長期統計（NumPy配列と計算結果を最新ログIDで無効化するキャッシュ）
+stats_cache = StatsCache()
+DEFAULT_STATS_DAYS = 365
+
+# エクスポートで1回に読む行数
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "1000"))
+
+# 条件付きGET（If-None-Match付き）のうち304で返せた割合の集計用
+conditional_gets = HitCounter()
+
+# 単一ワーカーでは最新ステータスは常にメモリから返すので、ヒット率は共有モードでだけ意味がある
+if STATUS_CACHE_SHARED:
+    metrics.add_cache("status", status_cache)
+metrics.add_cache("stats", stats_cache)
+metrics.add_cache("etag", conditional_gets)
+metrics.add_gauge("lab_sse_subscribers", "Connected event stream clients.", lambda: event_hub.subscriber_count)
+
+# JSONレスポンスの生成方式（standard / fast）。fast では orjson で直列化し、
+# 一括取得系は各行をSQLiteでJSON化したまま連結して返す（json_response を参照）
+JSON_RESPONSE_MODE = json_response.resolve_mode(os.environ.get("JSON_RESPONSE_MODE", "standard"))
+
+# 集計のデフォルトタイムゾーンと期間
+DEFAULT_TIMEZONE = rollup.ROLLUP_TIMEZONE
+DEFAULT_SESSION_DAYS = 30
+MAX_SESSION_DAYS = 3660
+
+# データベース初期化
+# （スキーマのマイグレーション・WAL化・インデックス作成は db.migrate を参照）
+def init_db():
+    migrate(DB_PATH)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 起動時にデータベース初期化とプール作成
+    init_db()
+    database.start()
+    if STATUS_CACHE_SHARED:
+        status_cache.watch(DB_PATH)
+    else:
+        await database.read(status_cache.load)
+    lag_monitor = asyncio.create_task(metrics.monitor_event_loop()) if METRICS_ENABLED else None
+    # uvicorn は開いているレスポンスが終わるまで終了処理に進まないので、停止シグナルの時点で SSE を閉じる
+    restore_signals = close_on_signals(event_hub)
+    try:
+        yield
+    finally:
+        restore_signals()
+        if lag_monitor is not None:
+            lag_monitor.cancel()
+        event_hub.close()
+        database.stop()
+        status_cache.close()
+
 app = FastAPI(
     title="Lab Attendance API",
     description="研究室滞在時間記録システム",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=json_response.response_class(JSON_RESPONSE_MODE)
 )
 
+# ルートごとのリクエスト数とレイテンシを記録（以降で定義するエンドポイントすべてに適用）
+if METRICS_ENABLED:
+    app.router.route_class = metrics.route_class()
+
 # CORS設定
 app.add_middleware(
     CORSMiddleware,
@@ -21,37 +122,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# データベースファイルのパス
-DB_PATH = os.path.join(os.path.dirname(__file__), "attendance.db")
-
-# データベース初期化
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS attendance_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action TEXT NOT NULL CHECK (action IN ('enter', 'exit')),
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-# 起動時にデータベース初期化
-init_db()
-
 # リクエストモデル
+# user_id を省略した記録・参照はデフォルトメンバー（複数人対応以前のログの持ち主）のもの
 class AttendanceEntry(BaseModel):
     action: str
+    user_id: int = users.DEFAULT_USER_ID
 
 class AttendanceLog(BaseModel):
     id: int
     action: str
     timestamp: str
 
+class BufferedEntry(BaseModel):
+    action: str
+    client_timestamp: datetime.datetime
+    idempotency_key: Optional[str] = None
+    user_id: int = users.DEFAULT_USER_ID
+
+class BatchEntries(BaseModel):
+    events: List[BufferedEntry]
+
+class NewUser(BaseModel):
+    name: str
+
+# 一括登録で受け付ける最大件数と、端末時計の進みとして許容する秒数
+# 許容範囲内で進んでいる時刻はサーバーの現在時刻に丸めて保存する（未来の行があると、その後の単発登録が最新扱いされない）
+MAX_BATCH_EVENTS = 1000
+MAX_CLOCK_SKEW = datetime.timedelta(minutes=5)
+
 # SQLiteの日時文字列をISO 8601 (UTC) に変換
+# 保存値はマイグレーションで正規形 "YYYY-MM-DD HH:MM:SS" (UTC) に揃えてあるので、通常は文字列の組み替えだけで済む
 def to_iso8601(timestamp_str: str) -> str:
+    if len(timestamp_str) == 19 and timestamp_str[10] == " ":
+        return f"{timestamp_str[:10]}T{timestamp_str[11:]}Z"
     try:
         dt = datetime.datetime.fromisoformat(timestamp_str)
     except ValueError:
@@ -64,130 +167,355 @@ def to_iso8601(timestamp_str: str) -> str:
     return dt.astimezone(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-# 最後のアクションを取得する関数
-def get_last_action():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT action FROM attendance_logs ORDER BY timestamp DESC LIMIT 1")
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else None
+# 重複チェックと記録を1つの BEGIN IMMEDIATE トランザクションで行う。重複時は None
+# 書き込みロックを取ってから最新行を読むので、複数ワーカーが同時に同じアクションを記録しても二重登録されない
+# 重複判定はメンバーごと。最新行は presence テーブルの主キー参照で、ログ件数にもメンバー数にもほぼ依存しない
+def insert_action(conn, action: str, user_id: int = users.DEFAULT_USER_ID) -> Optional[LastAction]:
+    with write_transaction(conn):
+        last = fetch_latest(conn, user_id)
+        if last is None and not users.user_exists(conn, user_id):
+            raise users.UnknownUserError(user_id)
+        if last and last.action == action:
+            return None
+        entry = LastAction(*conn.execute(
+            "INSERT INTO attendance_logs (action, user_id) VALUES (?, ?) RETURNING id, action, timestamp, user_id",
+            (action, user_id)
+        ).fetchall()[0])
+        # 退室でセッションが閉じたら日別集計も同じトランザクションで更新
+        if action == "exit" and last and last.action == "enter" and last.timestamp:
+            rollup.apply_session(conn, sessions.Session(
+                sessions.parse_timestamp(last.timestamp),
+                sessions.parse_timestamp(entry.timestamp)
+            ), user_id=user_id)
+    status_cache.record(entry)
+    return entry
 
-# ヘルスチェック
-@app.get("/")
-async def health_check():
-    return {
-        "status": "ok", 
-        "message": "Lab Attendance API is running",
-        "version": "1.0.0"
-    }
+# 端末でバッファされたイベントの一括登録（ライタースレッド上で1トランザクション）
+# 単発登録と同じく直前の記録と同じアクションは無視し、さらに既存の最新記録より古いイベントは
+# 履歴の途中に割り込んでセッションの組み立てを壊すため拒否する（どちらもメンバーごとに判定）
+def insert_batch(conn, events: List[BufferedEntry]):
+    with write_transaction(conn):
+        results, entries = _insert_batch(conn, events)
+    for entry in entries:
+        status_cache.record(entry)
+    return results, entries
 
-# 入退室記録エンドポイント（POST）
-@app.post("/api/lab-entry")
-async def lab_entry_post(entry: AttendanceEntry):
-    if entry.action not in ["enter", "exit"]:
-        raise HTTPException(status_code=400, detail="Action must be 'enter' or 'exit'")
+def _insert_batch(conn, events: List[BufferedEntry]):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    results: List[Dict[str, Any]] = [
+        {"idempotency_key": event.idempotency_key, "action": event.action, "status": None}
+        for event in events
+    ]
     
-    # 重複チェック
-    last_action = get_last_action()
-    if last_action == entry.action:
-        return {
-            "status": "ignored", 
-            "message": f"Duplicate {entry.action} action ignored", 
-            "action": entry.action
-        }
+    keys = [event.idempotency_key for event in events if event.idempotency_key]
+    known_keys = set()
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        known_keys.update(row[0] for row in conn.execute(
+            f"SELECT idempotency_key FROM attendance_logs WHERE idempotency_key IN ({','.join('?' * len(chunk))})",
+            chunk
+        ))
     
-    # データベースに記録
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO attendance_logs (action) VALUES (?)", (entry.action,))
-    conn.commit()
-    conn.close()
+    # メンバーごとの既存の最新記録（ログのないメンバーは None、未登録のIDは unknown_users へ）
+    latest: Dict[int, Optional[LastAction]] = {}
+    unknown_users = set()
+    for user_id in {event.user_id for event in events}:
+        latest[user_id] = fetch_latest(conn, user_id)
+        if latest[user_id] is None and not users.user_exists(conn, user_id):
+            unknown_users.add(user_id)
+    previous = dict(latest)
+    pending = []
+    order = sorted(range(len(events)), key=lambda index: to_utc(events[index].client_timestamp))
+    for index in order:
+        event = events[index]
+        requested = to_utc(event.client_timestamp)
+        timestamp = min(requested, now)
+        stamp = sessions.format_timestamp(timestamp)
+        last = latest.get(event.user_id)
+        before = previous.get(event.user_id)
+        if event.user_id in unknown_users:
+            results[index]["status"] = "unknown_user"
+        elif event.idempotency_key and event.idempotency_key in known_keys:
+            results[index]["status"] = "duplicate_key"
+        elif requested > now + MAX_CLOCK_SKEW:
+            results[index]["status"] = "future"
+        elif last and last.timestamp and stamp < last.timestamp:
+            results[index]["status"] = "out_of_order"
+        elif before and before.action == event.action:
+            results[index]["status"] = "ignored"
+        else:
+            results[index]["status"] = "recorded"
+            if event.idempotency_key:
+                known_keys.add(event.idempotency_key)
+            # 退室で閉じたセッションは日別集計へ
+            if event.action == "exit" and before and before.action == "enter" and before.timestamp:
+                rollup.apply_session(conn, sessions.Session(
+                    sessions.parse_timestamp(before.timestamp), timestamp
+                ), user_id=event.user_id)
+            previous[event.user_id] = LastAction(0, event.action, stamp, event.user_id)
+            pending.append((index, event.action, stamp, event.idempotency_key, event.user_id))
     
+    entries: List[LastAction] = []
+    if pending:
+        first_new_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM attendance_logs").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO attendance_logs (action, timestamp, idempotency_key, user_id) VALUES (?, ?, ?, ?)",
+            [(action, stamp, key, user_id) for _, action, stamp, key, user_id in pending]
+        )
+        entries = [LastAction(*row) for row in conn.execute(
+            "SELECT id, action, timestamp, user_id FROM attendance_logs WHERE id > ? ORDER BY id ASC",
+            (first_new_id,)
+        )]
+        for (index, *_), entry in zip(pending, entries):
+            results[index]["id"] = entry.id
+    return results, entries
+
+def to_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+# 期間指定の取得条件。メンバー指定時は (user_id, timestamp) インデックスの範囲読みになる
+# 期間の起点は分単位に切り捨てる。同じ分のうちは同じ行集合になるので、ETag を DB に触れずに決められる
+def window_start(days: int) -> datetime.datetime:
+    now = datetime.datetime.now(datetime.timezone.utc).replace(second=0, microsecond=0, tzinfo=None)
+    return now - datetime.timedelta(days=days)
+
+def range_filter(days: int, after_id: int, user_id: Optional[int]):
+    where = "timestamp >= ? AND id > ?"
+    params = [window_start(days).strftime(CANONICAL_TIMESTAMP_FORMAT), after_id]
+    if user_id is not None:
+        where, params = f"user_id = ? AND {where}", [user_id, *params]
+    return where, params
+
+# 指定日数分のデータを取得（整形までリーダースレッド上で行う）
+# after_id を指定するとそれより新しいIDの行だけを返す（差分同期用カーソル）
+# タイムスタンプはSQLite側でISO 8601に整形済みの文字列として受け取る
+def fetch_logs_since(conn, days: int, after_id: int = 0, user_id: Optional[int] = None):
+    where, params = range_filter(days, after_id, user_id)
+    cursor = conn.execute(f"""
+        SELECT id, action, {ISO_TIMESTAMP_SQL}, user_id
+        FROM attendance_logs 
+        WHERE {where}
+        ORDER BY timestamp ASC, id ASC
+    """, params)
+    return [
+        {"id": log_id, "action": action, "timestamp": timestamp, "user_id": member}
+        for log_id, action, timestamp, member in cursor.fetchall()
+    ]
+
+# fast モード用：各行を json_object でJSON文字列にしたまま取得し、リーダースレッド上で連結まで済ませる
+def fetch_log_json_since(conn, days: int, after_id: int = 0, user_id: Optional[int] = None):
+    where, params = range_filter(days, after_id, user_id)
+    rows = conn.execute(f"""
+        SELECT id, {json_response.json_object_sql(
+            id="id", action="action", timestamp=ISO_TIMESTAMP_SQL, user_id="user_id"
+        )}
+        FROM attendance_logs
+        WHERE {where}
+        ORDER BY timestamp ASC, id ASC
+    """, params).fetchall()
+    last_id = max((row[0] for row in rows), default=after_id)
+    return json_response.json_array_body(
+        (row[1] for row in rows),
+        {"count": len(rows), "days": days, "last_id": last_id}
+    )
+
+# IDによるキーセットページングで1チャンク分を取得（タイムスタンプはISO 8601整形済み）
+def fetch_log_chunk(conn, after_id: int, size: int):
+    return conn.execute(f"""
+        SELECT id, action, {ISO_TIMESTAMP_SQL}, user_id
+        FROM attendance_logs
+        WHERE id > ?
+        ORDER BY id ASC
+        LIMIT ?
+    """, (after_id, size)).fetchall()
+
+# 全履歴を固定サイズのチャンクで読みながら逐次送信する（メモリ使用量は一定）
+async def iter_export(fmt: str, after_id: int, limit: Optional[int]) -> AsyncIterator[str]:
+    if fmt == "csv":
+        yield "id,action,timestamp,user_id\r\n"
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = EXPORT_CHUNK_SIZE if remaining is None else min(EXPORT_CHUNK_SIZE, remaining)
+        rows = await database.read(fetch_log_chunk, after_id, size)
+        if not rows:
+            break
+        buffer = io.StringIO()
+        if fmt == "csv":
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow((row[0], row[1], row[2] or "", row[3]))
+        else:
+            for row in rows:
+                buffer.write(json.dumps({"id": row[0], "action": row[1], "timestamp": row[2], "user_id": row[3]}))
+                buffer.write("\n")
+        yield buffer.getvalue()
+        after_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            break
+
+# 複数ワーカーで共有している場合は、他ワーカーの書き込みの確認（と再読込）をリーダースレッドで行う
+# イベントループ上では status_cache のメモリだけを読み、SQLite には触れない
+async def refresh_status_cache():
+    if status_cache.shared:
+        await database.read(status_cache.revalidate)
+    else:
+        status_cache.revalidate()
+
+# SSEで配信するイベント
+def log_event(entry: LastAction) -> Dict[str, Any]:
     return {
-        "status": "success", 
-        "message": f"Successfully recorded {entry.action}", 
-        "action": entry.action
+        "id": entry.id,
+        "action": entry.action,
+        "timestamp": to_iso8601(entry.timestamp) if entry.timestamp else None,
+        "user_id": entry.user_id
     }
 
-# 入退室記録エンドポイント（GET）
-@app.get("/api/lab-entry")
-async def lab_entry_get(action: str):
+# 条件付きGET: If-None-Match が一致すれば 304 を返す
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            conditional_gets.hit()
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        conditional_gets.miss()
+    return None
+
+async def record_action(action: str, user_id: int = users.DEFAULT_USER_ID):
     if action not in ["enter", "exit"]:
         raise HTTPException(status_code=400, detail="Action must be 'enter' or 'exit'")
     
-    # 重複チェック
-    last_action = get_last_action()
-    if last_action == action:
+    # 重複チェック後にデータベースに記録
+    try:
+        entry = await database.write(insert_action, action, user_id)
+    except users.UnknownUserError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    if entry is None:
         return {
             "status": "ignored", 
             "message": f"Duplicate {action} action ignored", 
-            "action": action
+            "action": action,
+            "user_id": user_id
         }
     
-    # データベースに記録
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO attendance_logs (action) VALUES (?)", (action,))
-    conn.commit()
-    conn.close()
+    # 接続中のダッシュボードへ即時配信
+    event_hub.publish(log_event(entry))
     
     return {
         "status": "success", 
         "message": f"Successfully recorded {action}", 
-        "action": action
+        "action": action,
+        "user_id": user_id
+    }
+
+# ヘルスチェック
+@app.get("/")
+async def health_check():
+    return {
+        "status": "ok", 
+        "message": "Lab Attendance API is running",
+        "version": "1.0.0",
+        "database": "ok" if await database.ping() else "unavailable"
     }
 
-# データ取得用エンドポイント（フロントエンド用）
+# Prometheus形式のメトリクス（このワーカーの分のみ）
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# 入退室記録エンドポイント（POST）
+@app.post("/api/lab-entry")
+async def lab_entry_post(entry: AttendanceEntry):
+    return await record_action(entry.action, entry.user_id)
+
+# 入退室記録エンドポイント（GET）
+@app.get("/api/lab-entry")
+async def lab_entry_get(action: str, user_id: int = users.DEFAULT_USER_ID):
+    return await record_action(action, user_id)
+
+# メンバー一覧
+@app.get("/api/users")
+async def get_users():
+    return {"users": await database.read(users.list_users)}
+
+# メンバー登録（以降 user_id を付けて記録・参照する）
+def insert_user(conn, name: str):
+    with write_transaction(conn):
+        return users.create_user(conn, name)
+
+@app.post("/api/users", status_code=201)
+async def create_user(user: NewUser):
+    name = user.name.strip()
+    if not name or len(name) > users.MAX_NAME_LENGTH:
+        raise HTTPException(status_code=400, detail=f"name must be 1-{users.MAX_NAME_LENGTH} characters")
+    try:
+        return await database.write(insert_user, name)
+    except users.DuplicateUserError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+# 現在在室中のメンバー（presence テーブルをメンバー数分読むだけで、ログは走査しない）
+@app.get("/api/presence")
+async def get_presence(request: Request, response: Response):
+    await refresh_status_cache()
+    cached = not_modified(request, response, f'"presence-{status_cache.max_id()}"')
+    if cached:
+        return cached
+    members = await database.read(users.fetch_present)
+    for member in members:
+        member["since"] = to_iso8601(member["since"]) if member["since"] else None
+    return {"count": len(members), "members": members}
+
+# データ取得用エンドポイント（フロントエンド用）。user_id を省略すると全メンバーのログを返す
 @app.get("/api/attendance-data")
-async def get_attendance_data(days: int = 30):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+async def get_attendance_data(
+    request: Request,
+    response: Response,
+    days: int = 30,
+    after_id: int = 0,
+    user_id: Optional[int] = None
+):
+    # キャッシュ済みの最新IDと期間の起点（分単位）だけで ETag を決め、一致すれば DB を読まない
+    await refresh_status_cache()
+    max_id = status_cache.max_id()
+    window = int(window_start(days).replace(tzinfo=datetime.timezone.utc).timestamp()) // 60
+    member = "all" if user_id is None else user_id
+    cached = not_modified(request, response, f'"logs-{member}-{days}-{after_id}-{window}-{max_id}"')
+    if cached:
+        return cached
     
-    # 指定日数分のデータを取得
-    cursor.execute("""
-        SELECT id, action, timestamp 
-        FROM attendance_logs 
-        WHERE timestamp >= datetime('now', '-{} days')
-        ORDER BY timestamp ASC
-    """.format(days))
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    # データを整形
-    attendance_data = []
-    for row in rows:
-        attendance_data.append({
-            "id": row[0],
-            "action": row[1],
-            "timestamp": to_iso8601(row[2]) if row[2] else None
-        })
+    if JSON_RESPONSE_MODE == "fast":
+        body = await database.read(fetch_log_json_since, days, after_id, user_id)
+        return json_response.raw_json(body, response.headers)
+    
+    attendance_data = await database.read(fetch_logs_since, days, after_id, user_id)
     
     return {
         "data": attendance_data, 
         "count": len(attendance_data),
-        "days": days
+        "days": days,
+        "last_id": max((row["id"] for row in attendance_data), default=after_id)
     }
 
 # 最新のステータス取得
 @app.get("/api/status")
-async def get_status():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT action, timestamp 
-        FROM attendance_logs 
-        ORDER BY timestamp DESC 
-        LIMIT 1
-    """)
-    result = cursor.fetchone()
-    conn.close()
+async def get_status(request: Request, response: Response, user_id: int = users.DEFAULT_USER_ID):
+    # キャッシュから返す（単一ワーカーではSQLiteにはアクセスしない）
+    await refresh_status_cache()
+    cached = not_modified(request, response, f'"status-{user_id}-{status_cache.max_id()}"')
+    if cached:
+        return cached
+    last = status_cache.current(user_id)
     
-    if result:
+    if last:
         return {
-            "current_status": result[0],
-            "last_action_time": to_iso8601(result[1]) if result[1] else None
+            "current_status": last.action,
+            "last_action_time": to_iso8601(last.timestamp) if last.timestamp else None
         }
     else:
         return {
@@ -195,6 +523,133 @@ async def get_status():
             "last_action_time": None
         }
 
+# 入退室イベントのリアルタイム配信（Server-Sent Events）。全メンバーのイベントを user_id 付きで流す
+@app.get("/api/events")
+async def stream_events(user_id: int = users.DEFAULT_USER_ID):
+    try:
+        subscriber = event_hub.subscribe()
+    except TooManySubscribersError:
+        raise HTTPException(status_code=503, detail="Too many event stream subscribers")
+    except HubClosedError:
+        raise HTTPException(status_code=503, detail="Server is shutting down")
+    
+    # 接続直後に指定メンバーの最新ログを送り、クライアントの状態を同期させる
+    await refresh_status_cache()
+    latest = status_cache.current(user_id)
+    return StreamingResponse(
+        event_hub.stream(subscriber, log_event(latest) if latest else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 端末でバッファされた入退室の一括登録
+@app.post("/api/lab-entry/batch")
+async def lab_entry_batch(batch: BatchEntries):
+    if len(batch.events) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_EVENTS} events per batch")
+    for event in batch.events:
+        if event.action not in ["enter", "exit"]:
+            raise HTTPException(status_code=400, detail="Action must be 'enter' or 'exit'")
+    
+    results, entries = await database.write(insert_batch, batch.events)
+    for entry in entries:
+        event_hub.publish(log_event(entry))
+    
+    return {
+        "status": "success",
+        "recorded": len(entries),
+        "skipped": len(results) - len(entries),
+        "results": results
+    }
+
+# 全履歴のストリーミングエクスポート（NDJSON / CSV）
+# after_id 以降をID順に返す。limit を付ければ続きは最後の行のIDを after_id にして取得できる
+@app.get("/api/export")
+async def export_logs(format: str = "ndjson", after_id: int = 0, limit: Optional[int] = Query(None, ge=1)):
+    if format not in ["ndjson", "csv"]:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        iter_export(format, after_id, limit),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="attendance.{format}"'}
+    )
+
+# 滞在セッションと日別合計（サーバー側で集計）
+@app.get("/api/sessions")
+async def get_sessions(
+    request: Request,
+    response: Response,
+    from_: Optional[datetime.date] = Query(None, alias="from"),
+    to: Optional[datetime.date] = None,
+    tz: str = DEFAULT_TIMEZONE,
+    user_id: int = users.DEFAULT_USER_ID
+):
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+    
+    last = to or datetime.datetime.now(zone).date()
+    first = from_ or last - datetime.timedelta(days=DEFAULT_SESSION_DAYS - 1)
+    if first > last:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (last - first).days >= MAX_SESSION_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be at most {MAX_SESSION_DAYS} days")
+    
+    # 在室中でなければ結果は最新ログIDだけで決まるので304を返せる（在室中は現在時刻に依存）
+    await refresh_status_cache()
+    max_id = status_cache.max_id()
+    latest = status_cache.current(user_id)
+    if not latest or latest.action != "enter":
+        cached = not_modified(request, response, f'"sessions-{user_id}-{first}-{last}-{zone.key}-{max_id}"')
+        if cached:
+            return cached
+    
+    return await database.read(sessions.summarize, first, last, zone, None, user_id)
+
+# 日別集計テーブルからの期間サマリー（1日あたり最大1行しか読まない）
+@app.get("/api/summary")
+async def get_summary(
+    from_: Optional[datetime.date] = Query(None, alias="from"),
+    to: Optional[datetime.date] = None,
+    granularity: str = "day",
+    user_id: int = users.DEFAULT_USER_ID
+):
+    if granularity not in rollup.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(rollup.GRANULARITIES)}")
+    
+    last = to or datetime.datetime.now(ZoneInfo(rollup.ROLLUP_TIMEZONE)).date()
+    first = from_ or last.replace(month=1, day=1)
+    if first > last:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    
+    return await database.read(rollup.summarize, first, last, granularity, user_id)
+
+# 長期統計（週・月平均、時間帯別の在室率、最長連続日数、入退室時刻の分布）
+@app.get("/api/stats")
+async def get_stats(
+    from_: Optional[datetime.date] = Query(None, alias="from"),
+    to: Optional[datetime.date] = None,
+    tz: str = DEFAULT_TIMEZONE,
+    user_id: int = users.DEFAULT_USER_ID
+):
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+    
+    last = to or datetime.datetime.now(zone).date()
+    first = from_ or last - datetime.timedelta(days=DEFAULT_STATS_DAYS - 1)
+    if first > last:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (last - first).days >= MAX_SESSION_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be at most {MAX_SESSION_DAYS} days")
+    
+    await refresh_status_cache()
+    return await database.read(stats_cache.compute, status_cache.max_id(), first, last, zone, user_id)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
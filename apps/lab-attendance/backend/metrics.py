@@ -0,0 +1,411 @@
+"""Prometheus text-format metrics without a client library dependency.
+
+Collected per worker process:
+
+* HTTP requests per route template (counter by status, latency histogram),
+  recorded by the route class from :meth:`Metrics.route_class`. Timing the
+  endpoint handler rather than wrapping the ASGI app avoids intercepting every
+  ``send``; a streaming response is timed until its handler returns;
+* SQLite statement timings and rows fetched, recorded by connections created
+  through :meth:`Metrics.connection_factory`, which wraps ``execute`` and
+  ``executemany``. Statements are labelled by operation and table
+  (e.g. ``select``/``attendance_logs``), so label cardinality stays fixed;
+* cache hits and misses, read at scrape time from objects exposing ``hits``
+  and ``misses`` counters (see :meth:`Metrics.add_cache`);
+* event-loop lag, sampled by :meth:`Metrics.monitor_event_loop`.
+
+Recording is a lock, a ``bisect`` and a few additions; formatting happens only
+when ``/metrics`` is scraped.
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Sequence, Tuple, Type
+
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+DEFAULT_LAG_INTERVAL = 0.5  # seconds
+
+# Cap on distinct SQL strings remembered by the statement classifier; queries
+# with a variable number of placeholders are classified again instead.
+_MAX_CLASSIFIED_STATEMENTS = 1024
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterSeries:
+    """Value of one label set of a :class:`Counter`."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramSeries:
+    """Buckets of one label set of a :class:`Histogram`; the last slot counts +Inf.
+
+    The observation count is the sum of the buckets, worked out when rendering.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Labels, _CounterSeries] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, labels: Labels = ()) -> _CounterSeries:
+        """The series for ``labels``; hot paths keep it instead of looking it up each time."""
+
+        series = self._series.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(labels, _CounterSeries())
+        return series
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        self.labels(labels).inc(amount)
+
+    def value(self, labels: Labels = ()) -> float:
+        series = self._series.get(labels)
+        return series.value if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, series.value) for key, series in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, labels: Labels = ()) -> _HistogramSeries:
+        series = self._series.get(labels)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(labels, _HistogramSeries(self.buckets))
+        return series
+
+    def observe(self, labels: Labels, value: float) -> None:
+        self.labels(labels).observe(value)
+
+    def count(self, labels: Labels = ()) -> int:
+        series = self._series.get(labels)
+        return sum(series.snapshot()[0]) if series else 0
+
+    def counts(self) -> List[Tuple[Labels, int]]:
+        """Observation count of every label set, sorted by labels."""
+
+        with self._lock:
+            items = sorted(self._series.items())
+        return [(key, sum(series.snapshot()[0])) for key, series in items]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in items:
+            counts, total = series.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class HitCounter:
+    """Hit/miss tally for caches that do not keep their own."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self) -> None:
+        self.hits += 1
+
+    def miss(self) -> None:
+        self.misses += 1
+
+
+def classify_statement(sql: str) -> Tuple[str, str]:
+    """``(operation, table)`` label values for a SQL statement."""
+
+    stripped = sql.lstrip()
+    operation = stripped.split(None, 1)[0].lower() if stripped else ""
+    match = _TABLE_PATTERN.search(stripped)
+    return operation, match.group(1).lower() if match else ""
+
+
+class _Statement:
+    __slots__ = ("duration", "rows", "returns_rows")
+
+    def __init__(self, duration: _HistogramSeries, rows: _CounterSeries, returns_rows: bool) -> None:
+        self.duration = duration
+        self.rows = rows
+        self.returns_rows = returns_rows
+
+
+class QueryMetrics:
+    def __init__(self) -> None:
+        self.duration = Histogram(
+            "lab_sqlite_query_duration_seconds",
+            "Time spent in sqlite3 execute/executemany, by statement kind.",
+            ("operation", "table"),
+            QUERY_BUCKETS,
+        )
+        self.rows = Counter(
+            "lab_sqlite_rows_returned_total",
+            "Rows returned by fetchone/fetchmany/fetchall, by statement kind.",
+            ("operation", "table"),
+        )
+        self._statements: Dict[str, _Statement] = {}
+
+    def statement(self, sql: str) -> _Statement:
+        """Series to record ``sql`` into, resolved once per distinct SQL string."""
+
+        statement = self._statements.get(sql)
+        if statement is None:
+            labels = classify_statement(sql)
+            returns_rows = labels[0] in ("select", "with", "pragma") or "returning" in sql.lower()
+            statement = _Statement(self.duration.labels(labels), self.rows.labels(labels), returns_rows)
+            if len(self._statements) < _MAX_CLASSIFIED_STATEMENTS:
+                self._statements[sql] = statement
+        return statement
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Counts rows handed out by the ``fetch*`` methods.
+
+    Rows consumed by iterating the cursor directly are not counted; wrapping
+    ``__next__`` would put a Python call on every row of the bulk read paths.
+    """
+
+    __slots__ = ("rows_returned",)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.rows_returned.inc()
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        if rows:
+            self.rows_returned.inc(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if rows:
+            self.rows_returned.inc(len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose ``execute``/``executemany`` are timed into :attr:`query_metrics`."""
+
+    query_metrics: QueryMetrics
+
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        return self._timed(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql: str, parameters: Iterable[Any]) -> sqlite3.Cursor:
+        return self._timed(sqlite3.Cursor.executemany, sql, parameters)
+
+    def _timed(self, method: Callable[..., Any], sql: str, parameters: Any) -> sqlite3.Cursor:
+        statement = self.query_metrics.statement(sql)
+        # Only statements that produce rows pay for the row-counting cursor.
+        if statement.returns_rows:
+            cursor = self.cursor(InstrumentedCursor)
+            cursor.rows_returned = statement.rows
+        else:
+            cursor = self.cursor()
+        started = time.perf_counter()
+        try:
+            method(cursor, sql, parameters)
+        finally:
+            statement.duration.observe(time.perf_counter() - started)
+        return cursor
+
+
+class Metrics:
+    """All metrics of one worker process, rendered by :meth:`render`."""
+
+    def __init__(self) -> None:
+        # One observation per request; lab_http_requests_total is derived from
+        # its counts at scrape time rather than kept as a second series.
+        self.request_duration = Histogram(
+            "lab_http_request_duration_seconds",
+            "Endpoint handler latency by route template and status.",
+            ("method", "route", "status"),
+        )
+        self._request_series: Dict[Tuple[str, str, int], _HistogramSeries] = {}
+        self.queries = QueryMetrics()
+        self.loop_lag = Histogram(
+            "lab_event_loop_lag_seconds",
+            "How late the event loop woke up for a scheduled sleep.",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+        )
+        self._caches: Dict[str, Any] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+    def connection_factory(self) -> Type[sqlite3.Connection]:
+        """A ``sqlite3.connect(factory=...)`` class reporting into these metrics."""
+
+        return type("InstrumentedConnection", (InstrumentedConnection,), {"query_metrics": self.queries})
+
+    def route_class(self) -> Type[APIRoute]:
+        """An ``APIRoute`` subclass recording requests into these metrics (set as ``router.route_class``)."""
+
+        metrics = self
+
+        class MetricsRoute(APIRoute):
+            def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+                handler = super().get_route_handler()
+                path = self.path
+
+                async def timed_handler(request: Request) -> Response:
+                    status = 500
+                    started = time.perf_counter()
+                    try:
+                        response = await handler(request)
+                        status = response.status_code
+                        return response
+                    except HTTPException as exc:
+                        status = exc.status_code
+                        raise
+                    except RequestValidationError:
+                        status = 422
+                        raise
+                    finally:
+                        metrics.observe_request(request.method, path, status, time.perf_counter() - started)
+
+                return timed_handler
+
+        return MetricsRoute
+
+    def add_cache(self, name: str, cache: Any) -> None:
+        """Export ``cache.hits``/``cache.misses`` and their ratio under ``cache="<name>"``."""
+
+        self._caches[name] = cache
+
+    def add_gauge(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self._gauges[name] = (help, read)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route, status)
+        series = self._request_series.get(key)
+        if series is None:
+            series = self._request_series[key] = self.request_duration.labels((method, route, str(status)))
+        series.observe(seconds)
+
+    async def monitor_event_loop(self, interval: float = DEFAULT_LAG_INTERVAL) -> None:
+        """Sleep ``interval`` repeatedly and record how much later than asked each wake-up was."""
+
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe((), max(0.0, loop.time() - started - interval))
+
+    def render(self) -> str:
+        lines = [
+            "# HELP lab_http_requests_total HTTP requests by route template and status.",
+            "# TYPE lab_http_requests_total counter",
+        ]
+        lines += [
+            f"lab_http_requests_total{_format_labels(self.request_duration.labelnames, key)} {count}"
+            for key, count in self.request_duration.counts()
+        ]
+        for metric in (self.request_duration, self.queries.duration, self.queries.rows, self.loop_lag):
+            lines += metric.render()
+
+        caches = sorted(self._caches.items())
+        for suffix, kind, help, read in (
+            ("hits_total", "counter", "Cache hits.", lambda c: c.hits),
+            ("misses_total", "counter", "Cache misses.", lambda c: c.misses),
+            ("hit_ratio", "gauge", "Hits / (hits + misses) since start.", _hit_ratio),
+        ):
+            name = f"lab_cache_{suffix}"
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [
+                f"{name}{_format_labels(('cache',), (cache_name,))} {_format_value(read(cache))}"
+                for cache_name, cache in caches
+            ]
+
+        for name, (help, read) in sorted(self._gauges.items()):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {_format_value(read())}"]
+        return "\n".join(lines) + "\n"
+
+
+def _hit_ratio(cache: Any) -> float:
+    total = cache.hits + cache.misses
+    return cache.hits / total if total else 0.0
@@ -0,0 +1,182 @@
+"""Per-day rollup of stay time, kept in the ``daily_totals`` table.
+
+Totals are kept per member. The write path calls :func:`apply_session`
+whenever an exit closes a session, inside the same transaction as the insert,
+so range summaries never need to touch ``attendance_logs``.
+``python rollup.py rebuild`` regenerates the table from the raw logs (e.g.
+after a restore or a change of ``LAB_TIMEZONE``).
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import sqlite3
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sessions import Session, iter_sessions, split_by_day
+from users import DEFAULT_USER_ID
+
+# Calendar days are cut at local midnight in this zone.
+ROLLUP_TIMEZONE = os.environ.get("LAB_TIMEZONE", "Asia/Tokyo")
+
+GRANULARITIES = ("day", "week", "month", "year")
+
+
+def create_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            total_seconds INTEGER NOT NULL DEFAULT 0,
+            session_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, date)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _day_pieces(session: Session, tz: ZoneInfo) -> List[Tuple[str, int]]:
+    pieces = [
+        (date.isoformat(), int((end - start).total_seconds()))
+        for date, start, end in split_by_day(session, tz)
+    ]
+    # An exit in the same second as its enter still counts as a session.
+    return pieces or [(session.start.astimezone(tz).date().isoformat(), 0)]
+
+
+def apply_session(
+    conn: sqlite3.Connection,
+    session: Session,
+    tz: Optional[ZoneInfo] = None,
+    user_id: int = DEFAULT_USER_ID,
+) -> None:
+    """Add a member's closed session to the rollup; a session crossing midnight updates each day it covers."""
+
+    pieces = _day_pieces(session, tz or ZoneInfo(ROLLUP_TIMEZONE))
+    conn.executemany(
+        """
+        INSERT INTO daily_totals (user_id, date, total_seconds, session_count) VALUES (?, ?, ?, 1)
+        ON CONFLICT (user_id, date) DO UPDATE SET
+            total_seconds = total_seconds + excluded.total_seconds,
+            session_count = session_count + 1
+        """,
+        [(user_id, date, seconds) for date, seconds in pieces],
+    )
+
+
+def rebuild(conn: sqlite3.Connection, tz: Optional[ZoneInfo] = None) -> int:
+    """Recompute ``daily_totals`` from ``attendance_logs``; returns the number of rows written.
+
+    The caller owns the transaction.
+    """
+
+    zone = tz or ZoneInfo(ROLLUP_TIMEZONE)
+    totals: Dict[Tuple[int, str], List[int]] = defaultdict(lambda: [0, 0])
+    # Each member's logs pair into sessions on their own; the composite index
+    # delivers them already grouped and in order.
+    cursor = conn.execute(
+        "SELECT user_id, action, timestamp FROM attendance_logs ORDER BY user_id, timestamp ASC, id ASC"
+    )
+    for user_id, rows in groupby(cursor, key=itemgetter(0)):
+        for session in iter_sessions(row[1:] for row in rows):
+            for date, seconds in _day_pieces(session, zone):
+                totals[user_id, date][0] += seconds
+                totals[user_id, date][1] += 1
+
+    conn.execute("DELETE FROM daily_totals")
+    conn.executemany(
+        "INSERT INTO daily_totals (user_id, date, total_seconds, session_count) VALUES (?, ?, ?, ?)",
+        ((user_id, date, seconds, count) for (user_id, date), (seconds, count) in sorted(totals.items())),
+    )
+    return len(totals)
+
+
+def _period_key(date: datetime.date, granularity: str) -> str:
+    if granularity == "week":
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "month":
+        return date.strftime("%Y-%m")
+    if granularity == "year":
+        return str(date.year)
+    return date.isoformat()
+
+
+def summarize(
+    conn: sqlite3.Connection,
+    first: datetime.date,
+    last: datetime.date,
+    granularity: str = "day",
+    user_id: int = DEFAULT_USER_ID,
+) -> Dict[str, object]:
+    """A member's totals of closed sessions per day/week/month/year, read from the rollup only."""
+
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    periods: Dict[str, Dict[str, object]] = {}
+    rows = conn.execute(
+        """
+        SELECT date, total_seconds, session_count FROM daily_totals
+        WHERE user_id = ? AND date >= ? AND date <= ?
+        ORDER BY date ASC
+        """,
+        (user_id, first.isoformat(), last.isoformat()),
+    )
+    total_seconds = 0
+    for date_text, seconds, count in rows:
+        key = _period_key(datetime.date.fromisoformat(date_text), granularity)
+        period = periods.setdefault(
+            key, {"period": key, "total_seconds": 0, "session_count": 0, "active_days": 0}
+        )
+        period["total_seconds"] += seconds
+        period["session_count"] += count
+        period["active_days"] += 1 if seconds > 0 else 0
+        total_seconds += seconds
+
+    for period in periods.values():
+        period["total_minutes"] = int(period["total_seconds"] / 60 + 0.5)
+
+    return {
+        "user_id": user_id,
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "tz": ROLLUP_TIMEZONE,
+        "granularity": granularity,
+        "total_minutes": int(total_seconds / 60 + 0.5),
+        "periods": list(periods.values()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the daily_totals rollup table")
+    parser.add_argument("command", choices=["rebuild"], help="operation to run")
+    parser.add_argument(
+        "--db",
+        default=os.environ.get("DB_PATH", os.path.join(os.path.dirname(__file__), "attendance.db")),
+        help="Path to SQLite database file",
+    )
+    parser.add_argument("--tz", default=ROLLUP_TIMEZONE, help="Time zone for day boundaries")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"Database file not found: {args.db}")
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        with conn:
+            create_table(conn)
+            days = rebuild(conn, ZoneInfo(args.tz))
+    finally:
+        conn.close()
+    print(f"Rebuilt daily_totals ({days} member-days) in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Pair enter/exit logs into stay sessions and total them per local calendar day."""
+from __future__ import annotations
+
+import datetime
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from users import DEFAULT_USER_ID
+
+UTC = datetime.timezone.utc
+SQLITE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@dataclass(frozen=True)
+class Session:
+    start: datetime.datetime  # aware, UTC
+    end: datetime.datetime  # aware, UTC
+    ongoing: bool = False
+
+
+@dataclass
+class DayTotal:
+    date: datetime.date
+    total_minutes: int = 0
+    sessions: List[Dict[str, object]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "date": self.date.isoformat(),
+            "total_minutes": self.total_minutes,
+            "sessions": self.sessions,
+        }
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    """Parse a SQLite ``CURRENT_TIMESTAMP`` style string (UTC) into an aware datetime."""
+
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=UTC)
+    return parsed.astimezone(UTC)
+
+
+def format_timestamp(value: datetime.datetime) -> str:
+    """Inverse of :func:`parse_timestamp`, for comparisons against stored timestamps."""
+
+    return value.astimezone(UTC).strftime(SQLITE_TIMESTAMP_FORMAT)
+
+
+def to_iso(value: datetime.datetime) -> str:
+    return value.astimezone(UTC).isoformat().replace("+00:00", "Z")
+
+
+def local_day_bounds(
+    first: datetime.date, last: datetime.date, tz: ZoneInfo
+) -> Tuple[datetime.datetime, datetime.datetime]:
+    """UTC instants of local midnight starting ``first`` and ending ``last``."""
+
+    start = datetime.datetime.combine(first, datetime.time(), tzinfo=tz)
+    end = datetime.datetime.combine(last + datetime.timedelta(days=1), datetime.time(), tzinfo=tz)
+    return start.astimezone(UTC), end.astimezone(UTC)
+
+
+def fetch_logs_around(
+    conn: sqlite3.Connection,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    user_id: int = DEFAULT_USER_ID,
+) -> Tuple[List[Tuple[str, str]], int]:
+    """A member's logs in ``[start, end)`` plus the neighbours just outside the range.
+
+    The row before ``start`` supplies an enter that opened a session still
+    running at ``start``; the row at/after ``end`` closes a session that runs
+    past ``end``. Returns the rows and the number of logs inside the range.
+    All three queries are range seeks on the ``(user_id, timestamp)`` index.
+    """
+
+    start_text, end_text = format_timestamp(start), format_timestamp(end)
+    before = conn.execute(
+        """
+        SELECT action, timestamp FROM attendance_logs
+        WHERE user_id = ? AND timestamp < ?
+        ORDER BY timestamp DESC, id DESC LIMIT 1
+        """,
+        (user_id, start_text),
+    ).fetchall()
+    inside = conn.execute(
+        """
+        SELECT action, timestamp FROM attendance_logs
+        WHERE user_id = ? AND timestamp >= ? AND timestamp < ?
+        ORDER BY timestamp ASC, id ASC
+        """,
+        (user_id, start_text, end_text),
+    ).fetchall()
+    after = conn.execute(
+        """
+        SELECT action, timestamp FROM attendance_logs
+        WHERE user_id = ? AND timestamp >= ?
+        ORDER BY timestamp ASC, id ASC LIMIT 1
+        """,
+        (user_id, end_text),
+    ).fetchall()
+    return before + inside + after, len(inside)
+
+
+def pair_sessions(
+    logs: Iterable[Tuple[str, str]], now: datetime.datetime
+) -> List[Session]:
+    """Turn chronologically ordered ``(action, timestamp)`` rows into sessions.
+
+    An enter immediately followed by an exit forms a session. An enter that is
+    the very last log is still in progress and runs until ``now``. Any other
+    enter (followed by another enter) is dropped, as the dashboard always did.
+    """
+
+    return list(iter_sessions(logs, now))
+
+
+def iter_sessions(
+    logs: Iterable[Tuple[str, str]], now: Optional[datetime.datetime] = None
+) -> Iterator[Session]:
+    """Streaming form of :func:`pair_sessions`; the open session is skipped when ``now`` is None."""
+
+    pending: Optional[datetime.datetime] = None
+    for action, timestamp in logs:
+        if pending is not None and action == "exit" and timestamp:
+            yield Session(pending, parse_timestamp(timestamp))
+        pending = parse_timestamp(timestamp) if action == "enter" and timestamp else None
+    if pending is not None and now is not None and pending < now:
+        yield Session(pending, now, ongoing=True)
+
+
+def split_by_day(
+    session: Session, tz: ZoneInfo
+) -> Iterable[Tuple[datetime.date, datetime.datetime, datetime.datetime]]:
+    """Yield ``(local_date, start, end)`` pieces of ``session`` cut at local midnight."""
+
+    cursor = session.start
+    while cursor < session.end:
+        local = cursor.astimezone(tz)
+        next_midnight = datetime.datetime.combine(
+            local.date() + datetime.timedelta(days=1), datetime.time(), tzinfo=tz
+        ).astimezone(UTC)
+        piece_end = min(session.end, next_midnight)
+        yield local.date(), cursor, piece_end
+        cursor = piece_end
+
+
+def round_minutes(start: datetime.datetime, end: datetime.datetime) -> int:
+    # Round half up to whole minutes, matching the dashboard's original calculation.
+    return int((end - start).total_seconds() / 60 + 0.5)
+
+
+def daily_totals(
+    sessions: Iterable[Session],
+    first: datetime.date,
+    last: datetime.date,
+    tz: ZoneInfo,
+) -> List[DayTotal]:
+    """Per-day totals for every local date in ``[first, last]``, including empty days."""
+
+    days: Dict[datetime.date, DayTotal] = {}
+    cursor = first
+    while cursor <= last:
+        days[cursor] = DayTotal(cursor)
+        cursor += datetime.timedelta(days=1)
+
+    range_start, range_end = local_day_bounds(first, last, tz)
+    for session in sessions:
+        clipped = Session(
+            max(session.start, range_start), min(session.end, range_end), session.ongoing
+        )
+        for date, start, end in split_by_day(clipped, tz):
+            day = days.get(date)
+            if day is None:
+                continue
+            minutes = round_minutes(start, end)
+            if minutes <= 0:
+                continue
+            day.total_minutes += minutes
+            day.sessions.append(
+                {
+                    "start": to_iso(start),
+                    "end": to_iso(end),
+                    "minutes": minutes,
+                    "ongoing": session.ongoing and end == session.end,
+                }
+            )
+    return list(days.values())
+
+
+def summarize(
+    conn: sqlite3.Connection,
+    first: datetime.date,
+    last: datetime.date,
+    tz: ZoneInfo,
+    now: Optional[datetime.datetime] = None,
+    user_id: int = DEFAULT_USER_ID,
+) -> Dict[str, object]:
+    now = now or datetime.datetime.now(UTC)
+    start, end = local_day_bounds(first, last, tz)
+    logs, event_count = fetch_logs_around(conn, start, end, user_id)
+    days = daily_totals(pair_sessions(logs, now), first, last, tz)
+    return {
+        "user_id": user_id,
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "tz": tz.key,
+        "event_count": event_count,
+        "total_minutes": sum(day.total_minutes for day in days),
+        "days": [day.to_dict() for day in days],
+    }
@@ -0,0 +1,275 @@
+"""Long-range attendance statistics computed with NumPy.
+
+Each member's logs are held as two parallel arrays (epoch seconds and an
+is-enter flag) that are cached by the highest log id and extended in place
+when new rows are appended. Sessions, per-day totals, hour-of-day occupancy and
+streaks are then derived with array operations only; no Python loop runs
+per log row or per session.
+"""
+from __future__ import annotations
+
+import datetime
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from users import DEFAULT_USER_ID
+
+DAY = 86_400
+HOUR = 3_600
+RESULT_CACHE_SIZE = 32
+
+LOG_ARRAY_QUERY = """
+    SELECT id, action = 'enter', CAST(strftime('%s', timestamp) AS INTEGER)
+    FROM attendance_logs
+    WHERE user_id = ? AND id > ? AND timestamp IS NOT NULL
+    ORDER BY timestamp ASC, id ASC
+"""
+
+
+class LogArrays:
+    """Timestamp-ordered log columns as NumPy arrays."""
+
+    def __init__(self, ids: np.ndarray, is_enter: np.ndarray, epoch: np.ndarray) -> None:
+        self.ids = ids
+        self.is_enter = is_enter
+        self.epoch = epoch
+
+    @classmethod
+    def empty(cls) -> "LogArrays":
+        return cls(np.empty(0, np.int64), np.empty(0, bool), np.empty(0, np.int64))
+
+    @classmethod
+    def fetch(
+        cls, conn: sqlite3.Connection, after_id: int = 0, user_id: int = DEFAULT_USER_ID
+    ) -> "LogArrays":
+        rows = conn.execute(LOG_ARRAY_QUERY, (user_id, after_id)).fetchall()
+        if not rows:
+            return cls.empty()
+        table = np.array(rows, dtype=np.int64)
+        return cls(table[:, 0], table[:, 1].astype(bool), table[:, 2])
+
+    def extend(self, other: "LogArrays") -> "LogArrays":
+        return LogArrays(
+            np.concatenate([self.ids, other.ids]),
+            np.concatenate([self.is_enter, other.is_enter]),
+            np.concatenate([self.epoch, other.epoch]),
+        )
+
+
+class StatsCache:
+    """Per-member log arrays and computed results, keyed by the highest log id.
+
+    Rows are only ever appended, so when the max id moves the cache first
+    tries to load just the member's new rows; a full reload happens only if
+    one of them sorts before the cached tail (which the write paths do not
+    allow). Results for a given ``(member, max_id, range, tz)`` are memoised,
+    so repeated dashboard requests cost a dictionary lookup.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # user_id -> (max log id the arrays were loaded at, arrays)
+        self._arrays: Dict[int, Tuple[int, LogArrays]] = {}
+        self._results: "OrderedDict[Tuple, Dict[str, object]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def arrays(self, conn: sqlite3.Connection, max_id: int, user_id: int = DEFAULT_USER_ID) -> LogArrays:
+        with self._lock:
+            cached_id, arrays = self._arrays.get(user_id, (-1, None))
+            if max_id == cached_id:
+                return arrays
+            if max_id > cached_id >= 0:
+                fresh = LogArrays.fetch(conn, cached_id, user_id)
+                tail = arrays.epoch[-1] if arrays.epoch.size else None
+                if tail is None or not fresh.epoch.size or fresh.epoch[0] >= tail:
+                    arrays = arrays.extend(fresh)
+                else:
+                    arrays = LogArrays.fetch(conn, 0, user_id)
+            else:
+                arrays = LogArrays.fetch(conn, 0, user_id)
+            self._arrays[user_id] = (max_id, arrays)
+            for key in [key for key in self._results if key[0] == user_id]:
+                del self._results[key]
+            return arrays
+
+    def compute(
+        self,
+        conn: sqlite3.Connection,
+        max_id: int,
+        first: datetime.date,
+        last: datetime.date,
+        tz: ZoneInfo,
+        user_id: int = DEFAULT_USER_ID,
+    ) -> Dict[str, object]:
+        key = (user_id, max_id, first, last, tz.key)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and max_id == self._arrays[user_id][0]:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        result = compute_stats(self.arrays(conn, max_id, user_id), first, last, tz)
+        result["user_id"] = user_id
+        with self._lock:
+            if max_id == self._arrays[user_id][0]:
+                self._results[key] = result
+                while len(self._results) > RESULT_CACHE_SIZE:
+                    self._results.popitem(last=False)
+        return result
+
+
+def local_offsets(epoch: np.ndarray, tz: ZoneInfo) -> np.ndarray:
+    """UTC offset in seconds for every timestamp.
+
+    Offsets only change on hour boundaries, so ``utcoffset`` is evaluated once
+    per distinct UTC hour present in the data instead of once per row.
+    """
+
+    if not epoch.size:
+        return np.empty(0, np.int64)
+    hours, inverse = np.unique(epoch // HOUR, return_inverse=True)
+    offsets = np.fromiter(
+        (
+            datetime.datetime.fromtimestamp(int(hour) * HOUR, tz).utcoffset().total_seconds()
+            for hour in hours
+        ),
+        dtype=np.int64,
+        count=hours.size,
+    )
+    return offsets[inverse]
+
+
+def occupied_before(starts: np.ndarray, ends: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    """Total session seconds elapsed before each instant in ``bounds``.
+
+    For sorted starts/ends this is ``sum(t - s for s < t) - sum(t - e for e < t)``,
+    which prefix sums and ``searchsorted`` give for all bounds at once.
+    Occupancy inside ``[a, b)`` is then ``F(b) - F(a)``.
+    """
+
+    starts = np.sort(starts)
+    ends = np.sort(ends)
+    start_prefix = np.concatenate([[0], np.cumsum(starts)])
+    end_prefix = np.concatenate([[0], np.cumsum(ends)])
+    started = np.searchsorted(starts, bounds, side="left")
+    ended = np.searchsorted(ends, bounds, side="left")
+    return (started * bounds - start_prefix[started]) - (ended * bounds - end_prefix[ended])
+
+
+def longest_run(active: np.ndarray) -> Tuple[int, int]:
+    """Length and start index of the longest run of True values."""
+
+    if not active.any():
+        return 0, 0
+    padded = np.concatenate([[False], active, [False]]).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    run_starts, run_ends = edges[0::2], edges[1::2]
+    lengths = run_ends - run_starts
+    best = int(np.argmax(lengths))
+    return int(lengths[best]), int(run_starts[best])
+
+
+def _time_of_day(seconds: np.ndarray) -> Dict[str, object]:
+    if not seconds.size:
+        return {"histogram": [0] * 24, "mean": None, "median": None}
+    of_day = seconds % DAY
+
+    def clock(value: float) -> str:
+        minutes = int(round(value / 60)) % (24 * 60)
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    return {
+        "histogram": np.bincount(of_day // HOUR, minlength=24).tolist(),
+        "mean": clock(float(of_day.mean())),
+        "median": clock(float(np.median(of_day))),
+    }
+
+
+def _group_totals(day_numbers: np.ndarray, totals: np.ndarray, unit: str) -> list:
+    days = day_numbers.astype("datetime64[D]")
+    if unit == "week":
+        # Monday-based weeks: 1970-01-01 was a Thursday.
+        keys = days - ((day_numbers + 3) % 7).astype("timedelta64[D]")
+    else:
+        keys = days.astype("datetime64[M]")
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=totals, minlength=unique_keys.size)
+    active = np.bincount(inverse, weights=totals > 0, minlength=unique_keys.size)
+    groups = []
+    for key, seconds, day_count, active_days in zip(unique_keys, sums, counts, active):
+        label = str(key) if unit == "month" else _iso_week_label(key)
+        groups.append(
+            {
+                unit: label,
+                "total_minutes": int(round(seconds / 60)),
+                "average_minutes_per_day": round(seconds / 60 / day_count, 1),
+                "active_days": int(active_days),
+            }
+        )
+    return groups
+
+
+def _iso_week_label(monday: np.datetime64) -> str:
+    year, week, _ = datetime.date.fromisoformat(str(monday)).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def compute_stats(
+    logs: LogArrays, first: datetime.date, last: datetime.date, tz: ZoneInfo
+) -> Dict[str, object]:
+    """Statistics over closed sessions that overlap the local dates ``[first, last]``."""
+
+    local = logs.epoch + local_offsets(logs.epoch, tz)
+
+    # An enter immediately followed by an exit is a session (same rule as sessions.py).
+    pairs = np.flatnonzero(logs.is_enter[:-1] & ~logs.is_enter[1:])
+    starts = local[pairs]
+    ends = np.maximum(local[pairs + 1], starts)
+
+    first_day = (first - datetime.date(1970, 1, 1)).days
+    last_day = (last - datetime.date(1970, 1, 1)).days
+    day_numbers = np.arange(first_day, last_day + 1, dtype=np.int64)
+    range_start, range_end = first_day * DAY, (last_day + 1) * DAY
+    in_range = (ends > range_start) & (starts < range_end)
+
+    hour_bounds = np.arange(range_start, range_end + 1, HOUR, dtype=np.int64)
+    occupancy = np.diff(occupied_before(starts, ends, hour_bounds))
+    by_hour = occupancy.reshape(-1, 24)
+    daily = by_hour.sum(axis=1)
+
+    streak_length, streak_start = longest_run(daily > 0)
+    arrivals = starts[in_range & (starts >= range_start)]
+    departures = ends[in_range & (ends < range_end)]
+
+    return {
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "tz": tz.key,
+        "days": int(day_numbers.size),
+        "session_count": int(in_range.sum()),
+        "total_minutes": int(round(daily.sum() / 60)),
+        "average_minutes_per_day": round(float(daily.mean()) / 60, 1),
+        "average_minutes_per_active_day": (
+            round(float(daily[daily > 0].mean()) / 60, 1) if (daily > 0).any() else 0.0
+        ),
+        "weekly": _group_totals(day_numbers, daily, "week"),
+        "monthly": _group_totals(day_numbers, daily, "month"),
+        # Share of each local hour-of-day spent in the lab, averaged over the range.
+        "hour_of_day_occupancy": np.round(by_hour.mean(axis=0) / HOUR, 4).tolist(),
+        "longest_streak": {
+            "days": streak_length,
+            "start": (first + datetime.timedelta(days=streak_start)).isoformat() if streak_length else None,
+            "end": (
+                first + datetime.timedelta(days=streak_start + streak_length - 1)
+            ).isoformat() if streak_length else None,
+        },
+        "arrivals": _time_of_day(arrivals),
+        "departures": _time_of_day(departures),
+    }
@@ -0,0 +1,171 @@
+"""Process-level cache of every member's most recent attendance log row."""
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from users import DEFAULT_USER_ID
+
+logger = logging.getLogger("lab_attendance.status_cache")
+
+# ``presence`` is maintained by a trigger on every insert (see users.py), so a
+# member's latest log is a primary-key lookup rather than an index scan.
+LATEST_LOG_QUERY = "SELECT log_id, action, timestamp, user_id FROM presence WHERE user_id = ?"
+PRESENCE_QUERY = "SELECT log_id, action, timestamp, user_id FROM presence"
+
+
+@dataclass(frozen=True)
+class LastAction:
+    id: int
+    action: str
+    timestamp: Optional[str]  # SQLite text as stored, e.g. "2024-05-01 09:00:00"
+    user_id: int = DEFAULT_USER_ID
+
+    @property
+    def sort_key(self):
+        return (self.timestamp or "", self.id)
+
+
+def fetch_latest(conn: sqlite3.Connection, user_id: int = DEFAULT_USER_ID) -> Optional[LastAction]:
+    row = conn.execute(LATEST_LOG_QUERY, (user_id,)).fetchone()
+    return LastAction(*row) if row else None
+
+
+def fetch_presence(conn: sqlite3.Connection) -> Dict[int, LastAction]:
+    return {row[3]: LastAction(*row) for row in conn.execute(PRESENCE_QUERY).fetchall()}
+
+
+def fetch_max_id(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM attendance_logs").fetchone()[0]
+
+
+class StatusCache:
+    """Holds each member's latest log row so status reads skip SQLite.
+
+    It also tracks the highest log id, which changes on every insert and so
+    serves as a cheap version number for HTTP validators (ETags).
+
+    The cache is loaded once at startup and then kept current by the write path
+    calling :meth:`record` after each committed insert. All access goes through
+    a lock, so readers always see a complete ``LastAction``. Memory is one
+    entry per member that has ever tapped.
+
+    With a single uvicorn worker this is always exact. When several workers
+    share one database file, each worker's cache would miss the others' writes,
+    so call :meth:`watch` at startup: the cache then keeps a private connection
+    and :meth:`revalidate` checks ``PRAGMA data_version`` on it. That pragma only
+    changes when another connection has committed, costs no table or index
+    access, and triggers a reload from the database when it moves. Because
+    revalidation touches SQLite it must run on a reader thread; :meth:`current`
+    and :meth:`max_id` only ever read memory.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Serialises use of the watch connection; never held together with _lock
+        # while querying, so readers on the event loop do not wait on SQLite.
+        self._watch_lock = threading.Lock()
+        self._latest: Dict[int, LastAction] = {}
+        self._max_id = 0
+        self._loaded = False
+        self._watch_conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        # Revalidations answered from memory vs. ones that had to reload; only
+        # counted in shared mode, where a single worker's cache cannot miss.
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def shared(self) -> bool:
+        return self._watch_conn is not None
+
+    def load(self, conn: sqlite3.Connection) -> Dict[int, LastAction]:
+        latest = fetch_presence(conn)
+        max_id = fetch_max_id(conn)
+        with self._lock:
+            self._latest = latest
+            self._max_id = max_id
+            self._loaded = True
+        return latest
+
+    def watch(self, path: str) -> None:
+        """Revalidate against ``path`` from now on (multi-worker deployments)."""
+
+        with self._watch_lock:
+            if self._watch_conn is None:
+                self._watch_conn = sqlite3.connect(path, check_same_thread=False)
+                self._data_version = self._read_data_version()
+                latest, max_id = self._fetch()
+                with self._lock:
+                    self._latest = latest
+                    self._max_id = max_id
+                    self._loaded = True
+
+    def close(self) -> None:
+        with self._watch_lock:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+                self._watch_conn = None
+            with self._lock:
+                self._loaded = False
+
+    def current(self, user_id: int = DEFAULT_USER_ID) -> Optional[LastAction]:
+        with self._lock:
+            return self._latest.get(user_id)
+
+    def max_id(self) -> int:
+        with self._lock:
+            return self._max_id
+
+    def record(self, entry: LastAction) -> None:
+        """Apply a committed insert; older rows never replace a newer one."""
+
+        with self._lock:
+            self._merge(entry)
+            self._max_id = max(self._max_id, entry.id)
+
+    def revalidate(self, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Reload if another connection has committed since the last check.
+
+        A no-op unless :meth:`watch` was called. ``conn`` is ignored because
+        ``data_version`` is per connection and only the private watch connection
+        can be compared with the last value; it is accepted so that this method
+        can be passed to ``Database.read`` directly.
+        """
+
+        with self._watch_lock:
+            if self._watch_conn is None:
+                return
+            version = self._read_data_version()
+            if version == self._data_version:
+                self.hits += 1
+                return
+            self.misses += 1
+            self._data_version = version
+            latest, max_id = self._fetch()
+        with self._lock:
+            # Merge rather than replace: a local insert recorded while the reload
+            # ran must not be rolled back by the slightly older snapshot.
+            for entry in latest.values():
+                self._merge(entry)
+            self._max_id = max(self._max_id, max_id)
+
+    def _merge(self, entry: LastAction) -> None:
+        latest = self._latest.get(entry.user_id)
+        if latest is None or entry.sort_key >= latest.sort_key:
+            self._latest[entry.user_id] = entry
+
+    def _fetch(self):
+        assert self._watch_conn is not None
+        return fetch_presence(self._watch_conn), fetch_max_id(self._watch_conn)
+
+    def _read_data_version(self) -> int:
+        assert self._watch_conn is not None
+        return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
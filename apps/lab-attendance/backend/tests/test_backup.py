@@ -0,0 +1,161 @@
+import datetime
+import gzip
+import hashlib
+import io
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import db  # noqa: E402
+import incremental_backup  # noqa: E402
+
+
+def _snapshot_with_logs(tmp_path, name, rows):
+    # Appends ``rows`` taps, a minute apart, after whatever the live file already holds.
+    path = str(tmp_path / "live.db")
+    db.migrate(path)
+    conn = sqlite3.connect(path)
+    start = conn.execute("SELECT count(*) FROM attendance_logs").fetchone()[0]
+    base = datetime.datetime(2020, 1, 1)
+    conn.executemany(
+        "INSERT INTO attendance_logs (action, timestamp) VALUES (?, ?)",
+        [
+            ("enter" if i % 2 == 0 else "exit", (base + datetime.timedelta(minutes=i)).strftime(db.CANONICAL_TIMESTAMP_FORMAT))
+            for i in range(start, start + rows)
+        ],
+    )
+    conn.commit()
+    conn.close()
+    dest = str(tmp_path / name)
+    db.snapshot(path, dest)
+    return dest
+
+
+def _chunks(path):
+    with open(path, "rb") as fh:
+        unit = incremental_backup.page_size(fh)
+        return unit, list(incremental_backup.iter_chunks(fh, unit))
+
+
+def test_chunks_are_whole_pages_and_mostly_survive_appends(tmp_path):
+    first = _snapshot_with_logs(tmp_path, "day1.db", 40000)
+    second = _snapshot_with_logs(tmp_path, "day2.db", 500)
+
+    unit, day1 = _chunks(first)
+    _, day2 = _chunks(second)
+    assert unit == 4096
+    assert b"".join(day2) == Path(second).read_bytes()
+    assert all(len(chunk) % unit == 0 for chunk in day2)
+    assert all(len(chunk) <= incremental_backup.MAX_CHUNK_PAGES * unit for chunk in day2)
+
+    known = {hashlib.sha256(chunk).digest() for chunk in day1}
+    reused = sum(len(chunk) for chunk in day2 if hashlib.sha256(chunk).digest() in known)
+    assert reused / Path(second).stat().st_size > 0.7
+
+
+def test_compressing_reader_returns_full_reads_until_the_end():
+    data = bytes(range(256)) * 20000
+    reader = incremental_backup.CompressingReader(io.BytesIO(data), "gzip")
+    parts = iter(lambda: reader.read(1000), b"")
+    sizes = []
+    body = b""
+    for part in parts:
+        sizes.append(len(part))
+        body += part
+    assert all(size == 1000 for size in sizes[:-1])
+    assert gzip.decompress(body) == data
+
+
+def test_page_size_falls_back_for_non_sqlite_files():
+    assert incremental_backup.page_size(io.BytesIO(b"not a database")) == incremental_backup.FALLBACK_PAGE_SIZE
+
+
+@pytest.fixture
+def s3():
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    mock = moto.mock_aws() if hasattr(moto, "mock_aws") else moto.mock_s3()
+    with mock:
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="backups")
+        yield client
+
+
+def test_incremental_backup_uploads_only_new_chunks_and_restores(tmp_path, s3):
+    first = _snapshot_with_logs(tmp_path, "day1.db", 40000)
+    one = incremental_backup.backup(s3, "backups", first, name="attendance-2024-05-01", codec="gzip")
+    assert one["uploaded_chunks"] == one["chunks"]
+    assert one["uploaded_bytes"] < one["size"]
+
+    second = _snapshot_with_logs(tmp_path, "day2.db", 500)
+    two = incremental_backup.backup(
+        s3, "backups", second, name="attendance-2024-05-02", codec="gzip", concurrency=4
+    )
+    assert 0 < two["uploaded_chunks"] < two["chunks"] / 2
+
+    restored = str(tmp_path / "restored.db")
+    assert incremental_backup.restore(s3, "backups", restored) == two["manifest"]
+    assert Path(restored).read_bytes() == Path(second).read_bytes()
+
+    incremental_backup.restore(s3, "backups", restored, manifest=one["manifest"])
+    assert Path(restored).read_bytes() == Path(first).read_bytes()
+
+
+def test_restore_rejects_corrupt_chunks_and_keeps_the_old_file(tmp_path, s3):
+    snapshot = _snapshot_with_logs(tmp_path, "day1.db", 1000)
+    result = incremental_backup.backup(s3, "backups", snapshot, codec="gzip")
+    chunk = next(iter(incremental_backup.list_keys(s3, "backups", "backups/incremental/chunks/")))
+    s3.put_object(Bucket="backups", Key=chunk, Body=incremental_backup.CODECS["gzip"][1](b"tampered"))
+
+    dest = tmp_path / "attendance.db"
+    dest.write_bytes(b"previous")
+    with pytest.raises(ValueError):
+        incremental_backup.restore(s3, "backups", str(dest), manifest=result["manifest"])
+    assert dest.read_bytes() == b"previous"
+    assert not Path(f"{dest}.restore").exists()
+
+
+def test_restore_cli_reports_corrupt_chunks_without_a_traceback(tmp_path, s3):
+    backup_to_s3 = pytest.importorskip("backup_to_s3")
+    backup_to_s3.s3_client.cache_clear()
+    snapshot = _snapshot_with_logs(tmp_path, "day1.db", 1000)
+    incremental_backup.backup(s3, "backups", snapshot, codec="gzip")
+    chunk = next(iter(incremental_backup.list_keys(s3, "backups", "backups/incremental/chunks/")))
+    s3.put_object(Bucket="backups", Key=chunk, Body=b"not gzip at all")
+
+    dest = tmp_path / "attendance.db"
+    dest.write_bytes(b"previous")
+    with pytest.raises(SystemExit, match="is corrupt"):
+        backup_to_s3.restore("backups", str(dest))
+    assert dest.read_bytes() == b"previous"
+    backup_to_s3.s3_client.cache_clear()
+
+
+def test_restore_without_manifests_raises_lookup_error(tmp_path, s3):
+    with pytest.raises(LookupError):
+        incremental_backup.restore(s3, "backups", str(tmp_path / "attendance.db"))
+
+
+@pytest.mark.parametrize("codec", [None, "gzip"])
+def test_whole_file_upload_streams_in_parts(tmp_path, s3, codec, capsys):
+    backup_to_s3 = pytest.importorskip("backup_to_s3")
+    backup_to_s3.s3_client.cache_clear()
+    snapshot = _snapshot_with_logs(tmp_path, "day1.db", 50000)
+    config = backup_to_s3.transfer_config(chunk_size_mib=5, concurrency=2, max_bandwidth_mib=100)
+
+    backup_to_s3.upload_file("backups", snapshot, "backups/attendance.db", compress=codec, config=config)
+
+    key = "backups/attendance.db" + (".gz" if codec else "")
+    body = s3.get_object(Bucket="backups", Key=key)["Body"].read()
+    assert (gzip.decompress(body) if codec else body) == Path(snapshot).read_bytes()
+    if codec is None:
+        # More than 5 MiB uncompressed, so it went up as a multipart upload.
+        assert "-" in s3.head_object(Bucket="backups", Key=key)["ETag"]
+    assert "MiB/s" in capsys.readouterr().out
+    backup_to_s3.s3_client.cache_clear()
@@ -0,0 +1,750 @@
+import datetime
+import importlib.util
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import db  # noqa: E402
+
+
+def _load_main():
+    spec = importlib.util.spec_from_file_location("main", BACKEND_DIR / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "attendance.db"))
+    return _load_main()
+
+
+@pytest.fixture
+def client(main):
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def test_enter_exit_and_duplicate_suppression(client):
+    assert client.post("/api/lab-entry", json={"action": "enter"}).json()["status"] == "success"
+    assert client.get("/api/lab-entry", params={"action": "enter"}).json()["status"] == "ignored"
+    assert client.get("/api/lab-entry", params={"action": "exit"}).json()["status"] == "success"
+
+    status = client.get("/api/status").json()
+    assert status["current_status"] == "exit"
+    assert status["last_action_time"].endswith("Z")
+
+    data = client.get("/api/attendance-data", params={"days": 1}).json()
+    assert [row["action"] for row in data["data"]] == ["enter", "exit"]
+
+
+def test_invalid_action_is_rejected(client):
+    assert client.post("/api/lab-entry", json={"action": "sleep"}).status_code == 400
+
+
+def test_pool_reuses_connections_and_closes_on_shutdown(main):
+    with TestClient(main.app) as test_client:
+        opened = list(main.pool._all)
+        for _ in range(10):
+            test_client.get("/api/status")
+        assert main.pool._all == opened
+        assert test_client.get("/").json()["database"] == "ok"
+    assert main.pool.closed
+
+
+def test_health_check_pings_on_a_reader_thread(client, main, monkeypatch):
+    import threading
+
+    threads = []
+    connection = main.pool.connection
+
+    def tracked():
+        threads.append(threading.current_thread().name)
+        return connection()
+
+    monkeypatch.setattr(main.pool, "connection", tracked)
+    assert client.get("/").json()["database"] == "ok"
+    assert threads and all(name.startswith("db-reader") for name in threads)
+
+    main.pool.close()
+    assert client.get("/").json()["database"] == "unavailable"
+
+
+def test_pool_replaces_unhealthy_connection(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    pool.open()
+    try:
+        with pytest.raises(sqlite3.Error):
+            with pool.connection() as conn:
+                broken = conn
+                conn.close()
+                conn.execute("SELECT 1")
+        with pool.connection() as conn:
+            assert conn is not broken
+            assert conn.execute("SELECT 1").fetchone() == (1,)
+    finally:
+        pool.close()
+
+    with pytest.raises(db.PoolClosedError):
+        with pool.connection():
+            pass
+
+
+
+def test_migrate_upgrades_legacy_database_idempotently(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute(
+        "CREATE TABLE attendance_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "action TEXT NOT NULL CHECK (action IN ('enter', 'exit')), "
+        "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)"
+    )
+    legacy.execute("INSERT INTO attendance_logs (action) VALUES ('enter')")
+    legacy.commit()
+    legacy.close()
+
+    assert db.migrate(path) == db.SCHEMA_VERSION
+    assert db.migrate(path) == db.SCHEMA_VERSION
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT action FROM attendance_logs ORDER BY timestamp DESC, id DESC LIMIT 1"
+    ).fetchall()
+    assert "COVERING INDEX idx_attendance_logs_timestamp" in plan[0][3]
+    assert conn.execute("SELECT count(*) FROM attendance_logs").fetchone()[0] == 1
+    conn.close()
+
+
+def test_concurrent_migrations_apply_each_step_once(tmp_path):
+    import subprocess
+
+    script = f"import sys; sys.path.insert(0, {str(BACKEND_DIR)!r}); import db; db.migrate(sys.argv[1])"
+    for run in range(3):
+        path = str(tmp_path / f"fresh-{run}.db")
+        workers = [subprocess.Popen([sys.executable, "-c", script, path], stderr=subprocess.PIPE) for _ in range(4)]
+        errors = [worker.communicate()[1].decode() for worker in workers]
+        assert [worker.returncode for worker in workers] == [0] * 4, errors
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+        conn.close()
+
+
+def test_migrate_normalizes_timestamps_to_canonical_utc(tmp_path):
+    path = str(tmp_path / "mixed.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute(
+        "CREATE TABLE attendance_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "action TEXT NOT NULL CHECK (action IN ('enter', 'exit')), "
+        "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)"
+    )
+    legacy.executemany(
+        "INSERT INTO attendance_logs (action, timestamp) VALUES (?, ?)",
+        [
+            ("enter", "2024-05-01 09:00:00"),
+            ("exit", "2024-05-01T10:30:00.250"),
+            ("exit", "2024-05-01T21:00:00+09:00"),
+        ],
+    )
+    legacy.commit()
+    legacy.close()
+
+    db.migrate(path)
+
+    conn = sqlite3.connect(path)
+    assert [row[0] for row in conn.execute("SELECT timestamp FROM attendance_logs ORDER BY id")] == [
+        "2024-05-01 09:00:00",
+        "2024-05-01 10:30:00",
+        "2024-05-01 12:00:00",
+    ]
+    assert conn.execute(f"SELECT {db.ISO_TIMESTAMP_SQL} FROM attendance_logs WHERE id = 3").fetchone()[0] == (
+        "2024-05-01T12:00:00Z"
+    )
+    conn.close()
+
+
+def test_snapshot_is_consistent_while_the_app_writes(main, tmp_path):
+    import threading
+
+    db.migrate(main.DB_PATH)
+    _insert_logs(main.DB_PATH, [("enter" if i % 2 == 0 else "exit", "2024-05-01 00:00:00") for i in range(20000)])
+    stop = threading.Event()
+
+    def tap():
+        conn = sqlite3.connect(main.DB_PATH, timeout=30)
+        while not stop.is_set():
+            main.insert_action(conn, "enter")
+            main.insert_action(conn, "exit")
+        conn.close()
+
+    writer = threading.Thread(target=tap)
+    writer.start()
+    try:
+        dest = str(tmp_path / "snapshot.db")
+        assert db.snapshot(main.DB_PATH, dest, pages=4, sleep=0.001) > 0
+    finally:
+        stop.set()
+        writer.join()
+
+    conn = sqlite3.connect(dest)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    latest = conn.execute("SELECT id, action FROM attendance_logs ORDER BY timestamp DESC, id DESC LIMIT 1").fetchone()
+    assert conn.execute("SELECT log_id, action FROM presence WHERE user_id = 1").fetchone() == latest
+    conn.close()
+
+
+def test_status_is_served_from_cache(client, main):
+    client.get("/api/lab-entry", params={"action": "enter"})
+    main.pool.close()
+    assert client.get("/api/status").json()["current_status"] == "enter"
+
+
+def test_shared_status_cache_sees_writes_from_other_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "attendance.db"))
+    monkeypatch.setenv("STATUS_CACHE_SHARED", "true")
+    main = _load_main()
+    with TestClient(main.app) as test_client:
+        assert test_client.get("/api/status").json()["current_status"] == "unknown"
+
+        other_worker = sqlite3.connect(main.DB_PATH)
+        other_worker.execute("INSERT INTO attendance_logs (action) VALUES ('enter')")
+        other_worker.commit()
+        other_worker.close()
+
+        assert test_client.get("/api/status").json()["current_status"] == "enter"
+        assert test_client.get("/api/lab-entry", params={"action": "enter"}).json()["status"] == "ignored"
+        assert main.status_cache.misses >= 1
+        assert 'lab_cache_misses_total{cache="status"}' in test_client.get("/metrics").text
+
+
+def test_shared_status_cache_reads_never_touch_sqlite(tmp_path):
+    import status_cache
+
+    path = str(tmp_path / "attendance.db")
+    db.migrate(path)
+    cache = status_cache.StatusCache()
+    cache.watch(path)
+    try:
+        _insert_logs(path, [("enter", "2024-05-01 00:00:00")])
+        # current()/max_id() answer from memory; only revalidate() (on a reader thread) queries
+        assert cache.current() is None and cache.max_id() == 0
+
+        cache.revalidate()
+        assert cache.current().action == "enter" and cache.max_id() == 1
+        assert cache.misses == 1
+    finally:
+        cache.close()
+
+
+def _insert_logs(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO attendance_logs (action, timestamp) VALUES (?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_sessions_are_paired_and_split_at_local_midnight(client, main):
+    _insert_logs(
+        main.DB_PATH,
+        [
+            # 2024-05-01 22:00 JST -> 2024-05-02 01:30 JST
+            ("enter", "2024-05-01 13:00:00"),
+            ("exit", "2024-05-01 16:30:00"),
+            # 2024-05-02 10:00 JST -> 10:45 JST, with a duplicate enter before it
+            ("enter", "2024-05-02 00:30:00"),
+            ("enter", "2024-05-02 01:00:00"),
+            ("exit", "2024-05-02 01:45:00"),
+        ],
+    )
+
+    body = client.get(
+        "/api/sessions", params={"from": "2024-05-01", "to": "2024-05-03", "tz": "Asia/Tokyo"}
+    ).json()
+
+    assert [day["date"] for day in body["days"]] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+    assert [day["total_minutes"] for day in body["days"]] == [120, 90 + 45, 0]
+    assert body["days"][1]["sessions"][0] == {
+        "start": "2024-05-01T15:00:00Z",
+        "end": "2024-05-01T16:30:00Z",
+        "minutes": 90,
+        "ongoing": False,
+    }
+    assert body["event_count"] == 5
+    assert body["total_minutes"] == 255
+
+
+def test_sessions_reject_bad_parameters(client):
+    assert client.get("/api/sessions", params={"tz": "Mars/Base"}).status_code == 400
+    assert client.get("/api/sessions", params={"from": "2024-05-02", "to": "2024-05-01"}).status_code == 400
+
+
+def test_daily_totals_rollup_matches_rebuild(tmp_path):
+    import rollup
+    import sessions
+
+    path = str(tmp_path / "rollup.db")
+    db.migrate(path)
+    logs = [
+        ("enter", "2024-05-01 13:00:00"),  # 22:00 JST
+        ("exit", "2024-05-01 16:30:00"),  # 01:30 JST next day
+        ("enter", "2024-05-02 00:30:00"),
+        ("exit", "2024-05-02 01:45:00"),
+    ]
+    _insert_logs(path, logs)
+
+    conn = sqlite3.connect(path)
+    for session in sessions.iter_sessions(logs):
+        rollup.apply_session(conn, session)
+    totals = "SELECT date, total_seconds, session_count FROM daily_totals WHERE user_id = 1 ORDER BY date"
+    incremental = conn.execute(totals).fetchall()
+    rollup.rebuild(conn)
+    rebuilt = conn.execute(totals).fetchall()
+    conn.close()
+
+    assert incremental == rebuilt == [
+        ("2024-05-01", 2 * 3600, 1),
+        ("2024-05-02", 90 * 60 + 75 * 60, 2),
+    ]
+
+
+def test_summary_reads_rollup_updated_by_write_path(client, main):
+    client.get("/api/lab-entry", params={"action": "enter"})
+    client.get("/api/lab-entry", params={"action": "exit"})
+
+    body = client.get("/api/summary", params={"granularity": "month"}).json()
+    assert body["granularity"] == "month"
+    assert sum(period["session_count"] for period in body["periods"]) == 1
+    assert client.get("/api/summary", params={"granularity": "decade"}).status_code == 400
+
+
+def test_attendance_data_after_id_cursor_and_etags(client):
+    client.get("/api/lab-entry", params={"action": "enter"})
+    first = client.get("/api/attendance-data", params={"days": 1})
+    body = first.json()
+    assert body["count"] == 1
+
+    etag = first.headers["etag"]
+    unchanged = client.get("/api/attendance-data", params={"days": 1}, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+
+    status = client.get("/api/status")
+    assert client.get("/api/status", headers={"If-None-Match": status.headers["etag"]}).status_code == 304
+
+    client.get("/api/lab-entry", params={"action": "exit"})
+    changed = client.get("/api/attendance-data", params={"days": 1}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert client.get("/api/status", headers={"If-None-Match": status.headers["etag"]}).status_code == 200
+
+    newer = client.get("/api/attendance-data", params={"days": 1, "after_id": body["last_id"]}).json()
+    assert [row["action"] for row in newer["data"]] == ["exit"]
+    assert newer["last_id"] > body["last_id"]
+
+
+def test_attendance_data_revalidation_does_not_query(main, client, monkeypatch):
+    client.get("/api/lab-entry", params={"action": "enter"})
+    etag = client.get("/api/attendance-data", params={"days": 1}).headers["etag"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("conditional request hit the database")
+
+    monkeypatch.setattr(main.database, "read", fail)
+    unchanged = client.get("/api/attendance-data", params={"days": 1}, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+
+
+def test_fast_json_mode_matches_standard_output(tmp_path, monkeypatch):
+    import datetime
+
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "attendance.db"))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rows = [
+        ("enter" if i % 2 == 0 else "exit", (now - datetime.timedelta(hours=10 - i)).strftime("%Y-%m-%d %H:%M:%S"))
+        for i in range(6)
+    ]
+
+    bodies = {}
+    for mode in ("standard", "fast"):
+        monkeypatch.setenv("JSON_RESPONSE_MODE", mode)
+        main = _load_main()
+        with TestClient(main.app) as test_client:
+            if mode == "standard":
+                _insert_logs(main.DB_PATH, rows)
+            response = test_client.get("/api/attendance-data", params={"days": 1, "after_id": 2})
+            assert response.headers["content-type"] == "application/json"
+            cached = test_client.get(
+                "/api/attendance-data", params={"days": 1, "after_id": 2},
+                headers={"If-None-Match": response.headers["etag"]}
+            )
+            assert cached.status_code == 304
+            bodies[mode] = response.json()
+
+    assert bodies["fast"] == bodies["standard"]
+    assert bodies["fast"]["count"] == 4
+    assert bodies["fast"]["last_id"] == 6
+    assert bodies["fast"]["data"][0]["timestamp"].endswith("Z")
+
+
+def test_sessions_etag_only_when_nobody_is_in(client):
+    client.get("/api/lab-entry", params={"action": "enter"})
+    assert "etag" not in client.get("/api/sessions").headers
+
+    client.get("/api/lab-entry", params={"action": "exit"})
+    etag = client.get("/api/sessions").headers["etag"]
+    assert client.get("/api/sessions", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_event_hub_fans_out_and_evicts_slow_consumers():
+    import asyncio
+
+    import events
+
+    async def scenario():
+        hub = events.EventHub(queue_size=2, heartbeat_seconds=0.01)
+        fast = hub.subscribe()
+        slow = hub.subscribe()
+        frames = []
+
+        async def consume():
+            async for frame in hub.stream(fast, {"id": 1, "action": "enter"}):
+                frames.append(frame)
+
+        consumer = asyncio.create_task(consume())
+        for event_id in range(2, 5):
+            hub.publish({"id": event_id, "action": "exit"})
+            await asyncio.sleep(0.02)
+
+        assert slow.closed.is_set()
+        assert hub.evicted == 1
+        hub.close()
+        await asyncio.wait_for(consumer, 1)
+        return frames
+
+    frames = asyncio.run(scenario())
+    data_frames = [frame for frame in frames if frame.startswith("event:")]
+    assert [frame.split("\n")[1] for frame in data_frames] == ["id: 1", "id: 2", "id: 3", "id: 4"]
+    assert any(frame == ": ping\n\n" for frame in frames)
+
+
+def test_shutdown_signal_closes_open_event_streams():
+    import asyncio
+    import signal
+
+    import events
+
+    received = []
+    original = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+
+    async def scenario():
+        hub = events.EventHub(heartbeat_seconds=0.01)
+        restore = events.close_on_signals(hub, [signal.SIGTERM])
+        try:
+            reader = asyncio.create_task(_drain(hub.stream(hub.subscribe())))
+            await asyncio.sleep(0.02)
+            signal.raise_signal(signal.SIGTERM)
+            await asyncio.wait_for(reader, 1)
+            with pytest.raises(events.HubClosedError):
+                hub.subscribe()
+        finally:
+            restore()
+
+    try:
+        asyncio.run(scenario())
+        assert received == [signal.SIGTERM]
+    finally:
+        signal.signal(signal.SIGTERM, original)
+
+
+async def _drain(stream):
+    async for _ in stream:
+        pass
+
+
+def test_write_path_publishes_to_event_hub(client, main):
+    received = []
+    main.event_hub.publish = received.append
+    client.get("/api/lab-entry", params={"action": "enter"})
+    client.get("/api/lab-entry", params={"action": "enter"})
+    assert [event["action"] for event in received] == ["enter"]
+
+
+def test_batch_ingestion_orders_dedupes_and_is_idempotent(client, main):
+    events = [
+        {"action": "exit", "client_timestamp": "2024-05-01T03:00:00Z", "idempotency_key": "k2"},
+        {"action": "enter", "client_timestamp": "2024-05-01T00:00:00Z", "idempotency_key": "k1"},
+        {"action": "exit", "client_timestamp": "2024-05-01T03:00:05Z", "idempotency_key": "k3"},
+        {"action": "enter", "client_timestamp": "2999-01-01T00:00:00Z", "idempotency_key": "k4"},
+    ]
+    body = client.post("/api/lab-entry/batch", json={"events": events}).json()
+
+    assert [result["status"] for result in body["results"]] == ["recorded", "recorded", "ignored", "future"]
+    assert body["recorded"] == 2
+    assert client.get("/api/status").json()["current_status"] == "exit"
+
+    replay = client.post("/api/lab-entry/batch", json={"events": events[:2]}).json()
+    assert [result["status"] for result in replay["results"]] == ["duplicate_key", "duplicate_key"]
+
+    late = client.post(
+        "/api/lab-entry/batch",
+        json={"events": [{"action": "enter", "client_timestamp": "2024-04-30T00:00:00Z"}]},
+    ).json()
+    assert late["results"][0]["status"] == "out_of_order"
+
+    summary = client.get("/api/summary", params={"from": "2024-05-01", "to": "2024-05-01"}).json()
+    assert summary["periods"] == [
+        {"period": "2024-05-01", "total_seconds": 3 * 3600, "session_count": 1, "active_days": 1, "total_minutes": 180}
+    ]
+
+
+def test_batch_timestamps_ahead_of_server_are_clamped_for_live_taps(client):
+    ahead = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=3)
+    body = client.post(
+        "/api/lab-entry/batch",
+        json={"events": [{"action": "enter", "client_timestamp": ahead.isoformat()}]},
+    ).json()
+    assert body["results"][0]["status"] == "recorded"
+
+    client.get("/api/lab-entry", params={"action": "exit"})
+    assert client.get("/api/status").json()["current_status"] == "exit"
+    rows = client.get("/api/attendance-data", params={"days": 1}).json()["data"]
+    assert [row["action"] for row in rows] == ["enter", "exit"]
+    assert all(row["timestamp"] <= rows[-1]["timestamp"] for row in rows)
+    assert client.get("/api/lab-entry", params={"action": "enter"}).json()["status"] == "success"
+
+
+def _hammer_insert_action(main, db_path, barrier, iterations):
+    import random
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    barrier.wait()
+    for _ in range(iterations):
+        main.insert_action(conn, random.choice(["enter", "exit"]))
+    conn.close()
+
+
+def test_concurrent_workers_never_record_duplicate_actions(main):
+    import multiprocessing
+
+    db.migrate(main.DB_PATH)
+    workers, iterations = 6, 40
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    processes = [
+        context.Process(target=_hammer_insert_action, args=(main, main.DB_PATH, barrier, iterations))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    conn = sqlite3.connect(main.DB_PATH)
+    actions = [row[0] for row in conn.execute("SELECT action FROM attendance_logs ORDER BY id")]
+    conn.close()
+    assert len(actions) > 1
+    assert all(previous != current for previous, current in zip(actions, actions[1:]))
+
+
+def test_members_have_independent_status_sessions_and_presence(client, main):
+    alice = client.post("/api/users", json={"name": "alice"})
+    assert alice.status_code == 201
+    alice_id = alice.json()["id"]
+    assert client.post("/api/users", json={"name": "alice"}).status_code == 409
+    assert [user["name"] for user in client.get("/api/users").json()["users"]] == ["default", "alice"]
+
+    assert client.get("/api/lab-entry", params={"action": "enter"}).json()["status"] == "success"
+    assert client.post("/api/lab-entry", json={"action": "enter", "user_id": alice_id}).json()["status"] == "success"
+    duplicate = client.get("/api/lab-entry", params={"action": "enter", "user_id": alice_id}).json()
+    assert (duplicate["status"], duplicate["user_id"]) == ("ignored", alice_id)
+    assert client.get("/api/lab-entry", params={"action": "enter", "user_id": 99}).status_code == 404
+
+    presence = client.get("/api/presence")
+    assert [member["name"] for member in presence.json()["members"]] == ["default", "alice"]
+    assert client.get("/api/presence", headers={"If-None-Match": presence.headers["etag"]}).status_code == 304
+
+    client.get("/api/lab-entry", params={"action": "exit"})
+    assert client.get("/api/status").json()["current_status"] == "exit"
+    assert client.get("/api/status", params={"user_id": alice_id}).json()["current_status"] == "enter"
+    assert [member["user_id"] for member in client.get("/api/presence").json()["members"]] == [alice_id]
+
+    assert client.get("/api/sessions").json()["event_count"] == 2
+    assert client.get("/api/sessions", params={"user_id": alice_id}).json()["event_count"] == 1
+    assert client.get("/api/attendance-data", params={"days": 1, "user_id": alice_id}).json()["count"] == 1
+    assert client.get("/api/attendance-data", params={"days": 1}).json()["count"] == 3
+
+    conn = sqlite3.connect(main.DB_PATH)
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT action FROM attendance_logs WHERE user_id = 2 "
+        "AND timestamp < '2024-05-01' ORDER BY timestamp DESC, id DESC LIMIT 1"
+    ).fetchall()
+    conn.close()
+    assert "COVERING INDEX idx_attendance_logs_user_timestamp" in plan[0][3]
+
+
+def _hammer_members(main, db_path, barrier, members, iterations):
+    import random
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    barrier.wait()
+    for _ in range(iterations):
+        main.insert_action(conn, random.choice(["enter", "exit"]), random.randint(1, members))
+    conn.close()
+
+
+def test_concurrent_member_taps_keep_presence_and_rollup_consistent(main):
+    import multiprocessing
+
+    import rollup
+    import users
+
+    db.migrate(main.DB_PATH)
+    workers, members, iterations = 6, 12, 40
+    conn = sqlite3.connect(main.DB_PATH, isolation_level=None)
+    with db.write_transaction(conn):
+        for number in range(2, members + 1):
+            users.create_user(conn, f"member-{number}")
+    conn.close()
+
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    processes = [
+        context.Process(target=_hammer_members, args=(main, main.DB_PATH, barrier, members, iterations))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    conn = sqlite3.connect(main.DB_PATH, isolation_level=None)
+    for user_id in range(1, members + 1):
+        logs = conn.execute(
+            "SELECT id, action FROM attendance_logs WHERE user_id = ? ORDER BY id", (user_id,)
+        ).fetchall()
+        assert all(previous[1] != current[1] for previous, current in zip(logs, logs[1:]))
+        presence = conn.execute("SELECT log_id, action FROM presence WHERE user_id = ?", (user_id,)).fetchone()
+        assert presence == (logs[-1] if logs else None)
+
+    totals = "SELECT * FROM daily_totals ORDER BY user_id, date"
+    incremental = conn.execute(totals).fetchall()
+    with db.write_transaction(conn):
+        rollup.rebuild(conn)
+    assert conn.execute(totals).fetchall() == incremental
+    conn.close()
+
+
+def test_export_streams_all_rows_in_id_order(client, main, monkeypatch):
+    import json
+
+    monkeypatch.setattr(main, "EXPORT_CHUNK_SIZE", 2)
+    _insert_logs(main.DB_PATH, [("enter" if i % 2 == 0 else "exit", f"2024-05-01 00:00:0{i}") for i in range(5)])
+
+    lines = client.get("/api/export").text.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [1, 2, 3, 4, 5]
+
+    page = client.get("/api/export", params={"format": "csv", "after_id": 1, "limit": 3}).text.splitlines()
+    assert page[0] == "id,action,timestamp,user_id"
+    assert page[1:] == [
+        "2,exit,2024-05-01T00:00:01Z,1",
+        "3,enter,2024-05-01T00:00:02Z,1",
+        "4,exit,2024-05-01T00:00:03Z,1",
+    ]
+    assert client.get("/api/export", params={"format": "xml"}).status_code == 400
+
+
+def test_stats_are_vectorized_over_sessions_and_cached(client, main, monkeypatch):
+    _insert_logs(
+        main.DB_PATH,
+        [
+            ("enter", "2024-05-01 00:00:00"),  # 09:00 JST
+            ("exit", "2024-05-01 03:00:00"),  # 12:00 JST
+            ("enter", "2024-05-01 14:00:00"),  # 23:00 JST
+            ("exit", "2024-05-01 16:00:00"),  # 01:00 JST next day
+            ("enter", "2024-05-04 00:00:00"),
+            ("exit", "2024-05-04 01:00:00"),
+        ],
+    )
+    # Pick up the rows inserted behind the app's back, as a restart would
+    conn = sqlite3.connect(main.DB_PATH)
+    main.status_cache.load(conn)
+    conn.close()
+    params = {"from": "2024-05-01", "to": "2024-05-04", "tz": "Asia/Tokyo"}
+
+    body = client.get("/api/stats", params=params).json()
+    assert body["session_count"] == 3
+    assert body["total_minutes"] == 3 * 60 + 2 * 60 + 60
+    assert body["longest_streak"] == {"days": 2, "start": "2024-05-01", "end": "2024-05-02"}
+    assert body["hour_of_day_occupancy"][9] == pytest.approx(2 / 4, abs=1e-4)
+    assert body["hour_of_day_occupancy"][0] == pytest.approx(1 / 4, abs=1e-4)
+    assert body["arrivals"]["histogram"][9] == 2
+    assert body["monthly"] == [
+        {"month": "2024-05", "total_minutes": 360, "average_minutes_per_day": 90.0, "active_days": 3}
+    ]
+
+    cache = main.stats_cache
+    (key, cached), = cache._results.items()
+    import stats
+
+    fetch = stats.LogArrays.fetch
+    fetched = []
+
+    def tracking_fetch(conn, after_id, user_id):
+        fetched.append(after_id)
+        return fetch(conn, after_id, user_id)
+
+    monkeypatch.setattr(stats.LogArrays, "fetch", staticmethod(tracking_fetch))
+    hits, misses = cache.hits, cache.misses
+    assert client.get("/api/stats", params=params).json() == body
+    assert (cache.hits, cache.misses, fetched) == (hits + 1, misses, [])
+    assert cache._results[key] is cached
+
+    # A new log for the member drops its memoised results; only the new rows are read
+    client.get("/api/lab-entry", params={"action": "enter"})
+    assert client.get("/api/stats", params=params).json()["session_count"] == 3
+    assert (cache.hits, cache.misses) == (hits + 1, misses + 1)
+    assert key not in cache._results
+    assert fetched == [key[1]] == [6]
+
+
+def test_metrics_endpoint_reports_routes_queries_and_caches(client, main):
+    client.get("/api/lab-entry", params={"action": "enter"})
+    client.get("/api/lab-entry", params={"action": "sleep"})
+    etag = client.get("/api/attendance-data").headers["etag"]
+    client.get("/api/attendance-data", headers={"If-None-Match": etag})
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert 'lab_http_requests_total{method="GET",route="/api/lab-entry",status="200"} 1' in lines
+    assert 'lab_http_requests_total{method="GET",route="/api/lab-entry",status="400"} 1' in lines
+    assert 'lab_http_requests_total{method="GET",route="/api/attendance-data",status="304"} 1' in lines
+    assert 'lab_http_request_duration_seconds_count{method="GET",route="/api/lab-entry",status="200"} 1' in lines
+    assert 'lab_cache_hit_ratio{cache="etag"} 1.0' in lines
+    # A single worker's status cache never misses, so it is not exported
+    assert not any('cache="status"' in line for line in lines)
+    assert any(line.startswith('lab_sqlite_query_duration_seconds_count{operation="insert",table="attendance_logs"}') for line in lines)
+    assert main.metrics.queries.rows.value(("insert", "attendance_logs")) == 1
+
+
+def test_metrics_can_be_disabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "attendance.db"))
+    monkeypatch.setenv("METRICS_ENABLED", "false")
+    main = _load_main()
+    with TestClient(main.app) as test_client:
+        test_client.get("/api/lab-entry", params={"action": "enter"})
+        assert type(main.pool._all[0]) is sqlite3.Connection
+        assert "lab_http_requests_total{" not in test_client.get("/metrics").text
@@ -0,0 +1,138 @@
+"""Lab members and the ``presence`` table of each member's latest action.
+
+Every log row belongs to a member (``attendance_logs.user_id``). Rows recorded
+before multi-member support, and taps that do not name a member, belong to
+:data:`DEFAULT_USER_ID`.
+
+``presence`` holds one row per member pointing at their most recent log. An
+``AFTER INSERT`` trigger keeps it current inside the inserting transaction,
+whichever connection or worker wrote the row, so per-member dedupe is a
+primary-key lookup and "who is in now" reads one row per member instead of
+scanning the logs.
+"""
+from __future__ import annotations
+
+import sqlite3
+from typing import Dict, List
+
+DEFAULT_USER_ID = 1
+DEFAULT_USER_NAME = "default"
+MAX_NAME_LENGTH = 64
+
+
+class UnknownUserError(LookupError):
+    """Raised when a log is recorded for a member id that does not exist."""
+
+    def __init__(self, user_id: int) -> None:
+        super().__init__(f"Unknown user: {user_id}")
+        self.user_id = user_id
+
+
+class DuplicateUserError(ValueError):
+    """Raised when a member is created with a name that is already taken."""
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """Create ``users``, ``presence`` and the trigger maintaining it.
+
+    Requires ``attendance_logs.user_id``; the caller owns the transaction.
+    """
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO users (id, name) VALUES (?, ?)", (DEFAULT_USER_ID, DEFAULT_USER_NAME)
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS presence (
+            user_id INTEGER PRIMARY KEY,
+            log_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            timestamp TEXT
+        )
+        """
+    )
+    # Same ordering as the logs themselves: an older row never replaces a newer one.
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS attendance_logs_presence AFTER INSERT ON attendance_logs
+        BEGIN
+            INSERT INTO presence (user_id, log_id, action, timestamp)
+            VALUES (NEW.user_id, NEW.id, NEW.action, NEW.timestamp)
+            ON CONFLICT (user_id) DO UPDATE SET
+                log_id = excluded.log_id, action = excluded.action, timestamp = excluded.timestamp
+            WHERE (COALESCE(excluded.timestamp, ''), excluded.log_id)
+                >= (COALESCE(presence.timestamp, ''), presence.log_id);
+        END
+        """
+    )
+
+
+def rebuild_presence(conn: sqlite3.Connection) -> int:
+    """Refill ``presence`` from ``attendance_logs``; returns the number of members with logs.
+
+    One index lookup per member on ``(user_id, timestamp)``. The caller owns
+    the transaction.
+    """
+
+    conn.execute("DELETE FROM presence")
+    return conn.execute(
+        """
+        INSERT INTO presence (user_id, log_id, action, timestamp)
+        SELECT users.id, logs.id, logs.action, logs.timestamp
+        FROM users JOIN attendance_logs AS logs ON logs.id = (
+            SELECT id FROM attendance_logs
+            WHERE user_id = users.id
+            ORDER BY timestamp DESC, id DESC LIMIT 1
+        )
+        """
+    ).rowcount
+
+
+def user_exists(conn: sqlite3.Connection, user_id: int) -> bool:
+    return conn.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone() is not None
+
+
+def create_user(conn: sqlite3.Connection, name: str) -> Dict[str, object]:
+    """Insert a member and return it; the caller owns the transaction."""
+
+    try:
+        row = conn.execute(
+            "INSERT INTO users (name) VALUES (?) RETURNING id, name, created_at", (name,)
+        ).fetchall()[0]
+    except sqlite3.IntegrityError as exc:
+        raise DuplicateUserError(f"User already exists: {name}") from exc
+    return {"id": row[0], "name": row[1], "created_at": row[2]}
+
+
+def list_users(conn: sqlite3.Connection) -> List[Dict[str, object]]:
+    return [
+        {"id": user_id, "name": name, "created_at": created_at}
+        for user_id, name, created_at in conn.execute(
+            "SELECT id, name, created_at FROM users ORDER BY id"
+        ).fetchall()
+    ]
+
+
+def fetch_present(conn: sqlite3.Connection) -> List[Dict[str, object]]:
+    """Members whose latest action is an enter, earliest arrival first."""
+
+    return [
+        {"user_id": user_id, "name": name, "since": since}
+        for user_id, name, since in conn.execute(
+            """
+            SELECT presence.user_id, users.name, presence.timestamp
+            FROM presence JOIN users ON users.id = presence.user_id
+            WHERE presence.action = 'enter'
+            ORDER BY presence.timestamp ASC, presence.user_id ASC
+            """
+        ).fetchall()
+    ]
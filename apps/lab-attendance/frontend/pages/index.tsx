@@ -1,16 +1,26 @@
 import { useState, useEffect, useRef } from 'react'
 import axios from 'axios'
 
-interface AttendanceLog {
-  id: number
-  action: string
-  timestamp: string
+interface SessionSegment {
+  start: string
+  end: string
+  minutes: number
+  ongoing: boolean
 }
 
-interface AttendanceData {
-  data: AttendanceLog[]
-  count: number
-  days: number
+interface DaySummary {
+  date: string
+  total_minutes: number
+  sessions: SessionSegment[]
+}
+
+interface SessionsData {
+  from: string
+  to: string
+  tz: string
+  event_count: number
+  total_minutes: number
+  days: DaySummary[]
 }
 
 interface Status {
@@ -24,12 +34,13 @@ interface AttendanceSession {
     startTime: Date
     endTime: Date
     duration: number // 分単位
+    ongoing: boolean
   }[]
   totalMinutes: number
 }
 
 export default function Home() {
-  const [attendanceData, setAttendanceData] = useState<AttendanceData | null>(null)
+  const [sessionsData, setSessionsData] = useState<SessionsData | null>(null)
   const [status, setStatus] = useState<Status | null>(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
@@ -96,12 +107,13 @@ export default function Home() {
   // データを取得する関数
   const fetchData = async () => {
     try {
-      const [attendanceResponse, statusResponse] = await Promise.all([
-        axios.get('/lab_attendance/api/attendance-data?days=30'),
+      // セッションの組み立てと日別集計はサーバー側で行う
+      const [sessionsResponse, statusResponse] = await Promise.all([
+        axios.get('/lab_attendance/api/sessions?tz=Asia/Tokyo'),
         axios.get('/lab_attendance/api/status')
       ])
       
-      setAttendanceData(attendanceResponse.data)
+      setSessionsData(sessionsResponse.data)
       setStatus(statusResponse.data)
       setError(null)
     } catch (err) {
@@ -115,8 +127,39 @@ export default function Home() {
   useEffect(() => {
     fetchData()
     
-    // 30秒ごとにデータを更新
-    const dataInterval = setInterval(fetchData, 30000)
+    // 入退室はSSEで即時に受け取る。SSEが使えない・切断中は30秒ごとのポーリングに戻す
+    let pollInterval: ReturnType<typeof setInterval> | null = null
+    const startPolling = () => {
+      if (!pollInterval) {
+        pollInterval = setInterval(fetchData, 30000)
+      }
+    }
+    const stopPolling = () => {
+      if (pollInterval) {
+        clearInterval(pollInterval)
+        pollInterval = null
+      }
+    }
+    
+    let source: EventSource | null = null
+    if (typeof EventSource !== 'undefined') {
+      source = new EventSource('/lab_attendance/api/events')
+      // 全メンバーのイベントが流れてくるので、表示中のデフォルトメンバー（user_id=1）の分だけ再取得する
+      source.addEventListener('attendance', (event) => {
+        const { user_id } = JSON.parse((event as MessageEvent).data)
+        if (user_id === undefined || user_id === 1) {
+          fetchData()
+        }
+      })
+      source.onopen = stopPolling
+      // EventSourceは自動で再接続するので、その間だけポーリングする
+      source.onerror = startPolling
+    } else {
+      startPolling()
+    }
+    
+    // 日付の切り替わりなどに備えて5分ごとにも再取得（変化がなければ304で返る）
+    const refreshInterval = setInterval(fetchData, 5 * 60 * 1000)
     
     // 1秒ごとに現在時刻を更新（在室時間のリアルタイム表示用）
     const timeInterval = setInterval(() => {
@@ -124,136 +167,47 @@ export default function Home() {
     }, 1000)
     
     return () => {
-      clearInterval(dataInterval)
+      source?.close()
+      stopPolling()
+      clearInterval(refreshInterval)
       clearInterval(timeInterval)
     }
   }, [])
 
-  // JST日付文字列を取得する関数
-  const getJSTDateString = (date: Date): string => {
-    const year = date.getFullYear()
-    const month = String(date.getMonth() + 1).padStart(2, '0')
-    const day = String(date.getDate()).padStart(2, '0')
-    return `${year}-${month}-${day}`
-  }
-
-  // 日付跨ぎセッションを分割する関数
-  const splitSessionAcrossDates = (startTime: Date, endTime: Date): { date: string, startTime: Date, endTime: Date, duration: number }[] => {
-    const sessions: { date: string, startTime: Date, endTime: Date, duration: number }[] = []
-    let currentStart = new Date(startTime)
-    
-    while (currentStart < endTime) {
-      // その日の終わり（23:59:59.999）を計算
-      const dayEnd = new Date(currentStart)
-      dayEnd.setHours(23, 59, 59, 999)
-      
-      // 次の日の始まり（0:00:00.000）を計算
-      const nextDayStart = new Date(currentStart)
-      nextDayStart.setDate(nextDayStart.getDate() + 1)
-      nextDayStart.setHours(0, 0, 0, 0)
-      
-      // セッションの終了時刻を決定（その日の終わりか、実際の終了時刻の早い方）
-      const sessionEnd = endTime <= dayEnd ? endTime : dayEnd
-      
-      // そのセッションの時間を計算
-      const duration = safeFloor((sessionEnd.getTime() - currentStart.getTime()) / (1000 * 60) + 0.5)
-      
-      if (duration > 0) {
-        sessions.push({
-          date: getJSTDateString(currentStart),
-          startTime: new Date(currentStart),
-          endTime: new Date(sessionEnd),
-          duration
-        })
-      }
-      
-      // 次の日の開始時刻に移動
-      currentStart = nextDayStart
-    }
-    
-    return sessions
-  }
-
-  // 滞在セッションを計算する関数
+  // サーバーで集計済みのセッションを表示用に変換する関数（新しい日が先頭）
   const calculateAttendanceSessions = (): AttendanceSession[] => {
-    if (!attendanceData?.data || attendanceData.data.length === 0) {
+    if (!sessionsData?.days) {
       return []
     }
 
-    const logs = attendanceData.data
-    const sessionsByDate: { [date: string]: AttendanceSession } = {}
-    
-    for (let i = 0; i < logs.length; i++) {
-      const log = logs[i]
-      
-      if (log.action === 'enter') {
-        const enterTime = toJST(log.timestamp)
-        const nextLog = logs[i + 1]
-        
-        if (nextLog && nextLog.action === 'exit') {
-          // 完了したセッション
-          const exitTime = toJST(nextLog.timestamp)
-          
-          // 日付跨ぎの場合は分割
-          const splitSessions = splitSessionAcrossDates(enterTime, exitTime)
-          
-          for (const session of splitSessions) {
-            if (!sessionsByDate[session.date]) {
-              sessionsByDate[session.date] = {
-                date: session.date,
-                sessions: [],
-                totalMinutes: 0
-              }
-            }
-            
-            sessionsByDate[session.date].sessions.push({
-              startTime: session.startTime,
-              endTime: session.endTime,
-              duration: session.duration
-            })
-            sessionsByDate[session.date].totalMinutes += session.duration
-          }
-        } else if (i === logs.length - 1 && status?.current_status === 'enter') {
-          // 現在進行中のセッション（最後のenterで、現在在室中の場合）
-          
-          // 日付跨ぎの場合は分割
-          const splitSessions = splitSessionAcrossDates(enterTime, currentTime)
-          
-          for (const session of splitSessions) {
-            if (!sessionsByDate[session.date]) {
-              sessionsByDate[session.date] = {
-                date: session.date,
-                sessions: [],
-                totalMinutes: 0
-              }
-            }
-            
-            sessionsByDate[session.date].sessions.push({
-              startTime: session.startTime,
-              endTime: session.endTime,
-              duration: session.duration
-            })
-            sessionsByDate[session.date].totalMinutes += session.duration
+    return sessionsData.days.slice().reverse().map((day) => {
+      let totalMinutes = day.total_minutes
+      const sessions = day.sessions.map((segment) => {
+        const startTime = toJST(segment.start)
+        if (!segment.ongoing) {
+          return {
+            startTime,
+            endTime: toJST(segment.end),
+            duration: segment.minutes,
+            ongoing: false
           }
         }
-      }
-    }
-    
-    // 過去30日分のデータを生成（データがない日も含む、新しい日が先頭）
-    const sessions: AttendanceSession[] = []
-    for (let i = 0; i < 30; i++) {
-      const date = new Date()
-      date.setDate(date.getDate() - i)
-      const dateStr = date.toISOString().split('T')[0]
-      
-      sessions.push(sessionsByDate[dateStr] || {
-        date: dateStr,
-        sessions: [],
-        totalMinutes: 0
+        // 進行中のセッションは現在時刻まで伸ばす
+        const duration = safeFloor((currentTime.getTime() - startTime.getTime()) / (1000 * 60) + 0.5)
+        totalMinutes += duration - segment.minutes
+        return {
+          startTime,
+          endTime: currentTime,
+          duration,
+          ongoing: true
+        }
       })
-    }
-    
-    return sessions
+      return {
+        date: day.date,
+        sessions,
+        totalMinutes
+      }
+    })
   }
 
   const attendanceSessions = calculateAttendanceSessions()
@@ -352,13 +306,13 @@ export default function Home() {
                   <div className="time-bar-horizontal">
                     {session.sessions.map((sessionData, index) => {
                       const startHour = sessionData.startTime.getHours() + sessionData.startTime.getMinutes() / 60
-                      const endHour = sessionData.endTime.getHours() + sessionData.endTime.getMinutes() / 60
+                      // 日付跨ぎで分割されたセッションは翌日0:00で終わるので24時として扱う
+                      const endsNextDay = sessionData.endTime.getDate() !== sessionData.startTime.getDate()
+                      const endHour = endsNextDay ? 24 : sessionData.endTime.getHours() + sessionData.endTime.getMinutes() / 60
                       const width = ((endHour - startHour) / 24) * 100
                       const left = (startHour / 24) * 100
                       
-                      // 進行中のセッションかどうかを判定
-                      const isOngoing = status?.current_status === 'enter' && 
-                                       Math.abs(sessionData.endTime.getTime() - currentTime.getTime()) < 5000 // 5秒以内なら進行中
+                      const isOngoing = sessionData.ongoing
                       
                       return (
                         <div
@@ -382,11 +336,11 @@ export default function Home() {
           </div>
         </div>
 
-        {attendanceData && (
+        {sessionsData && (
           <div className="stats">
-            <p>過去30日間の入退室記録: {attendanceData.count}件</p>
+            <p>過去30日間の入退室記録: {sessionsData.event_count}件</p>
             <p>総滞在時間: {safeFloor(attendanceSessions.reduce((sum, s) => sum + s.totalMinutes, 0) / 60)}時間</p>
-            <p className="auto-update-info">30秒ごとに自動更新</p>
+            <p className="auto-update-info">入退室をリアルタイムで反映</p>
           </div>
         )}
       </main>
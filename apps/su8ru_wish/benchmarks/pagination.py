@@ -0,0 +1,107 @@
+"""End-to-end time of ``_fetch_all_items`` against simulated network latency.
+
+Usage:
+    python benchmarks/pagination.py --pages 30 --items-per-page 10 --latency 0.3
+
+Pages are generated like in ``parse_pages.py`` and served by a fake session
+that sleeps ``--latency`` seconds per request. The result compares elapsed
+time with the total time spent waiting on the network and the total time
+spent parsing; with the next page prefetched during parsing, elapsed time
+should approach the larger of the two instead of their sum.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from parse_pages import synthetic_page, watcher  # noqa: E402
+
+LIST_URL = "https://www.amazon.co.jp/hz/wishlist/ls/20XG7YB46EBUX"
+PAGE_URL = "https://www.amazon.co.jp/hz/wishlist/slv/items?filter=unpurchased&paginationToken=TOKEN{}&lid=20XG7YB46EBUX"
+
+
+class _Response:
+    status_code = 200
+    encoding = "utf-8"
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.headers: dict = {}
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class LatencySession:
+    def __init__(self, pages: dict, latency: float) -> None:
+        self.pages = pages
+        self.latency = latency
+        self.network_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, url: str, **kwargs) -> _Response:
+        time.sleep(self.latency)
+        with self._lock:
+            self.network_seconds += self.latency
+        return _Response(self.pages[url])
+
+
+def build_pages(count: int, items: int) -> dict:
+    pages = {}
+    for page in range(count):
+        next_token = f"TOKEN{page + 1}" if page + 1 < count else None
+        pages[LIST_URL if page == 0 else PAGE_URL.format(page)] = synthetic_page(items, page, next_token)
+    return pages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--items-per-page", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per simulated request")
+    parser.add_argument(
+        "--rate", type=float, default=1000, help="Per-host request rate limit (watcher default: REQUESTS_PER_SECOND)"
+    )
+    args = parser.parse_args()
+    watcher._throttle = watcher.HostThrottle(rate=args.rate, burst=max(1, int(args.rate)))
+
+    pages = build_pages(args.pages, args.items_per_page)
+    parse_page = watcher._parse_page
+    parse_seconds = 0.0
+
+    def timed_parse(html: str, parser: str | None = None):
+        nonlocal parse_seconds
+        started = time.perf_counter()
+        soup = parse_page(html, parser)
+        parse_seconds += time.perf_counter() - started
+        return soup
+
+    watcher._parse_page = timed_parse
+    session = LatencySession(pages, args.latency)
+    started = time.perf_counter()
+    items = watcher._fetch_all_items(session, LIST_URL)
+    elapsed = time.perf_counter() - started
+
+    print(
+        json.dumps(
+            {
+                "pages": args.pages,
+                "items": len(items),
+                "elapsed_s": round(elapsed, 2),
+                "network_s": round(session.network_seconds, 2),
+                "parse_s": round(parse_seconds, 2),
+                "serial_estimate_s": round(session.network_seconds + parse_seconds, 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
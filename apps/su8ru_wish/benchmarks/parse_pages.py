@@ -0,0 +1,153 @@
+"""Per-page parse time and peak memory of the wishlist page parser.
+
+Usage:
+    python benchmarks/parse_pages.py saved/page1.html saved/page2.html --repeat 20
+    python benchmarks/parse_pages.py --synthetic-items 10
+
+Pass wishlist pages saved from a browser ("Save Page As", HTML only). Without
+paths a synthetic page is generated that mimics their shape: a large head
+with inline styles and scripts, navigation, recommendation carousels, the
+``#g-items`` list and the ``a-state`` pagination script.
+
+Every page is parsed with each installed tree builder in two ways:
+``full`` builds the whole document like the watcher used to, ``strained``
+is ``watcher._parse_page`` (only the items container and pagination
+hints). Both then extract the items and the next-page URL. Time is the
+median over ``--repeat`` runs; peak memory is measured separately with
+tracemalloc so it does not slow the timed runs. Results are printed as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+APP_DIR = Path(__file__).resolve().parents[1]
+spec = importlib.util.spec_from_file_location("watcher", APP_DIR / "watcher.py")
+watcher = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = watcher
+spec.loader.exec_module(watcher)
+
+BASE_URL = "https://www.amazon.co.jp/hz/wishlist/ls/20XG7YB46EBUX"
+BUILDERS = ("html.parser", "lxml")
+
+
+def synthetic_page(items: int, page: int = 0, next_token: str | None = "TOKEN") -> str:
+    head = "".join(
+        f'<link rel="stylesheet" href="/css/{i}.css"><style>.c{i}{{margin:{i}px;padding:{i}px}}</style>'
+        for i in range(200)
+    )
+    scripts = "".join(
+        f"<script>window.ue_{i}=function(a){{return a&&a.push({{k:{i},v:'{'x' * 400}'}})}};</script>"
+        for i in range(150)
+    )
+    nav = "".join(
+        f'<li class="nav-item"><a class="nav-a" href="/b/{i}"><span class="nav-text">カテゴリ {i}</span></a></li>'
+        for i in range(600)
+    )
+    carousel = "".join(
+        f'<div class="a-carousel-card"><a href="/dp/B0REC{i:05d}"><img src="/i/{i}.jpg" alt="おすすめ {i}">'
+        f'<span class="a-size-base">おすすめ商品 {i}</span></a><span class="a-price"><span class="a-offscreen">￥{i * 10:,}</span></span></div>'
+        for i in range(300)
+    )
+    rows = "".join(
+        f"""
+        <li data-itemid="I{page:03d}{i:09d}" class="a-spacing-none g-item-sortable">
+          <div class="a-fixed-left-grid"><div class="a-fixed-left-grid-inner">
+            <div class="a-fixed-left-grid-col a-col-left"><a href="/dp/B{page:03d}{i:06d}/?coliid=I{i}">
+              <img src="/images/I/{i}.jpg" alt="商品 {i}" height="135" width="135"></a></div>
+            <div class="a-fixed-left-grid-col a-col-right">
+              <h2 class="a-size-base"><a id="itemName_I{i}" class="a-link-normal" title="ほしい物 {i} 限定版"
+                 href="/dp/B{page:03d}{i:06d}/?coliid=I{i}&amp;ref_=lv_ov_lig_dp_it">ほしい物 {i} 限定版</a></h2>
+              <span class="a-size-base">by 著者 {i} (著)</span>
+              <div class="a-row"><i class="a-icon a-icon-star-small a-star-small-4-5"></i><a href="/review/{i}">1,234</a></div>
+              <div class="a-row"><span class="a-price" data-a-size="m"><span class="a-offscreen">￥{1000 + i * 37:,}</span>
+                <span aria-hidden="true"><span class="a-price-symbol">￥</span><span class="a-price-whole">{1000 + i * 37:,}</span></span></span></div>
+              <div class="a-row"><span class="a-size-small">追加日 2024年5月{1 + i % 28}日</span></div>
+              <div class="a-row"><a class="a-button-text" href="/gp/cart/{i}">カートに入れる</a></div>
+            </div></div></div>
+        </li>"""
+        for i in range(items)
+    )
+    state = (
+        '<script type="a-state" data-a-state="{&quot;key&quot;:&quot;scrollState&quot;}">'
+        f'{{"showMoreUrl":"/hz/wishlist/slv/items?filter=unpurchased&amp;paginationToken={next_token}&amp;lid=20XG7YB46EBUX",'
+        f'"paginationToken":"{next_token}"}}</script>'
+    ) if next_token else ""
+    return (
+        f"<!doctype html><html><head>{head}{scripts}</head><body>"
+        f'<header><ul class="nav">{nav}</ul></header>'
+        f'<main><div id="wishlist-page"><ul id="g-items" class="a-unordered-list">{rows}</ul>{state}</div>'
+        f'<div class="a-carousel">{carousel}</div></main>'
+        f"<footer>{nav}</footer></body></html>"
+    )
+
+
+def full_parse(html: str, builder: str) -> int:
+    soup = BeautifulSoup(html, builder)
+    items = watcher._parse_items_from_soup(soup, BASE_URL)
+    watcher._extract_show_more_url(soup, BASE_URL)
+    return len(items)
+
+
+def strained_parse(html: str, builder: str) -> int:
+    soup = watcher._parse_page(html, builder)
+    items = watcher._parse_items_from_soup(soup, BASE_URL)
+    watcher._extract_show_more_url(soup, BASE_URL)
+    return len(items)
+
+
+MODES: Dict[str, Callable[[str, str], int]] = {"full": full_parse, "strained": strained_parse}
+
+
+def measure(parse: Callable[[str, str], int], html: str, builder: str, repeat: int) -> Dict[str, float]:
+    timings: List[float] = []
+    items = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        items = parse(html, builder)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    parse(html, builder)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "items": items,
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "peak_mib": round(peak / 1024 / 1024, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", type=Path, help="Saved wishlist pages")
+    parser.add_argument("--synthetic-items", type=int, default=10, help="Items on the generated page")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    pages = {str(path): path.read_text(encoding="utf-8") for path in args.paths}
+    if not pages:
+        pages = {f"synthetic-{args.synthetic_items}-items": synthetic_page(args.synthetic_items)}
+    builders = [name for name in BUILDERS if name == "html.parser" or importlib.util.find_spec(name)]
+
+    results = []
+    for name, html in pages.items():
+        for builder in builders:
+            for mode, parse in MODES.items():
+                results.append(
+                    {"page": name, "kb": len(html.encode()) // 1024, "builder": builder, "mode": mode}
+                    | measure(parse, html, builder, args.repeat)
+                )
+    print(json.dumps({"default_builder": watcher.HTML_PARSER, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
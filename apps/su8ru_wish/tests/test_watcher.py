@@ -17,6 +17,13 @@ sys.modules[spec.name] = watcher
 spec.loader.exec_module(watcher)
 
 
+@pytest.fixture(autouse=True)
+def unthrottled(monkeypatch):
+    throttle = watcher.HostThrottle(rate=1_000_000, burst=1_000_000)
+    monkeypatch.setattr(watcher, "_throttle", throttle)
+    return throttle
+
+
 SAMPLE_HTML = """
 <html>
   <body>
@@ -161,3 +168,528 @@ def test_extract_title_skips_more_link():
     title, href = watcher._extract_title_and_link(node)
     assert title == "商品C"
     assert href == "/dp/B000TEST03/"
+
+
+PAGE_WITH_NOISE_HTML = """
+<html>
+  <head><script>var noise = "<li data-itemid='fake'>";</script></head>
+  <body>
+    <ul class="nav"><li><a href="/dp/B000NOISE1/">ナビ</a></li></ul>
+    <div id="wishlist">
+      <ul id="g-items">
+        <li data-itemid="item-1"><a href="/dp/B000TEST01/">商品A</a></li>
+      </ul>
+      <script type="a-state" data-a-state="{&quot;key&quot;:&quot;scrollState&quot;}">{"showMoreUrl":"/hz/wishlist/slv/items?paginationToken=NEXT"}</script>
+    </div>
+    <div class="a-carousel"><a href="/dp/B000NOISE2/">おすすめ</a></div>
+  </body>
+</html>
+"""
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_parse_page_keeps_only_items_and_pagination(parser):
+    if parser == "lxml":
+        pytest.importorskip("lxml")
+    soup = watcher._parse_page(PAGE_WITH_NOISE_HTML, parser)
+
+    assert "B000NOISE" not in str(soup)
+    assert [item.item_id for item in watcher._parse_items_from_soup(soup, "https://www.amazon.co.jp")] == [
+        "B000TEST01"
+    ]
+    next_url = watcher._extract_show_more_url(soup, "https://www.amazon.co.jp")
+    assert parse_qs(urlparse(next_url).query)["paginationToken"] == ["NEXT"]
+
+
+def _paged_html(item_ids, next_token=None):
+    rows = "".join(f'<li data-itemid="{i}"><a href="/dp/{i}/">商品 {i}</a></li>' for i in item_ids)
+    script = ""
+    if next_token:
+        script = (
+            '<script type="a-state" data-a-state="{&quot;key&quot;:&quot;scrollState&quot;}">'
+            f'{{"showMoreUrl":"/hz/wishlist/slv/items?paginationToken={next_token}"}}</script>'
+        )
+    return f'<html><body><ul id="g-items">{rows}</ul>{script}</body></html>'
+
+
+class _FakeResponse:
+    def __init__(self, text, status_code=200, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.encoding = "utf-8"
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, pages, on_get=None):
+        self.pages = pages
+        self.on_get = on_get
+        self.requested = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.requested.append(url)
+        if self.on_get:
+            self.on_get(url)
+        page = self.pages[url]
+        return page if isinstance(page, _FakeResponse) else _FakeResponse(page)
+
+
+LIST_URL = "https://www.amazon.co.jp/hz/wishlist/ls/LIST"
+PAGE_URL = "https://www.amazon.co.jp/hz/wishlist/slv/items?paginationToken={}"
+
+
+def test_scan_show_more_url_matches_parsed_page():
+    html = _paged_html(["B000TEST01"], next_token="T2")
+    assert watcher._scan_show_more_url(html, LIST_URL) == watcher._extract_show_more_url(
+        watcher._parse_page(html), LIST_URL
+    )
+    assert watcher._scan_show_more_url(SHOW_MORE_HTML, LIST_URL) == watcher._extract_show_more_url(
+        BeautifulSoup(SHOW_MORE_HTML, "html.parser"), LIST_URL
+    )
+    assert watcher._scan_show_more_url(SAMPLE_HTML, LIST_URL) is None
+
+
+def test_next_page_is_fetched_while_the_current_one_is_parsed(monkeypatch):
+    import threading
+
+    pages = {
+        LIST_URL: _paged_html(["B000TEST01", "B000TEST02"], next_token="T2"),
+        PAGE_URL.format("T2"): _paged_html(["B000TEST03"], next_token="T3"),
+        PAGE_URL.format("T3"): _paged_html(["B000TEST04"]),
+    }
+    second_page_requested = threading.Event()
+    session = _FakeSession(
+        pages, on_get=lambda url: url == PAGE_URL.format("T2") and second_page_requested.set()
+    )
+    parse_page = watcher._parse_page
+    parsed = []
+
+    def slow_parse(html, parser=None):
+        if not parsed:
+            # The first page must not finish parsing before page 2 is requested.
+            assert second_page_requested.wait(5)
+        parsed.append(html)
+        return parse_page(html, parser)
+
+    monkeypatch.setattr(watcher, "_parse_page", slow_parse)
+    items = watcher._fetch_all_items(session, LIST_URL)
+
+    assert [item.item_id for item in items] == ["B000TEST01", "B000TEST02", "B000TEST03", "B000TEST04"]
+    assert session.requested == [LIST_URL, PAGE_URL.format("T2"), PAGE_URL.format("T3")]
+
+
+def test_pagination_loop_is_detected_with_prefetching():
+    pages = {
+        LIST_URL: _paged_html(["B000TEST01"], next_token="T2"),
+        PAGE_URL.format("T2"): _paged_html(["B000TEST02"], next_token="T2"),
+    }
+    session = _FakeSession(pages)
+
+    items = watcher._fetch_all_items(session, LIST_URL)
+
+    assert [item.item_id for item in items] == ["B000TEST01", "B000TEST02"]
+    assert session.requested == [LIST_URL, PAGE_URL.format("T2")]
+
+
+def test_stopping_early_stops_the_prefetch_retries(monkeypatch):
+    import threading
+    import time
+
+    pages = {
+        LIST_URL: _paged_html(["B000TEST01"], next_token="T2"),
+        PAGE_URL.format("T2"): _paged_html(["B000TEST01"], next_token="T3"),
+        PAGE_URL.format("T3"): _FakeResponse("", status_code=500),
+    }
+    third_page_requested = threading.Event()
+    session = _FakeSession(
+        pages, on_get=lambda url: url == PAGE_URL.format("T3") and third_page_requested.set()
+    )
+    parse_page = watcher._parse_page
+
+    def parse_after_prefetch_failed(html, parser=None):
+        if "T3" in html:
+            # Page 2 is parsed while the prefetch of page 3 backs off after an error.
+            assert third_page_requested.wait(5)
+        return parse_page(html, parser)
+
+    monkeypatch.setattr(watcher, "_parse_page", parse_after_prefetch_failed)
+    monkeypatch.setattr(watcher, "_backoff_seconds", lambda attempt: 30)
+    started = time.monotonic()
+    items = watcher._fetch_all_items(session, LIST_URL)
+
+    assert [item.item_id for item in items] == ["B000TEST01"]
+    assert time.monotonic() - started < 5
+    assert session.requested.count(PAGE_URL.format("T3")) == 1
+    # Nothing keeps using the session once the function has returned.
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("wishlist-prefetch")]
+
+
+def test_unneeded_prefetch_never_shares_the_session(monkeypatch):
+    import threading
+    import time
+
+    pages = {
+        LIST_URL: _paged_html(["B000TEST01"], next_token="T2"),
+        PAGE_URL.format("T2"): _paged_html(["B000TEST02"]),
+        PAGE_URL.format("WRONG"): _paged_html(["B000TEST09"]),
+    }
+    lock = threading.Lock()
+    active = [0, 0]  # in flight now, most ever in flight
+
+    class TrackingSession(_FakeSession):
+        def get(self, url, timeout=None, headers=None):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            try:
+                time.sleep(0.05)
+                return super().get(url, timeout, headers)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+    # The scan guesses a different URL than the parser finds, so the prefetch is discarded.
+    monkeypatch.setattr(
+        watcher, "_scan_show_more_url", lambda html, base: PAGE_URL.format("WRONG") if "T2" in html else None
+    )
+    items = watcher._fetch_all_items(TrackingSession(pages), LIST_URL)
+
+    assert [item.item_id for item in items] == ["B000TEST01", "B000TEST02"]
+    assert active == [0, 1]
+
+
+def test_pagination_limit_still_applies(monkeypatch):
+    pages = {LIST_URL: _paged_html(["B000TEST00"], next_token="T1")}
+    for n in range(1, 5):
+        pages[PAGE_URL.format(f"T{n}")] = _paged_html([f"B000TEST0{n}"], next_token=f"T{n + 1}")
+    monkeypatch.setattr(watcher, "MAX_PAGINATION_PAGES", 3)
+
+    with pytest.raises(watcher.WishlistWatcherError):
+        watcher._fetch_all_items(_FakeSession(pages), LIST_URL)
+
+
+def test_load_config_fills_defaults_and_rejects_shared_state(tmp_path, monkeypatch):
+    import json
+
+    monkeypatch.setenv("WEBHOOK_URL", "https://hooks.slack.com/services/default")
+    path = tmp_path / "lists.json"
+    path.write_text(
+        json.dumps(
+            {
+                "max_workers": 3,
+                "lists": [
+                    {"url": "https://www.amazon.co.jp/hz/wishlist/ls/AAA"},
+                    {
+                        "url": "https://www.amazon.co.jp/hz/wishlist/ls/BBB",
+                        "name": "friend",
+                        "title": "ともだち",
+                        "webhook_url": "https://hooks.slack.com/services/friend",
+                    },
+                ],
+            }
+        )
+    )
+
+    config = watcher._load_config(path, tmp_path)
+
+    assert config.max_workers == 3
+    assert config.per_host_limit == watcher.DEFAULT_PER_HOST_LIMIT
+    first, second = config.targets
+    assert (first.name, first.state_path, first.title) == ("AAA", tmp_path / "state_AAA.json", "すばる")
+    assert first.webhook_url == "https://hooks.slack.com/services/default"
+    assert (second.name, second.state_path) == ("friend", tmp_path / "state_friend.json")
+    assert second.webhook_url == "https://hooks.slack.com/services/friend"
+
+    path.write_text(
+        json.dumps(
+            {
+                "lists": [
+                    {"url": "https://www.amazon.co.jp/hz/wishlist/ls/AAA", "state_filename": "s.json"},
+                    {"url": "https://www.amazon.co.jp/hz/wishlist/ls/BBB", "state_filename": "s.json"},
+                ]
+            }
+        )
+    )
+    with pytest.raises(watcher.WishlistWatcherError):
+        watcher._load_config(path, tmp_path)
+
+
+def test_session_pool_limits_requests_per_host(monkeypatch):
+    import threading
+    import time
+
+    in_flight = {}
+    peak = {}
+    lock = threading.Lock()
+
+    class CountingSession:
+        def __init__(self):
+            self.headers = {}
+
+        def mount(self, prefix, adapter):
+            pass
+
+        def get(self, url, **kwargs):
+            host = urlparse(url).netloc
+            with lock:
+                in_flight[host] = in_flight.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), in_flight[host])
+            time.sleep(0.02)
+            with lock:
+                in_flight[host] -= 1
+            return url
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(watcher.requests, "Session", CountingSession)
+    pool = watcher.SessionPool({}, per_host_limit=2)
+    urls = [f"https://a.example/{i}" for i in range(8)] + [f"https://b.example/{i}" for i in range(8)]
+    threads = [threading.Thread(target=pool.get, args=(url,)) for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == {"a.example": 2, "b.example": 2}
+
+
+def test_main_watches_every_configured_list(tmp_path, monkeypatch):
+    import json
+
+    lists = {
+        "https://www.amazon.co.jp/hz/wishlist/ls/AAA": "https://hooks.slack.com/services/a",
+        "https://www.amazon.co.jp/hz/wishlist/ls/BBB": "https://hooks.slack.com/services/b",
+        "https://www.amazon.co.jp/hz/wishlist/ls/CCC": "https://hooks.slack.com/services/c",
+    }
+    config = tmp_path / "lists.json"
+    config.write_text(
+        json.dumps({"lists": [{"url": url, "webhook_url": hook} for url, hook in lists.items()]})
+    )
+    (tmp_path / "state_BBB.json").write_text(json.dumps({"items": []}))
+    monkeypatch.setenv("LISTS_CONFIG", str(config))
+    monkeypatch.setenv("STATE_DIR", str(tmp_path))
+    monkeypatch.setenv("BASELINE_ONLY", "false")
+
+    def fake_fetch(session, list_url, cache=None):
+        if list_url.endswith("CCC"):
+            raise watcher.WishlistWatcherError("boom")
+        lid = list_url.rsplit("/", 1)[-1]
+        return [watcher.WishlistItem(item_id=lid, title=f"Item {lid}", price=100.0, url=list_url)]
+
+    sent = []
+    monkeypatch.setattr(watcher, "_fetch_all_items", fake_fetch)
+    monkeypatch.setattr(watcher, "_notify_slack", lambda url, text, session: sent.append((url, text)))
+
+    assert watcher.main() == 0
+
+    messages = dict(sent)
+    assert "ベースライン" in messages["https://hooks.slack.com/services/a"]
+    assert "変化あり" in messages["https://hooks.slack.com/services/b"]
+    assert "エラー" in messages["https://hooks.slack.com/services/c"]
+    assert json.loads((tmp_path / "state_AAA.json").read_text())["items"][0]["id"] == "AAA"
+    assert not (tmp_path / "state_CCC.json").exists()
+
+
+def test_items_container_hash_ignores_noise_outside_and_volatile_attributes():
+    base = _paged_html(["B000TEST01"], next_token="T2")
+    reformatted = base.replace("<li", "\n   <li").replace(
+        '<ul id="g-items">', '<ul id="g-items" data-csrf-token="abc">'
+    )
+    outside = base.replace("<body>", "<body><div>広告 123</div>")
+    changed = _paged_html(["B000TEST01", "B000TEST02"], next_token="T2")
+
+    digest = watcher._items_container_hash(base)
+    assert digest is not None
+    assert watcher._items_container_hash(reformatted) == digest
+    assert watcher._items_container_hash(outside) == digest
+    assert watcher._items_container_hash(changed) != digest
+    assert watcher._items_container_hash("<html><body></body></html>") is None
+
+
+def _two_page_list():
+    return {
+        LIST_URL: _paged_html(["B000TEST01", "B000TEST02"], next_token="T2"),
+        PAGE_URL.format("T2"): _paged_html(["B000TEST03"]),
+    }
+
+
+def test_unchanged_pages_reuse_cached_items_without_parsing(monkeypatch):
+    pages = _two_page_list()
+    first_cache = watcher.PageCache()
+    first = watcher._fetch_all_items(_FakeSession(pages), LIST_URL, first_cache)
+    state = watcher.WishlistState.from_dict(
+        watcher.WishlistState(last_checked_at="t", items=first, pages=first_cache.current).to_dict()
+    )
+
+    def no_parse(html, parser=None):
+        raise AssertionError("unchanged page was parsed")
+
+    monkeypatch.setattr(watcher, "_parse_page", no_parse)
+    # Same items; only markup outside #g-items differs.
+    pages = {url: html.replace("<body>", "<body><p>ad</p>") for url, html in pages.items()}
+    cache = watcher.PageCache(state)
+    second = watcher._fetch_all_items(_FakeSession(pages), LIST_URL, cache)
+
+    assert second == first
+    assert cache.reused_pages == 2
+    assert cache.current == first_cache.current
+
+
+def test_not_modified_pages_are_served_from_the_cache(monkeypatch):
+    pages = _two_page_list()
+    pages[LIST_URL] = _FakeResponse(pages[LIST_URL], headers={"ETag": '"v1"'})
+    first_cache = watcher.PageCache()
+    first = watcher._fetch_all_items(_FakeSession(pages), LIST_URL, first_cache)
+    state = watcher.WishlistState(last_checked_at="t", items=first, pages=first_cache.current)
+
+    sent_headers = {}
+
+    class ConditionalSession(_FakeSession):
+        def get(self, url, timeout=None, headers=None):
+            sent_headers[url] = headers
+            if headers and headers.get("If-None-Match") == '"v1"':
+                return _FakeResponse("", status_code=304)
+            return super().get(url, timeout, headers)
+
+    cache = watcher.PageCache(state)
+    second = watcher._fetch_all_items(ConditionalSession(pages), LIST_URL, cache)
+
+    assert second == first
+    assert sent_headers[LIST_URL] == {"If-None-Match": '"v1"'}
+    assert sent_headers[PAGE_URL.format("T2")] is None
+    assert cache.current[LIST_URL].etag == '"v1"'
+    assert cache.reused_pages == 2
+
+
+class _ScriptedSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, timeout=None, headers=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def test_fetch_does_not_sleep_after_the_final_attempt(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(watcher.time, "sleep", sleeps.append)
+    session = _ScriptedSession([_FakeResponse("", status_code=503)] * watcher.MAX_FETCH_ATTEMPTS)
+
+    with pytest.raises(watcher.WishlistWatcherError):
+        watcher._fetch_with_retry(session, LIST_URL)
+
+    assert session.calls == watcher.MAX_FETCH_ATTEMPTS
+    assert len(sleeps) == watcher.MAX_FETCH_ATTEMPTS - 1
+    for attempt, seconds in enumerate(sleeps, start=1):
+        step = min(watcher.BACKOFF_MAX_SECONDS, watcher.BACKOFF_BASE_SECONDS ** attempt)
+        assert step / 2 <= seconds <= step
+
+
+def test_fetch_honours_retry_after_and_slows_the_host_down(monkeypatch, unthrottled):
+    sleeps = []
+    monkeypatch.setattr(watcher.time, "sleep", sleeps.append)
+    pauses = []
+    bucket, _ = unthrottled.host(LIST_URL)
+    monkeypatch.setattr(bucket, "pause", pauses.append)
+    session = _ScriptedSession(
+        [_FakeResponse("", status_code=429, headers={"Retry-After": "7"}), _FakeResponse("ok")]
+    )
+
+    assert watcher._fetch_with_retry(session, LIST_URL).text == "ok"
+    assert pauses == [7.0]
+    assert sleeps == []
+    assert bucket.rate < bucket.max_rate
+
+    session = _ScriptedSession([_FakeResponse("", status_code=429, headers={"Retry-After": "3600"})])
+    with pytest.raises(watcher.WishlistWatcherError):
+        watcher._fetch_with_retry(session, LIST_URL)
+    assert session.calls == 1
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    class NotFound(_FakeResponse):
+        def raise_for_status(self):
+            raise watcher.requests.HTTPError("404 Client Error")
+
+    monkeypatch.setattr(watcher.time, "sleep", lambda seconds: pytest.fail("slept"))
+    session = _ScriptedSession([NotFound("", status_code=404)])
+    with pytest.raises(watcher.WishlistWatcherError):
+        watcher._fetch_with_retry(session, LIST_URL)
+    assert session.calls == 1
+
+
+def test_circuit_breaker_fails_fast_once_a_host_keeps_failing(monkeypatch):
+    monkeypatch.setattr(watcher.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(watcher, "_throttle", watcher.HostThrottle(rate=1000, burst=1000, failure_threshold=3))
+    failing = _ScriptedSession([_FakeResponse("", status_code=500)] * 3)
+    with pytest.raises(watcher.WishlistWatcherError):
+        watcher._fetch_with_retry(failing, LIST_URL)
+
+    untouched = _ScriptedSession([])
+    with pytest.raises(watcher.CircuitOpenError):
+        watcher._fetch_with_retry(untouched, LIST_URL + "?page=2")
+    assert untouched.calls == 0
+
+
+def test_circuit_breaker_lets_one_probe_through_after_the_cooldown():
+    now = [0.0]
+    breaker = watcher.CircuitBreaker(threshold=2, cooldown=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 20
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+    breaker.record_failure()
+    breaker.record_failure()
+    now[0] = 30
+    assert breaker.allow()
+    # A probe that never reports back does not keep the host closed forever.
+    now[0] = 40
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_token_bucket_paces_requests_and_waits_out_pauses():
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(round(seconds, 3))
+        now[0] += seconds
+
+    bucket = watcher.TokenBucket(max_rate=2, burst=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        bucket.acquire()
+    assert slept == [0.5, 0.5]
+
+    bucket.pause(3)
+    bucket.acquire()
+    assert slept[2] == 3.0
+
+    bucket.slow_down()
+    assert bucket.rate == 1
+    bucket.speed_up()
+    assert bucket.rate == pytest.approx(1.2)
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert watcher._retry_after_seconds("12") == 12.0
+    assert watcher._retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert watcher._retry_after_seconds("soon") is None
+    assert watcher._retry_after_seconds(None) is None
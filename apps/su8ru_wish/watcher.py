@@ -2,21 +2,27 @@
 from __future__ import annotations
 
 import hashlib
+import importlib.util
 import json
 import logging
 import os
+import random
 import sys
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from html import unescape
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Dict, Iterable, List, Optional, Protocol, Sequence, Tuple
 from urllib.parse import urlencode, urljoin, urlparse
 import re
 
 import requests
-from bs4 import BeautifulSoup, Tag
+import requests.adapters
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 
 # Default constants matching the spec but overridable with environment variables.
 DEFAULT_STATE_FILENAME = "state_friend.json"
@@ -30,13 +36,58 @@ DEFAULT_WEBHOOK_URL = os.environ.get("DEFAULT_WEBHOOK_URL")
 REQUEST_TIMEOUT = 20  # seconds
 MAX_FETCH_ATTEMPTS = 4
 BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 30
+MAX_RETRY_AFTER_SECONDS = 120  # longer waits give up instead of blocking the run
+REQUESTS_PER_SECOND = float(os.environ.get("REQUESTS_PER_SECOND", "2"))  # per host
+REQUEST_BURST = int(os.environ.get("REQUEST_BURST", "4"))
+CIRCUIT_BREAKER_THRESHOLD = 5  # consecutive failed attempts against one host
+CIRCUIT_BREAKER_COOLDOWN_SECONDS = 300
 MAX_PAGINATION_PAGES = int(os.environ.get("MAX_PAGINATION_PAGES", "300"))
+DEFAULT_LIST_TITLE = "すばる"
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_HOST_LIMIT = 4
 
 logger = logging.getLogger("wishlist_watcher")
 
 IGNORED_TITLE_TEXTS = {"", "もっと見る", "詳細を見る", "今すぐチェック", "すべて表示"}
 
 
+def _default_html_parser() -> str:
+    # lxml builds the same tree several times faster; html.parser needs no extra install.
+    return "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+HTML_PARSER = os.environ.get("HTML_PARSER") or _default_html_parser()
+
+
+def _is_wanted_tag(name: str, attrs: Optional[Dict[str, object]]) -> bool:
+    attrs = attrs or {}
+    if attrs.get("id") == "g-items" or attrs.get("data-testid") == "g-items":
+        return True
+    if name == "input" and attrs.get("name") == "showMoreUrl":
+        return True
+    return name == "script" and attrs.get("type") == "a-state"
+
+
+class _WishlistStrainer(SoupStrainer):
+    """Keeps only the items container and the pagination hints out of a whole page.
+
+    Everything else (navigation, recommendations, inline scripts) is skipped
+    while parsing, so no tree is built for it. beautifulsoup4 >= 4.13 asks
+    ``allow_tag_creation``/``allow_string_creation``; older releases ask
+    ``search_tag`` and drop top-level strings on their own.
+    """
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:  # noqa: ANN001
+        return _is_wanted_tag(name, attrs)
+
+    def allow_string_creation(self, string) -> bool:  # noqa: ANN001
+        return False
+
+    def search_tag(self, markup_name=None, markup_attrs=None) -> bool:  # noqa: ANN001
+        return _is_wanted_tag(markup_name, markup_attrs)
+
+
 @dataclass(frozen=True)
 class WishlistItem:
     """Represents a single wishlist item snapshot."""
@@ -73,6 +124,7 @@ class WishlistState:
 
     last_checked_at: str
     items: List[WishlistItem]
+    pages: Dict[str, "CachedPage"] = field(default_factory=dict)
 
     def to_dict(self) -> Dict[str, object]:
         return {
@@ -86,6 +138,7 @@ class WishlistState:
                 }
                 for item in self.items
             ],
+            "pages": {url: asdict(page) for url, page in self.pages.items()},
         }
 
     @classmethod
@@ -102,7 +155,56 @@ class WishlistState:
             if isinstance(item, dict)
         ]
         last_checked = payload.get("last_checked_at") or datetime.now(timezone.utc).isoformat()
-        return cls(last_checked_at=last_checked, items=items)
+        pages_payload = payload.get("pages") or {}
+        pages = {
+            url: CachedPage(
+                etag=page.get("etag"),
+                last_modified=page.get("last_modified"),
+                content_hash=page.get("content_hash", ""),
+                item_ids=list(page.get("item_ids", [])),
+                next_url=page.get("next_url"),
+            )
+            for url, page in pages_payload.items()
+            if isinstance(page, dict)
+        }
+        return cls(last_checked_at=last_checked, items=items, pages=pages)
+
+
+@dataclass
+class CachedPage:
+    """What one page URL looked like on the previous run."""
+
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    item_ids: List[str]
+    next_url: Optional[str]
+
+
+class PageCache:
+    """Validators, content hashes and items of each page from the previous run.
+
+    Pages answered with ``304 Not Modified``, or whose items container hashes
+    the same as last time, reuse the previous run's items without being
+    parsed. ``current`` collects the entries to save for the next run.
+    """
+
+    def __init__(self, previous: Optional[WishlistState] = None) -> None:
+        self.previous: Dict[str, CachedPage] = dict(previous.pages) if previous else {}
+        self._items: Dict[str, WishlistItem] = (
+            {item.item_id: item for item in previous.items} if previous else {}
+        )
+        self.current: Dict[str, CachedPage] = {}
+        self.reused_pages = 0
+
+    def usable(self, url: str) -> Optional[CachedPage]:
+        entry = self.previous.get(url)
+        if entry is None or any(item_id not in self._items for item_id in entry.item_ids):
+            return None
+        return entry
+
+    def items(self, entry: CachedPage) -> List[WishlistItem]:
+        return [self._items[item_id] for item_id in entry.item_ids]
 
 
 @dataclass
@@ -120,55 +222,350 @@ class WishlistWatcherError(Exception):
     """Raised for unrecoverable watcher failures."""
 
 
+@dataclass(frozen=True)
+class WatchTarget:
+    """One wishlist to watch, with its own state file and Slack webhook."""
+
+    name: str
+    list_url: str
+    state_path: Path
+    webhook_url: str
+    title: str = DEFAULT_LIST_TITLE
+
+
+class CircuitOpenError(WishlistWatcherError):
+    """Raised without a request while a host's circuit breaker is open."""
+
+
+class TokenBucket:
+    """Blocking token bucket whose rate backs off on throttling and recovers on success.
+
+    The rate halves (down to 1/16 of ``max_rate``) whenever the host answers
+    429 and climbs back by a tenth of ``max_rate`` per success. Recovery stops
+    at ``max_rate`` (``REQUESTS_PER_SECOND`` for the watcher): the bucket only
+    ever slows below the configured rate, it never probes for a faster one.
+    ``pause`` holds every caller until a given time, which is how a
+    ``Retry-After`` is honoured.
+    """
+
+    def __init__(self, max_rate: float, burst: int, clock=time.monotonic, sleep=time.sleep) -> None:  # noqa: ANN001
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+
+    def slow_down(self) -> None:
+        with self._lock:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+
+    def speed_up(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and probes the host again after ``cooldown``.
+
+    Once the cooldown has passed the breaker is half-open: a single caller is
+    let through as a probe and every other caller is still rejected. The
+    probe's success closes the breaker; its failure re-opens it for another
+    cooldown. A probe that never reports back is given up on after
+    ``cooldown`` so the host is not shut out for good.
+    """
+
+    def __init__(self, threshold: int, cooldown: float, clock=time.monotonic) -> None:  # noqa: ANN001
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = self._clock()
+            if now - self._opened_at < self.cooldown:
+                return False
+            if self._probe_started is not None and now - self._probe_started < self.cooldown:
+                return False
+            self._probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._opened_at = self._clock()
+                self._probe_started = None
+
+
+class HostThrottle:
+    """Per-host token buckets and circuit breakers shared by every fetch in the process."""
+
+    def __init__(
+        self,
+        rate: float = REQUESTS_PER_SECOND,
+        burst: int = REQUEST_BURST,
+        failure_threshold: int = CIRCUIT_BREAKER_THRESHOLD,
+        cooldown: float = CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+    ) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Tuple[TokenBucket, CircuitBreaker]] = {}
+
+    def host(self, url: str) -> Tuple[TokenBucket, CircuitBreaker]:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (
+                    TokenBucket(self._rate, self._burst),
+                    CircuitBreaker(self._failure_threshold, self._cooldown),
+                )
+            return self._hosts[host]
+
+    def acquire(self, url: str) -> None:
+        bucket, breaker = self.host(url)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{urlparse(url).netloc} への接続を一時停止中です (連続エラー)")
+        bucket.acquire()
+
+
+_throttle = HostThrottle()
+
+
+@dataclass
+class WatchConfig:
+    targets: List[WatchTarget]
+    max_workers: int = DEFAULT_MAX_WORKERS
+    per_host_limit: int = DEFAULT_PER_HOST_LIMIT
+
+
+class HttpSession(Protocol):
+    """The part of ``requests.Session`` the fetch and notify helpers use; see :class:`SessionPool`."""
+
+    def get(self, url: str, **kwargs) -> requests.Response: ...
+
+    def post(self, url: str, **kwargs) -> requests.Response: ...
+
+
+class SessionPool:
+    """One pooled ``requests.Session`` per host, shared by every list.
+
+    It has the ``get``/``post`` subset of the Session API the fetch and notify
+    helpers use, so they can take either. At most ``per_host_limit``
+    requests are in flight to any one host; callers beyond that wait.
+    """
+
+    def __init__(self, headers: Dict[str, str], per_host_limit: int = DEFAULT_PER_HOST_LIMIT) -> None:
+        self._headers = headers
+        self._per_host_limit = per_host_limit
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Tuple[requests.Session, threading.BoundedSemaphore]] = {}
+
+    def _for_host(self, url: str) -> Tuple[requests.Session, threading.BoundedSemaphore]:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._hosts:
+                session = requests.Session()
+                session.headers.update(self._headers)
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=self._per_host_limit)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._hosts[host] = (session, threading.BoundedSemaphore(self._per_host_limit))
+            return self._hosts[host]
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        session, slots = self._for_host(url)
+        with slots:
+            return session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        session, slots = self._for_host(url)
+        with slots:
+            return session.post(url, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            for session, _ in self._hosts.values():
+                session.close()
+            self._hosts.clear()
+
+
 def main() -> int:
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
-    list_url = _resolve_list_url()
-    webhook_url = _resolve_webhook_url()
     state_dir = Path(os.environ.get("STATE_DIR", "."))
-    state_path = state_dir / os.environ.get("STATE_FILENAME", DEFAULT_STATE_FILENAME)
     baseline_only = os.environ.get("BASELINE_ONLY", "false").lower() == "true"
+    config_path = os.environ.get("LISTS_CONFIG")
+    if config_path:
+        config = _load_config(Path(config_path), state_dir)
+    else:
+        list_url = _resolve_list_url()
+        config = WatchConfig(
+            targets=[
+                WatchTarget(
+                    name=_list_name(list_url),
+                    list_url=list_url,
+                    state_path=state_dir / os.environ.get("STATE_FILENAME", DEFAULT_STATE_FILENAME),
+                    webhook_url=_resolve_webhook_url(),
+                )
+            ]
+        )
 
-    session = requests.Session()
-    session.headers.update(
-        {
-            "User-Agent": os.environ.get("HTTP_USER_AGENT", DEFAULT_USER_AGENT),
-            "Accept-Language": os.environ.get("HTTP_ACCEPT_LANGUAGE", DEFAULT_ACCEPT_LANGUAGE),
-        }
-    )
+    session = SessionPool(_default_headers(), config.per_host_limit)
+    try:
+        if len(config.targets) == 1:
+            _watch(session, config.targets[0], baseline_only)
+        else:
+            workers = min(config.max_workers, len(config.targets))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wishlist") as executor:
+                for target in config.targets:
+                    executor.submit(_watch, session, target, baseline_only)
+    finally:
+        session.close()
+
+    return 0
+
+
+def _watch(session: "SessionPool", target: WatchTarget, baseline_only: bool) -> None:
+    """Fetch one list, diff it against its state file and report to its Slack webhook.
+
+    Failures are reported to the same webhook and never propagate, so one
+    broken list does not stop the others.
+    """
 
     try:
-        state_dir.mkdir(parents=True, exist_ok=True)
-        items = _fetch_all_items(session, list_url)
+        target.state_path.parent.mkdir(parents=True, exist_ok=True)
+        previous_state = _load_state(target.state_path)
+        cache = PageCache(previous_state)
+        items = _fetch_all_items(session, target.list_url, cache)
         now_iso = datetime.now(timezone.utc).isoformat()
-        new_state = WishlistState(last_checked_at=now_iso, items=items)
-
-        previous_state = _load_state(state_path)
+        new_state = WishlistState(last_checked_at=now_iso, items=items, pages=cache.current)
 
         if previous_state is None:
-            _save_state(state_path, new_state)
+            _save_state(target.state_path, new_state)
             if not baseline_only:
-                _notify_slack(webhook_url, "すばるほしいものリスト ベースラインを保存しました (初回実行)", session)
-            return 0
+                _notify_slack(
+                    target.webhook_url, f"{target.title}ほしいものリスト ベースラインを保存しました (初回実行)", session
+                )
+            return
 
         diff = _diff_items(previous_state.items, new_state.items)
-        _save_state(state_path, new_state)
+        _save_state(target.state_path, new_state)
 
         if diff.has_changes:
-            text = _format_diff_message(diff, new_state.items)
+            text = _format_diff_message(diff, new_state.items, target.title)
         else:
-            text = _format_no_change_message(new_state.items)
-        _notify_slack(webhook_url, text, session)
+            text = _format_no_change_message(new_state.items, target.title)
+        _notify_slack(target.webhook_url, text, session)
     except Exception as exc:  # noqa: BLE001
-        logger.exception("wishlist watcher failed")
-        error_message = f"すばる ウォッチャーでエラーが発生しました: {exc}"
+        logger.exception("wishlist watcher failed for %s", target.name)
+        error_message = f"{target.title} ウォッチャーでエラーが発生しました: {exc}"
         try:
-            _notify_slack(webhook_url, error_message, session)
+            _notify_slack(target.webhook_url, error_message, session)
         except Exception:  # noqa: BLE001
             logger.exception("failed to notify slack about error")
-        return 0
 
-    return 0
+
+def _list_name(list_url: str) -> str:
+    return urlparse(list_url).path.rstrip("/").split("/")[-1]
+
+
+def _default_headers() -> Dict[str, str]:
+    return {
+        "User-Agent": os.environ.get("HTTP_USER_AGENT", DEFAULT_USER_AGENT),
+        "Accept-Language": os.environ.get("HTTP_ACCEPT_LANGUAGE", DEFAULT_ACCEPT_LANGUAGE),
+    }
+
+
+def _load_config(path: Path, state_dir: Path) -> WatchConfig:
+    """Read a multi-list config file (JSON).
+
+    ``{"max_workers": 8, "per_host_limit": 4, "lists": [{"url": ..., "name": ...,
+    "title": ..., "state_filename": ..., "webhook_url": ...}]}``. Only ``url``
+    is required per list: ``name`` defaults to the list id in the URL, the
+    state file to ``state_<name>.json`` in ``STATE_DIR`` and the webhook to
+    ``WEBHOOK_URL``.
+    """
+
+    try:
+        with path.open("r", encoding="utf-8") as fp:
+            payload = json.load(fp)
+        lists = payload["lists"]
+        if not isinstance(lists, list) or not lists:
+            raise ValueError("lists must be a non-empty array")
+    except Exception as exc:  # noqa: BLE001
+        raise WishlistWatcherError(f"設定ファイルの読み込みに失敗しました: {exc}") from exc
+
+    targets: List[WatchTarget] = []
+    for entry in lists:
+        if not isinstance(entry, dict) or not entry.get("url"):
+            raise WishlistWatcherError(f"設定ファイルのリストに url がありません: {entry}")
+        name = entry.get("name") or _list_name(entry["url"])
+        webhook_url = entry.get("webhook_url") or os.environ.get("WEBHOOK_URL") or DEFAULT_WEBHOOK_URL
+        if not webhook_url:
+            raise WishlistWatcherError(f"{name} の Slack Webhook URL が設定されていません")
+        targets.append(
+            WatchTarget(
+                name=name,
+                list_url=entry["url"],
+                state_path=state_dir / entry.get("state_filename", f"state_{name}.json"),
+                webhook_url=webhook_url,
+                title=entry.get("title", DEFAULT_LIST_TITLE),
+            )
+        )
+
+    state_paths = [target.state_path for target in targets]
+    if len(set(state_paths)) != len(state_paths):
+        raise WishlistWatcherError("設定ファイルで同じ状態ファイルが複数のリストに使われています")
+
+    return WatchConfig(
+        targets=targets,
+        max_workers=int(payload.get("max_workers", DEFAULT_MAX_WORKERS)),
+        per_host_limit=int(payload.get("per_host_limit", DEFAULT_PER_HOST_LIMIT)),
+    )
 
 
 def _require_env(key: str) -> str:
@@ -193,31 +590,156 @@ def _resolve_webhook_url() -> str:
     return webhook_url
 
 
-def _fetch_with_retry(session: requests.Session, url: str) -> str:
+def _fetch_with_retry(
+    session: HttpSession,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    cancel: Optional[threading.Event] = None,
+) -> requests.Response:
     last_exception: Optional[Exception] = None
+    bucket, breaker = _throttle.host(url)
 
     for attempt in range(1, MAX_FETCH_ATTEMPTS + 1):
+        # A cancelled fetch stops before its next attempt instead of retrying.
+        if cancel is not None and cancel.is_set():
+            raise WishlistWatcherError("ウィッシュリストの取得を中止しました")
+        _throttle.acquire(url)
+        retry_after: Optional[float] = None
         try:
-            response = session.get(url, timeout=REQUEST_TIMEOUT)
-            if response.status_code == 429:
-                raise WishlistWatcherError("HTTP 429 Too Many Requests")
+            response = session.get(url, timeout=REQUEST_TIMEOUT, headers=headers)
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+                if response.status_code == 429:
+                    bucket.slow_down()
+                    raise WishlistWatcherError("HTTP 429 Too Many Requests")
+                raise WishlistWatcherError(f"HTTP {response.status_code}")
             response.raise_for_status()
-            response.encoding = response.encoding or "utf-8"
-            return response.text
+        except requests.HTTPError as exc:
+            # Other 4xx answers will not change on retry. The host did answer,
+            # so this still counts as a success for the circuit breaker.
+            breaker.record_success()
+            raise WishlistWatcherError(f"ウィッシュリストの取得に失敗しました: {exc}") from exc
         except Exception as exc:  # noqa: BLE001
             last_exception = exc
-            sleep_seconds = BACKOFF_BASE_SECONDS ** attempt
+            breaker.record_failure()
             logger.warning(
                 "failed to fetch wishlist (attempt %s/%s): %s", attempt, MAX_FETCH_ATTEMPTS, exc
             )
-            time.sleep(sleep_seconds)
+            if attempt == MAX_FETCH_ATTEMPTS:
+                break
+            if retry_after is None:
+                if cancel is None:
+                    time.sleep(_backoff_seconds(attempt))
+                else:
+                    cancel.wait(_backoff_seconds(attempt))
+            elif retry_after > MAX_RETRY_AFTER_SECONDS:
+                break
+            else:
+                # Holds every request to this host, not just this retry.
+                bucket.pause(retry_after)
+            continue
+        breaker.record_success()
+        bucket.speed_up()
+        response.encoding = response.encoding or "utf-8"
+        return response
 
     raise WishlistWatcherError(f"ウィッシュリストの取得に失敗しました: {last_exception}")
 
 
+def _backoff_seconds(attempt: int) -> float:
+    # "Equal jitter": at least half the exponential step, so retries from
+    # concurrent lists spread out without ever retrying immediately.
+    step = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS ** attempt)
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class FetchedPage:
+    url: str
+    html: Optional[str]  # None when the server answered 304 Not Modified
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+def _fetch_page(
+    session: HttpSession,
+    url: str,
+    cached: Optional[CachedPage],
+    cancel: Optional[threading.Event] = None,
+) -> FetchedPage:
+    # Validators are only sent when the cached items could stand in for the page.
+    headers: Dict[str, str] = {}
+    if cached is not None and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached is not None and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+    response = _fetch_with_retry(session, url, headers or None, cancel)
+    if response.status_code == 304 and cached is not None:
+        return FetchedPage(
+            url=url,
+            html=None,
+            etag=response.headers.get("ETag") or cached.etag,
+            last_modified=response.headers.get("Last-Modified") or cached.last_modified,
+        )
+    return FetchedPage(
+        url=url,
+        html=response.text,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
+ITEMS_CONTAINER_OPEN_PATTERN = re.compile(
+    r"<([a-z][a-z0-9]*)\b[^>]*\b(?:id|data-testid)\s*=\s*[\"']g-items[\"'][^>]*>", re.IGNORECASE
+)
+# Per-request values that would change the hash of an unchanged list.
+VOLATILE_ATTR_PATTERN = re.compile(
+    r"\s[\w:-]*(?:csrf|token|session)[\w:-]*\s*=\s*(?:\"[^\"]*\"|'[^']*')", re.IGNORECASE
+)
+INTER_TAG_WHITESPACE_PATTERN = re.compile(r">\s+<")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def _items_container_hash(html: str) -> Optional[str]:
+    """SHA-256 of the normalized ``#g-items`` element, found without parsing the page."""
+
+    opening = ITEMS_CONTAINER_OPEN_PATTERN.search(html)
+    if opening is None:
+        return None
+    tag_pattern = re.compile(rf"<(/?){opening.group(1)}\b[^>]*>", re.IGNORECASE)
+    depth = 0
+    end = len(html)
+    for tag in tag_pattern.finditer(html, opening.start()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            end = tag.end()
+            break
+    container = VOLATILE_ATTR_PATTERN.sub("", html[opening.start():end])
+    container = WHITESPACE_PATTERN.sub(" ", INTER_TAG_WHITESPACE_PATTERN.sub("><", container))
+    return hashlib.sha256(container.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def _parse_page(html: str, parser: Optional[str] = None) -> BeautifulSoup:
+    return BeautifulSoup(html, parser or HTML_PARSER, parse_only=_WishlistStrainer())
+
+
 def _parse_wishlist(html: str, base_url: str) -> List[WishlistItem]:
-    soup = BeautifulSoup(html, "html.parser")
-    return _parse_items_from_soup(soup, base_url)
+    return _parse_items_from_soup(_parse_page(html), base_url)
 
 
 ASIN_PATTERN = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})", re.IGNORECASE)
@@ -341,38 +863,76 @@ def _extract_show_more_url(soup: BeautifulSoup, base_url: str) -> Optional[str]:
             return urljoin(base_url, value)
 
     for script_tag in soup.find_all("script", {"type": "a-state"}):
-        data_state_attr = script_tag.attrs.get("data-a-state")
-        if not data_state_attr:
-            continue
-        if "scrollState" not in data_state_attr:
-            continue
-        raw_text = script_tag.string or ""
-        if not raw_text.strip():
-            continue
-        try:
-            payload = json.loads(unescape(raw_text))
-        except json.JSONDecodeError:
-            continue
-        show_more = payload.get("showMoreUrl")
-        if show_more:
-            return urljoin(base_url, unescape(show_more))
-        pagination_token = payload.get("paginationToken")
-        if pagination_token:
-            query = {
-                "filter": "unpurchased",
-                "paginationToken": pagination_token,
-                "itemsLayout": "LIST",
-                "sort": "date-added",
-                "type": "wishlist",
-            }
-            parsed_base = urlparse(base_url)
-            lid = parsed_base.path.rstrip("/").split("/")[-1]
-            query["lid"] = lid
-            return urljoin(base_url, f"/hz/wishlist/slv/items?{urlencode(query)}")
+        next_url = _show_more_url_from_state(
+            script_tag.attrs.get("data-a-state"), script_tag.string or "", base_url
+        )
+        if next_url:
+            return next_url
+
+    return None
+
+
+SHOW_MORE_INPUT_PATTERN = re.compile(r"<input\b[^>]*\bname\s*=\s*[\"']showMoreUrl[\"'][^>]*>", re.IGNORECASE)
+VALUE_ATTR_PATTERN = re.compile(r"\bvalue\s*=\s*(?:\"([^\"]*)\"|'([^']*)')", re.IGNORECASE)
+A_STATE_SCRIPT_PATTERN = re.compile(
+    r"<script\b([^>]*\btype\s*=\s*[\"']a-state[\"'][^>]*)>(.*?)</script>", re.IGNORECASE | re.DOTALL
+)
+DATA_A_STATE_ATTR_PATTERN = re.compile(r"\bdata-a-state\s*=\s*(?:\"([^\"]*)\"|'([^']*)')", re.IGNORECASE)
+
+
+def _scan_show_more_url(html: str, base_url: str) -> Optional[str]:
+    """Regex twin of ``_extract_show_more_url`` that works on the raw page.
+
+    It is only used to start fetching the next page early; the parsed
+    page still decides which URL is followed.
+    """
+
+    tag = SHOW_MORE_INPUT_PATTERN.search(html)
+    if tag:
+        value = VALUE_ATTR_PATTERN.search(tag.group(0))
+        if value and (value.group(1) or value.group(2)):
+            return urljoin(base_url, unescape(value.group(1) or value.group(2)))
+
+    for script in A_STATE_SCRIPT_PATTERN.finditer(html):
+        attr = DATA_A_STATE_ATTR_PATTERN.search(script.group(1))
+        data_state_attr = unescape(attr.group(1) or attr.group(2)) if attr else None
+        next_url = _show_more_url_from_state(data_state_attr, script.group(2), base_url)
+        if next_url:
+            return next_url
 
     return None
 
 
+def _show_more_url_from_state(data_state_attr: Optional[str], raw_text: str, base_url: str) -> Optional[str]:
+    if not data_state_attr:
+        return None
+    if "scrollState" not in data_state_attr:
+        return None
+    if not raw_text.strip():
+        return None
+    try:
+        payload = json.loads(unescape(raw_text))
+    except json.JSONDecodeError:
+        return None
+    show_more = payload.get("showMoreUrl")
+    if show_more:
+        return urljoin(base_url, unescape(show_more))
+    pagination_token = payload.get("paginationToken")
+    if pagination_token:
+        query = {
+            "filter": "unpurchased",
+            "paginationToken": pagination_token,
+            "itemsLayout": "LIST",
+            "sort": "date-added",
+            "type": "wishlist",
+        }
+        parsed_base = urlparse(base_url)
+        lid = parsed_base.path.rstrip("/").split("/")[-1]
+        query["lid"] = lid
+        return urljoin(base_url, f"/hz/wishlist/slv/items?{urlencode(query)}")
+    return None
+
+
 def _parse_price(text: str) -> Optional[float]:
     cleansed = text.replace("¥", "").replace("￥", "").replace(",", "").strip()
     if cleansed == "":
@@ -420,8 +980,10 @@ def _diff_items(old_items: Sequence[WishlistItem], new_items: Sequence[WishlistI
     return WishlistDiff(added=added, removed=removed, price_changes=price_changes)
 
 
-def _format_diff_message(diff: WishlistDiff, current_items: Iterable[WishlistItem]) -> str:
-    lines = ["すばるほしい物リスト 更新 (変化あり)"]
+def _format_diff_message(
+    diff: WishlistDiff, current_items: Iterable[WishlistItem], title: str = DEFAULT_LIST_TITLE
+) -> str:
+    lines = [f"{title}ほしい物リスト 更新 (変化あり)"]
 
     total_price = _sum_prices(current_items)
     if total_price is not None:
@@ -451,8 +1013,8 @@ def _format_diff_message(diff: WishlistDiff, current_items: Iterable[WishlistIte
     return "\n".join(lines)
 
 
-def _format_no_change_message(current_items: Sequence[WishlistItem]) -> str:
-    lines = ["すばるほしい物リスト 更新 (変化なし)"]
+def _format_no_change_message(current_items: Sequence[WishlistItem], title: str = DEFAULT_LIST_TITLE) -> str:
+    lines = [f"{title}ほしい物リスト 更新 (変化なし)"]
 
     total_price = _sum_prices(current_items)
     if total_price is not None:
@@ -496,15 +1058,18 @@ def _sum_prices(items: Iterable[WishlistItem]) -> Optional[float]:
     return total if found else None
 
 
-def _notify_slack(webhook_url: str, text: str, session: requests.Session) -> None:
+def _notify_slack(webhook_url: str, text: str, session: HttpSession) -> None:
     payload = {"text": text}
     response = session.post(webhook_url, json=payload, timeout=REQUEST_TIMEOUT)
     if response.status_code >= 400:
         raise WishlistWatcherError(f"Slack通知に失敗しました: {response.status_code} {response.text}")
 
 
-def _fetch_all_items(session: requests.Session, list_url: str) -> List[WishlistItem]:
-    html = _fetch_with_retry(session, list_url)
+def _fetch_all_items(
+    session: HttpSession, list_url: str, cache: Optional[PageCache] = None
+) -> List[WishlistItem]:
+    cache = cache if cache is not None else PageCache()
+    page = _fetch_page(session, list_url, cache.usable(list_url))
     all_items: List[WishlistItem] = []
     seen_ids: set[str] = set()
 
@@ -512,38 +1077,91 @@ def _fetch_all_items(session: requests.Session, list_url: str) -> List[WishlistI
     next_url: Optional[str] = None
     visited_urls: set[str] = set()
 
-    while True:
-        page_count += 1
-        if page_count > MAX_PAGINATION_PAGES:
-            raise WishlistWatcherError("ページネーションの追跡が上限を超えました")
-
-        soup = BeautifulSoup(html, "html.parser")
-        page_items = _parse_items_from_soup(soup, list_url)
-        new_items = 0
-        for item in page_items:
-            if item.item_id in seen_ids:
-                continue
-            seen_ids.add(item.item_id)
-            all_items.append(item)
-            new_items += 1
-
-        logger.info("page %s: fetched %s items (%s new)", page_count, len(page_items), new_items)
-
-        next_url = _extract_show_more_url(soup, list_url)
-        if not next_url:
-            break
+    # The next page is fetched on a background thread while the current one
+    # is parsed. A prefetch that turns out to be unneeded is stopped and waited
+    # for before the session is used again, so the two threads never use the
+    # session at once and no fetch outlives this function.
+    prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wishlist-prefetch")
+    prefetch: Optional[Future] = None
+    stop_prefetch = threading.Event()
+    try:
+        while True:
+            page_count += 1
+            if page_count > MAX_PAGINATION_PAGES:
+                raise WishlistWatcherError("ページネーションの追跡が上限を超えました")
+
+            cached = cache.usable(page.url)
+            content_hash = cached.content_hash if page.html is None else _items_container_hash(page.html)
+            unchanged = cached is not None and content_hash is not None and content_hash == cached.content_hash
+
+            if page.html is None:
+                prefetch_url = cached.next_url
+            else:
+                prefetch_url = _scan_show_more_url(page.html, list_url)
+            prefetch = None
+            if prefetch_url and prefetch_url not in visited_urls and page_count < MAX_PAGINATION_PAGES:
+                stop_prefetch = threading.Event()
+                prefetch = prefetcher.submit(
+                    _fetch_page, session, prefetch_url, cache.usable(prefetch_url), stop_prefetch
+                )
+
+            if unchanged:
+                # Same items as last run: skip parsing; the scanned URL is the next page.
+                page_items = cache.items(cached)
+                next_url = prefetch_url
+                cache.reused_pages += 1
+            else:
+                soup = _parse_page(page.html)
+                page_items = _parse_items_from_soup(soup, list_url)
+                next_url = _extract_show_more_url(soup, list_url)
+            cache.current[page.url] = CachedPage(
+                etag=page.etag,
+                last_modified=page.last_modified,
+                content_hash=content_hash or "",
+                item_ids=[item.item_id for item in page_items],
+                next_url=next_url,
+            )
 
-        if next_url in visited_urls:
-            logger.warning("pagination returned previously seen URL; stopping to avoid loop")
-            break
+            new_items = 0
+            for item in page_items:
+                if item.item_id in seen_ids:
+                    continue
+                seen_ids.add(item.item_id)
+                all_items.append(item)
+                new_items += 1
+
+            logger.info(
+                "page %s: %s %s items (%s new)",
+                page_count,
+                "reused" if unchanged else "fetched",
+                len(page_items),
+                new_items,
+            )
 
-        if new_items == 0:
-            logger.warning("pagination returned no new items; stopping early")
-            break
+            if not next_url:
+                break
+
+            if next_url in visited_urls:
+                logger.warning("pagination returned previously seen URL; stopping to avoid loop")
+                break
 
-        visited_urls.add(next_url)
-        last_url = next_url
-        html = _fetch_with_retry(session, next_url)
+            if new_items == 0:
+                logger.warning("pagination returned no new items; stopping early")
+                break
+
+            visited_urls.add(next_url)
+            if prefetch is not None and next_url == prefetch_url:
+                page = prefetch.result()
+                prefetch = None
+            else:
+                _abandon_prefetch(prefetch, stop_prefetch)
+                prefetch = None
+                page = _fetch_page(session, next_url, cache.usable(next_url))
+    finally:
+        # Stopping early (loop, no new items, an error) waits at most for the
+        # request in flight, not for the prefetch's retries and backoff.
+        _abandon_prefetch(prefetch, stop_prefetch)
+        prefetcher.shutdown()
 
     if not all_items:
         raise WishlistWatcherError("ウィッシュリストの解析に失敗しました (項目が見つかりません)")
@@ -551,20 +1169,33 @@ def _fetch_all_items(session: requests.Session, list_url: str) -> List[WishlistI
     return all_items
 
 
+def _abandon_prefetch(prefetch: Optional[Future], stop: threading.Event) -> None:
+    """Stop a speculative fetch and wait until it no longer uses the session."""
+
+    if prefetch is None or prefetch.cancel():
+        return
+    stop.set()
+    try:
+        prefetch.result()
+    except Exception:  # noqa: BLE001 - the page is not needed
+        pass
+
+
 def _parse_items_from_soup(soup: BeautifulSoup, base_url: str) -> List[WishlistItem]:
     container = _locate_items_container(soup)
     if container is None:
         raise WishlistWatcherError("ウィッシュリストの解析に失敗しました (リストコンテナが見つかりません)")
 
-    item_nodes = list(container.select("[data-itemid]"))
-
-    fallback_nodes = container.select("li")
-    for node in fallback_nodes:
-        if node.get("data-itemid"):
-            continue
-        if not node.find("a", href=True):
-            continue
-        item_nodes.append(node)
+    # One walk over the container: nodes with data-itemid first, then <li>
+    # fallbacks for layouts without it (both in document order).
+    item_nodes: List[Tag] = []
+    fallback_nodes: List[Tag] = []
+    for node in container.find_all(True):
+        if node.has_attr("data-itemid"):
+            item_nodes.append(node)
+        if node.name == "li" and not node.get("data-itemid") and node.find("a", href=True):
+            fallback_nodes.append(node)
+    item_nodes.extend(fallback_nodes)
 
     items: List[WishlistItem] = []
     seen_ids: set[str] = set()
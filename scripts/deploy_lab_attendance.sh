@@ -78,11 +78,22 @@ cd "$REMOTE_APP_DIR/backend"
 pkill -f "uvicorn main:app" || true
 
 # Restore latest backup if available
+# 差分バックアップ（チャンク + 日次マニフェスト）があれば最新のマニフェストから組み立て、
+# なければ従来の丸ごとコピー（backups/attendance-YYYY-MM-DD.db）の最新を使う
 if [ -n "${BACKUP_BUCKET:-}" ] && command -v aws >/dev/null 2>&1; then
-    LATEST_OBJECT=$(aws s3 ls "s3://$BACKUP_BUCKET/backups/" --recursive --region "$CRON_REGION" 2>/dev/null | awk '{print $4}' | sort | tail -n 1)
-    if [ -n "$LATEST_OBJECT" ]; then
-        echo "📦 Restoring backup: $LATEST_OBJECT"
-        aws s3 cp "s3://$BACKUP_BUCKET/$LATEST_OBJECT" attendance.db --region "$CRON_REGION" --quiet || echo "⚠️  Backup restore failed"
+    LATEST_MANIFEST=$(aws s3 ls "s3://$BACKUP_BUCKET/backups/incremental/manifests/" --region "$CRON_REGION" 2>/dev/null | awk '{print $4}' | sort | tail -n 1)
+    LATEST_OBJECT=$(aws s3 ls "s3://$BACKUP_BUCKET/backups/attendance-" --region "$CRON_REGION" 2>/dev/null | awk '{print $4}' | sort | tail -n 1)
+    if [ -n "$LATEST_MANIFEST" ]; then
+        echo "📦 Restoring incremental backup: $LATEST_MANIFEST"
+        # WALモードの残骸が復元したDBに適用されないよう削除
+        rm -f attendance.db-wal attendance.db-shm
+        /usr/bin/python3 backup_to_s3.py --restore --bucket "$BACKUP_BUCKET" --region "$CRON_REGION" \
+            --manifest "backups/incremental/manifests/$LATEST_MANIFEST" --db attendance.db || echo "⚠️  Backup restore failed"
+    elif [ -n "$LATEST_OBJECT" ]; then
+        echo "📦 Restoring backup: backups/$LATEST_OBJECT"
+        # WALモードの残骸が復元したDBに適用されないよう削除
+        rm -f attendance.db-wal attendance.db-shm
+        aws s3 cp "s3://$BACKUP_BUCKET/backups/$LATEST_OBJECT" attendance.db --region "$CRON_REGION" --quiet || echo "⚠️  Backup restore failed"
     else
         echo "ℹ️  No backup objects found in s3://$BACKUP_BUCKET/backups/"
     fi
@@ -96,13 +107,13 @@ source .venv/bin/activate
 
 # Install dependencies and start backend
 pip install -r requirements.txt
-nohup .venv/bin/python -m uvicorn main:app --host 127.0.0.1 --port 8000 > /tmp/backend.log 2>&1 &
+nohup .venv/bin/python -m uvicorn main:app --host 127.0.0.1 --port 8000 --timeout-graceful-shutdown 10 > /tmp/backend.log 2>&1 &
 sleep 3
 echo "Backend started on localhost:8000"
 
 # Ensure cron entry exists for daily backup
 if [ -n "${BACKUP_BUCKET:-}" ]; then
-    CRON_LINE="10 0 * * * AWS_REGION=${CRON_REGION} /usr/bin/python3 ${REMOTE_APP_DIR}/backend/backup_to_s3.py --bucket ${BACKUP_BUCKET} --region ${CRON_REGION} --key backups/attendance-\$(date +\\%Y-\\%m-\\%d).db >> /var/log/lab-app/backup.log 2>&1"
+    CRON_LINE="10 0 * * * AWS_REGION=${CRON_REGION} /usr/bin/python3 ${REMOTE_APP_DIR}/backend/backup_to_s3.py --bucket ${BACKUP_BUCKET} --region ${CRON_REGION} --incremental >> /var/log/lab-app/backup.log 2>&1"
     (crontab -l 2>/dev/null | grep -Fv "backup_to_s3.py"; echo "$CRON_LINE") | crontab -
     echo "🕒 Cron job installed for daily S3 backup"
 fi
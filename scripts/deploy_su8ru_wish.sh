@@ -118,7 +118,7 @@ fi
 
 source .venv/bin/activate
 pip install --upgrade pip >/dev/null
-pip install "requests>=2.31.0" "beautifulsoup4>=4.12.0"
+pip install "requests>=2.31.0" "beautifulsoup4>=4.12.0" "lxml>=5.0"
 deactivate
 
 SERVICE_PATH="/etc/systemd/system/${SERVICE_NAME}.service"